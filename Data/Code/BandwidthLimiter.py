@@ -0,0 +1,117 @@
+from PySide6.QtCore import QObject, Signal, QTimer, QElapsedTimer
+
+TICK_MS = 50
+BURST_SECONDS = 0.25
+MIN_READ_BUFFER = 16 * 1024
+MAX_READ_BUFFER = 4 * 1024 * 1024
+
+class BandwidthLimiter(QObject):
+    resumed = Signal(str)  # key
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._globalRate = 0
+        self._perJobRate = 0
+        self._globalTokens = 0.0
+        self._jobTokens = {}
+        self._waiting = []
+        self._fairShare = None
+        self._clock = QElapsedTimer()
+        self._clock.start()
+        self._lastRefill = 0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(TICK_MS)
+        self._timer.timeout.connect(self._wakeWaiting)
+
+    def setLimits(self, globalRate, perJobRate):
+        self._refill()
+        self._globalRate = max(0, globalRate)
+        self._perJobRate = max(0, perJobRate)
+        self._globalTokens = min(self._globalTokens, self._capacity(self._globalRate))
+        for key in self._jobTokens:
+            self._jobTokens[key] = min(self._jobTokens[key], self._capacity(self._perJobRate))
+        # Jobs throttled under the old limits get another chance straight away
+        self._wakeWaiting()
+
+    def isLimited(self):
+        return self._globalRate > 0 or self._perJobRate > 0
+
+    def addJob(self, key):
+        self._jobTokens.setdefault(key, 0.0)
+
+    def removeJob(self, key):
+        self._jobTokens.pop(key, None)
+        if key in self._waiting:
+            self._waiting.remove(key)
+
+    def readBufferSize(self, key, replyCount=1):
+        # Small read buffers make Qt stop reading the socket while a job is throttled
+        rate = self._jobRate()
+        if rate <= 0:
+            return MAX_READ_BUFFER
+        return int(max(MIN_READ_BUFFER, min(MAX_READ_BUFFER, rate * BURST_SECONDS / max(1, replyCount))))
+
+    def acquire(self, key, wanted, force=False):
+        if not self.isLimited() or wanted <= 0:
+            return wanted
+
+        self._refill()
+        jobTokens = self._jobTokens.setdefault(key, 0.0)
+        granted = wanted
+        if self._perJobRate > 0:
+            granted = min(granted, int(jobTokens))
+        if self._globalRate > 0:
+            # Waiting jobs split the global bucket evenly
+            share = self._fairShare
+            if share is None:
+                share = self._globalTokens / (len(self._waiting) + 1)
+            granted = min(granted, int(min(share, self._globalTokens)))
+        if force:
+            granted = wanted
+        granted = max(0, granted)
+
+        if self._perJobRate > 0:
+            self._jobTokens[key] = jobTokens - granted
+        if self._globalRate > 0:
+            self._globalTokens -= granted
+        if granted < wanted and key not in self._waiting:
+            self._waiting.append(key)
+            if not self._timer.isActive():
+                self._timer.start()
+        return granted
+
+    def _jobRate(self):
+        rates = [rate for rate in (self._perJobRate, self._globalRate) if rate > 0]
+        return min(rates) if rates else 0
+
+    def _capacity(self, rate):
+        return rate * BURST_SECONDS
+
+    def _refill(self):
+        now = self._clock.elapsed()
+        seconds = (now - self._lastRefill) / 1000.0
+        self._lastRefill = now
+        if seconds <= 0:
+            return
+        if self._globalRate > 0:
+            self._globalTokens = min(self._capacity(self._globalRate), self._globalTokens + self._globalRate * seconds)
+        if self._perJobRate > 0:
+            capacity = self._capacity(self._perJobRate)
+            for key, tokens in self._jobTokens.items():
+                self._jobTokens[key] = min(capacity, tokens + self._perJobRate * seconds)
+
+    def _wakeWaiting(self):
+        self._refill()
+        waiting, self._waiting = self._waiting, []
+        if not waiting:
+            self._timer.stop()
+            return
+        # Rotate so the same job is not always served first
+        waiting = waiting[1:] + waiting[:1]
+        self._fairShare = self._globalTokens / len(waiting)
+        try:
+            for key in waiting:
+                self.resumed.emit(key)
+        finally:
+            self._fairShare = None
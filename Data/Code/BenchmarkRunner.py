@@ -0,0 +1,306 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from PySide6 import __version__ as PYSIDE_VERSION
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, QUrl, QElapsedTimer
+from .BenchmarkServer import BenchmarkServer
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+# Each group is count files of one size, optionally served with latency (ms),
+# a per-connection bandwidth cap (bytes per second) and an error probability
+SCENARIOS = {
+    "small": [
+        {"count": 200, "size": 1 * KB},
+        {"count": 100, "size": 64 * KB, "latency": 20},
+    ],
+    "huge": [
+        {"count": 1, "size": 2 * GB},
+    ],
+    "mixed": [
+        {"count": 4, "size": 64 * MB, "latency": 20, "rate": 16 * MB},
+        {"count": 100, "size": 16 * KB, "latency": 50},
+        {"count": 4, "size": 16 * MB, "errors": 0.2},
+    ],
+}
+DEFAULT_CONCURRENT = "1,5"
+DEFAULT_THREADS = "1,8,32"
+RUN_TIMEOUT_S = 1800
+SERVER_TIMEOUT_S = 10
+
+class BenchmarkRunner(QObject):
+    def __init__(self, urls, settings, timeout, parent=None):
+        super().__init__(parent)
+        # Measures one run of the engine, lives in a worker process of its own
+        from .DownloadingPage import DownloadingPage
+
+        self._urls = urls
+        self._settings = settings
+        self._page = DownloadingPage(settings)
+        self._clock = QElapsedTimer()
+        self._startedAt = {}
+        self._firstByteMs = []
+        self._completed = 0
+        self._failed = 0
+        self._retries = 0
+        self._signals = {"downloadProgress": 0, "statsChanged": 0, "queueChanged": 0, "modelChanged": 0}
+        self._result = None
+
+        self._page.downloadStarted.connect(self._onDownloadStarted)
+        self._page.downloadFirstByte.connect(self._onDownloadFirstByte)
+        self._page.downloadCompleted.connect(lambda url, savePath: self._onDownloadFinished(True))
+        self._page.downloadError.connect(lambda url, errorMessage: self._onDownloadFinished(False))
+        self._page.downloadRetrying.connect(self._onDownloadRetrying)
+        self._page.downloadProgress.connect(lambda url, progress, speed: self._countSignal("downloadProgress"))
+        self._page.statsChanged.connect(lambda: self._countSignal("statsChanged"))
+        self._page.queueChanged.connect(lambda count: self._countSignal("queueChanged"))
+        model = self._page.downloadModel
+        model.dataChanged.connect(lambda *args: self._countSignal("modelChanged"))
+        model.rowsInserted.connect(lambda *args: self._countSignal("modelChanged"))
+        model.rowsRemoved.connect(lambda *args: self._countSignal("modelChanged"))
+
+        self._timeoutTimer = QTimer(self)
+        self._timeoutTimer.setSingleShot(True)
+        self._timeoutTimer.setInterval(timeout * 1000)
+        self._timeoutTimer.timeout.connect(lambda: self._finish("timeout"))
+
+    @staticmethod
+    def parseArguments(argv):
+        parser = argparse.ArgumentParser(prog="Downloader.py --benchmark", description="Measure the download engine against a local test server.")
+        parser.add_argument("--benchmark", action="store_true", help=argparse.SUPPRESS)
+        parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run, may be repeated, all by default")
+        parser.add_argument("-c", "--concurrent", default=DEFAULT_CONCURRENT, help="comma separated concurrentDownloads values")
+        parser.add_argument("-t", "--threads", default=DEFAULT_THREADS, help="comma separated maxThreadsPerDownload values")
+        parser.add_argument("--scale", type=float, default=1.0, help="multiplies every file size, e.g. 0.01 for a quick run")
+        parser.add_argument("--seed", type=int, default=0, help="seed for file contents and injected errors")
+        parser.add_argument("--timeout", type=int, default=RUN_TIMEOUT_S, help="seconds before a single run is abandoned")
+        parser.add_argument("-o", "--output", default="benchmark.json", help="where the JSON results are written")
+        parser.add_argument("--compare", help="earlier results file to compare against")
+        return parser.parse_args(argv[1:])
+
+    @staticmethod
+    def main(argv):
+        arguments = BenchmarkRunner.parseArguments(argv)
+        try:
+            concurrentValues = [max(1, int(value)) for value in arguments.concurrent.split(",")]
+            threadValues = [max(1, int(value)) for value in arguments.threads.split(",")]
+        except ValueError:
+            print("--concurrent and --threads take comma separated numbers", file=sys.stderr)
+            return 2
+
+        # Every run gets a fresh process, so CPU time and peak memory are its own
+        context = multiprocessing.get_context("spawn")
+        portQueue = context.Queue()
+        server = context.Process(target=BenchmarkServer.serve, args=(portQueue, arguments.seed), daemon=True)
+        server.start()
+        try:
+            baseUrl = f"http://127.0.0.1:{portQueue.get(timeout=SERVER_TIMEOUT_S)}"
+            runs = []
+            for scenario in arguments.scenario or sorted(SCENARIOS):
+                urls = BenchmarkRunner.scenarioUrls(baseUrl, scenario, arguments.scale)
+                for concurrent in concurrentValues:
+                    for threads in threadValues:
+                        run = BenchmarkRunner._runInWorker(context, urls, concurrent, threads, arguments.timeout)
+                        run.update(scenario=scenario, concurrentDownloads=concurrent, maxThreadsPerDownload=threads)
+                        print(BenchmarkRunner._formatRun(run), flush=True)
+                        runs.append(run)
+        finally:
+            server.terminate()
+
+        results = {
+            "commit": BenchmarkRunner._gitCommit(),
+            "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pyside": PYSIDE_VERSION,
+            "platform": platform.platform(),
+            "scale": arguments.scale,
+            "seed": arguments.seed,
+            "runs": runs,
+        }
+        with open(arguments.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {arguments.output}")
+
+        if arguments.compare:
+            try:
+                with open(arguments.compare, 'r', encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Cannot read {arguments.compare}: {getattr(e, 'strerror', None) or str(e)}", file=sys.stderr)
+                return 2
+            BenchmarkRunner._printComparison(baseline, results)
+        return 1 if any(run["failed"] or run.get("timedOut") for run in runs) else 0
+
+    @staticmethod
+    def scenarioUrls(baseUrl, scenario, scale=1.0):
+        urls = []
+        for groupIndex, group in enumerate(SCENARIOS[scenario]):
+            size = max(KB, int(group["size"] * scale))
+            query = f"size={size}&latency={group.get('latency', 0)}&rate={group.get('rate', 0)}&errors={group.get('errors', 0)}"
+            for index in range(group["count"]):
+                urls.append(f"{baseUrl}/{scenario}-{groupIndex}-{index}.bin?{query}")
+        return urls
+
+    @staticmethod
+    def runWorker(urls, concurrent, threads, timeout, resultQueue):
+        folder = tempfile.mkdtemp(prefix="downloader-benchmark-")
+        try:
+            # The history database is created in the working directory
+            os.chdir(folder)
+            app = QCoreApplication([sys.argv[0]])
+            from .SettingPage import Settings
+
+            # A config file that does not exist yet, so every run starts from the defaults
+            # instead of whatever the user's Downloader.ini holds
+            settings = Settings(autoSave=False, configFile=os.path.join(folder, "Downloader.ini"))
+            settings.downloadFolder = os.path.join(folder, "downloads")
+            os.makedirs(settings.downloadFolder)
+            settings.cacheMode = "off"
+            settings.cacheFolder = os.path.join(folder, "cache")
+            settings.concurrentDownloads = concurrent
+            settings.maxThreadsPerDownload = threads
+
+            runner = BenchmarkRunner(urls, settings, timeout)
+            QTimer.singleShot(0, runner.start)
+            app.exec()
+            resultQueue.put(runner.result())
+        finally:
+            os.chdir(tempfile.gettempdir())
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def start(self):
+        self._cpuStart = time.process_time()
+        self._clock.start()
+        self._timeoutTimer.start()
+        for url in self._urls:
+            self._page.startDownload(QUrl(url))
+
+    def result(self):
+        return self._result
+
+    def _onDownloadStarted(self, urlStr, filename, savePath):
+        self._startedAt[urlStr] = self._clock.elapsed()
+
+    def _onDownloadFirstByte(self, urlStr):
+        startedAt = self._startedAt.pop(urlStr, None)
+        if startedAt is not None:
+            self._firstByteMs.append(self._clock.elapsed() - startedAt)
+
+    def _onDownloadRetrying(self, urlStr, retries, delay, errorMessage):
+        self._retries += 1
+
+    def _onDownloadFinished(self, isCompleted):
+        if isCompleted:
+            self._completed += 1
+        else:
+            self._failed += 1
+        if self._completed + self._failed >= len(self._urls):
+            self._finish("")
+
+    def _countSignal(self, name):
+        self._signals[name] += 1
+
+    def _finish(self, reason):
+        if self._result is not None:
+            return
+        seconds = max(self._clock.elapsed(), 1) / 1000
+        bytesReceived = sum(os.path.getsize(entry.path) for entry in os.scandir(self._settings.downloadFolder) if entry.is_file())
+        firstByte = sorted(self._firstByteMs)
+        self._result = {
+            "files": len(self._urls),
+            "completed": self._completed,
+            "failed": self._failed + (len(self._urls) - self._completed - self._failed),
+            "timedOut": reason == "timeout",
+            "retries": self._retries,
+            "bytes": bytesReceived,
+            "wallSeconds": round(seconds, 3),
+            "throughputBytesPerSecond": int(bytesReceived / seconds),
+            "cpuSeconds": round(time.process_time() - self._cpuStart, 3),
+            "peakRssBytes": self._peakRss(),
+            "firstByteMs": {
+                "median": statistics.median(firstByte) if firstByte else None,
+                "p95": firstByte[int(len(firstByte) * 0.95)] if firstByte else None,
+                "max": firstByte[-1] if firstByte else None,
+            },
+            "signalsPerSecond": {name: round(count / seconds, 1) for name, count in self._signals.items()},
+            "signalsTotal": sum(self._signals.values()),
+            "settings": self._settings.values(),
+        }
+        QCoreApplication.exit(0)
+
+    def _peakRss(self):
+        # ru_maxrss is kilobytes on Linux and bytes on macOS, Windows has no resource module
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    @staticmethod
+    def _runInWorker(context, urls, concurrent, threads, timeout):
+        resultQueue = context.Queue()
+        worker = context.Process(target=BenchmarkRunner.runWorker, args=(urls, concurrent, threads, timeout, resultQueue))
+        worker.start()
+        # A little longer than the worker's own timeout, in case it hangs outside the event loop
+        deadline = time.monotonic() + timeout + 60
+        result = None
+        while result is None and time.monotonic() < deadline:
+            try:
+                result = resultQueue.get(timeout=1)
+            except queue.Empty:
+                if not worker.is_alive():
+                    break
+        if worker.is_alive() and result is None:
+            worker.terminate()
+        worker.join()
+        if result is None:
+            result = {"files": len(urls), "completed": 0, "failed": len(urls), "timedOut": worker.exitcode is None or worker.exitcode < 0}
+            print(f"Worker stopped without a result (exit code {worker.exitcode})", file=sys.stderr)
+        return result
+
+    @staticmethod
+    def _gitCommit():
+        try:
+            folder = os.path.dirname(os.path.abspath(__file__))
+            output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=folder, capture_output=True, text=True, timeout=10)
+        except (OSError, subprocess.SubprocessError):
+            return ""
+        return output.stdout.strip() if output.returncode == 0 else ""
+
+    @staticmethod
+    def _formatRun(run):
+        if "wallSeconds" not in run:
+            return f"{run['scenario']} c={run['concurrentDownloads']} t={run['maxThreadsPerDownload']}: no result"
+        return (
+            f"{run['scenario']} c={run['concurrentDownloads']} t={run['maxThreadsPerDownload']}: "
+            f"{run['throughputBytesPerSecond'] / MB:.1f} MB/s, {run['wallSeconds']} s, cpu {run['cpuSeconds']} s, "
+            f"rss {(run['peakRssBytes'] or 0) / MB:.0f} MB, ttfb {run['firstByteMs']['median']} ms, "
+            f"{run['signalsTotal']} signals, {run['completed']}/{run['files']} completed"
+        )
+
+    @staticmethod
+    def _printComparison(baseline, results):
+        # Ratios are new / old, so above 1 means more throughput, CPU or memory than before
+        print(f"Compared with {baseline.get('commit', '')[:12] or 'baseline'}:")
+        key = lambda run: (run["scenario"], run["concurrentDownloads"], run["maxThreadsPerDownload"])
+        earlier = {key(run): run for run in baseline.get("runs", [])}
+        for run in results["runs"]:
+            old = earlier.get(key(run))
+            if old is None or "wallSeconds" not in run or "wallSeconds" not in old:
+                continue
+            ratios = []
+            for name in ("throughputBytesPerSecond", "cpuSeconds", "peakRssBytes", "signalsTotal"):
+                if old.get(name) and run.get(name) is not None:
+                    ratios.append(f"{name} x{run[name] / old[name]:.2f}")
+            print(f"  {run['scenario']} c={run['concurrentDownloads']} t={run['maxThreadsPerDownload']}: {', '.join(ratios)}")
@@ -0,0 +1,123 @@
+import random
+import re
+import threading
+import time
+import zlib
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Every file repeats the same block, so any size can be served without storing it
+BLOCK_SIZE = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class BenchmarkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), seed=0):
+        super().__init__(address, BenchmarkRequestHandler)
+        self.seed = seed
+        block = random.Random(seed).randbytes(BLOCK_SIZE)
+        self.block = block + block
+        self.lastModified = formatdate(0, usegmt=True)
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def serve(portQueue, seed=0):
+        # Runs in its own process so the server never counts against the engine's CPU time
+        server = BenchmarkServer(seed=seed)
+        portQueue.put(server.server_address[1])
+        server.serve_forever()
+
+    def randomFor(self, key):
+        # Repeating a request gets the next number of its own sequence, so injected
+        # errors do not depend on how threads interleave
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+        return random.Random(f"{self.seed}:{key}:{attempt}")
+
+class BenchmarkRequestHandler(BaseHTTPRequestHandler):
+    # /<name>?size=bytes&latency=ms&rate=bytes per second&errors=probability
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, withBody):
+        query = parse_qs(urlsplit(self.path).query)
+        size = int(query.get("size", ["0"])[0])
+        latency = int(query.get("latency", ["0"])[0])
+        rate = int(query.get("rate", ["0"])[0])
+        errors = float(query.get("errors", ["0"])[0])
+        rangeHeader = self.headers.get("Range", "")
+        rng = self.server.randomFor(f"{self.command} {self.path} {rangeHeader}")
+
+        if latency:
+            time.sleep(latency / 1000)
+        # Half of the injected errors are refused requests, the other half broken transfers
+        if withBody and errors and rng.random() < errors / 2:
+            self._sendEmpty(503)
+            return
+
+        start, end = 0, size - 1
+        match = RANGE_PATTERN.match(rangeHeader)
+        if rangeHeader and match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        length = end - start + 1
+        self.send_header("Content-Length", str(length))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        # Files share their contents, distinct ETags keep the engine from reusing one for another
+        self.send_header("ETag", f'"{self.server.seed}-{zlib.crc32(self.path.encode())}-{size}"')
+        self.send_header("Last-Modified", self.server.lastModified)
+        self.end_headers()
+        if not withBody:
+            return
+
+        cutoff = rng.randrange(length) if errors and length and rng.random() < errors / 2 else length
+        began = time.monotonic()
+        sent = 0
+        try:
+            while sent < cutoff:
+                offset = (start + sent) % BLOCK_SIZE
+                count = min(CHUNK_SIZE, cutoff - sent)
+                self.wfile.write(self.server.block[offset:offset + count])
+                sent += count
+                # The cap applies per connection, like a server shaping each client
+                if rate:
+                    delay = sent / rate - (time.monotonic() - began)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        if sent < length:
+            self.close_connection = True
+
+    def _sendEmpty(self, statusCode):
+        self.send_response(statusCode)
+        self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
@@ -0,0 +1,272 @@
+import re
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from PySide6.QtCore import QObject, Signal, Property, Slot, QUrl
+from PySide6.QtNetwork import QNetworkReply
+from .DownloadCache import DownloadCache
+from .DownloadListModel import DownloadListModel
+
+CHECKSUM_PATTERN = re.compile(r"^(md5|sha1|sha256|sha512):[0-9a-fA-F]+$")
+# Strongest first, Metalink 3 names them without the dash
+METALINK_HASHES = {"sha-512": "sha512", "sha-256": "sha256", "sha-1": "sha1", "md5": "md5"}
+IMPORT_ROLES = {
+    "url": "",
+    "filename": "",
+    "size": 0,
+    "mirrorCount": 0,
+    "isResumable": False,
+    # probing, ready, failed, invalid, downloaded or active. Failed rows are still queued,
+    # invalid ones do not match their Metalink description
+    "state": "probing",
+    "errorMessage": "",
+}
+
+class BulkImporter(QObject):
+    finished = Signal()
+    pendingCountChanged = Signal(int)  # rows still probing
+
+    def __init__(self, settings, networkManager, connections, createRequest, cache, downloadState, tracer=None, parent=None):
+        super().__init__(parent)
+        # downloadState(url) returns "downloaded", "active" or "" for URLs the engine knows.
+        # Probes count against the per-host limit of the engine's ConnectionPool, which
+        # releases them when the network manager reports them finished.
+        self._settings = settings
+        self._networkManager = networkManager
+        self._connections = connections
+        self._createRequest = createRequest
+        self._cache = cache
+        self._downloadState = downloadState
+        self._tracer = tracer
+        self._items = {}
+        self._waiting = deque()
+        self._probes = {}
+        self._pendingCount = 0
+        self._model = DownloadListModel(self, IMPORT_ROLES)
+        # Connected after the engine's own slot, so the finished reply no longer counts
+        # against its host when waiting probes are started
+        self._networkManager.finished.connect(self._onReplyFinished)
+
+    @staticmethod
+    def parseText(text):
+        # A Metalink document, or one URL per line followed by optional mirror URLs
+        # and an algorithm:hexdigest checksum
+        if text.lstrip().startswith("<"):
+            return BulkImporter.parseMetalink(text)
+        entries = []
+        for line in text.splitlines():
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            checksums = [field for field in fields[1:] if CHECKSUM_PATTERN.match(field)]
+            entries.append({
+                "url": fields[0],
+                "mirrors": [field for field in fields[1:] if field not in checksums],
+                "checksum": checksums[0] if checksums else "",
+                "filename": "",
+                "size": 0
+            })
+        return entries
+
+    @staticmethod
+    def parseMetalink(text):
+        # Metalink 4 (RFC 5854) and the older Metalink 3 layout, namespaces are ignored
+        try:
+            root = ElementTree.fromstring(text)
+        except ElementTree.ParseError as e:
+            raise ValueError(f"Invalid Metalink file: {e}")
+        for element in root.iter():
+            element.tag = element.tag.rsplit("}", 1)[-1]
+
+        entries = []
+        for file in root.iter("file"):
+            urls = []
+            for position, element in enumerate(file.iter("url")):
+                url = (element.text or "").strip()
+                if QUrl(url).scheme() in ("http", "https"):
+                    urls.append((BulkImporter._urlOrder(element), position, url))
+            if not urls:
+                continue
+            urls.sort()
+
+            hashes = {}
+            for element in file.iter("hash"):
+                kind = (element.get("type") or "").lower()
+                kind = {"sha1": "sha-1", "sha256": "sha-256", "sha512": "sha-512"}.get(kind, kind)
+                if kind in METALINK_HASHES and element.text:
+                    hashes[kind] = element.text.strip().lower()
+            checksum = next((f"{METALINK_HASHES[kind]}:{hashes[kind]}" for kind in METALINK_HASHES if kind in hashes), "")
+
+            size = file.findtext("size") or "0"
+            entries.append({
+                "url": urls[0][2],
+                "mirrors": [url for _, _, url in urls[1:]],
+                "checksum": checksum,
+                "filename": (file.get("name") or "").replace("\\", "/").split("/")[-1],
+                "size": int(size) if size.strip().isdigit() else 0
+            })
+        return entries
+
+    @staticmethod
+    def _urlOrder(element):
+        # Metalink 4 priority counts up from 1, Metalink 3 preference counts down from 100.
+        # URLs without either go last, the order in the file breaks ties.
+        priority = element.get("priority", "")
+        if priority.isdigit():
+            return int(priority)
+        preference = element.get("preference", "")
+        if preference.isdigit():
+            return 100 - int(preference)
+        return 1000
+
+    @Property(QObject, constant=True)
+    def model(self):
+        return self._model
+
+    @Property(int, notify=pendingCountChanged)
+    def pendingCount(self):
+        return self._pendingCount
+
+    @Slot(str, result=str)
+    def importText(self, text):
+        # Returns an error message, rows are added to the model and probed in the background
+        try:
+            entries = self.parseText(text)
+        except ValueError as e:
+            return str(e)
+        for entry in entries:
+            self._addItem(entry)
+        self._probeNext()
+        return ""
+
+    @Slot(QUrl, result=str)
+    def importFile(self, fileUrl):
+        path = fileUrl.toLocalFile() if fileUrl.isLocalFile() else fileUrl.toString()
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            return f"Cannot read {path}: {getattr(e, 'strerror', None) or str(e)}"
+        return self.importText(text)
+
+    @Slot(str)
+    def removeItem(self, url):
+        item = self._items.pop(url, None)
+        if item is None:
+            return
+        self._model.removeDownload(url)
+        if item["state"] == "probing":
+            self._pendingCount -= 1
+            self.pendingCountChanged.emit(self._pendingCount)
+
+    @Slot()
+    def clear(self):
+        probes, self._probes = self._probes, {}
+        self._items.clear()
+        self._waiting.clear()
+        for reply in probes:
+            reply.deleteLater()
+            reply.abort()
+        self._model.clear()
+        self._pendingCount = 0
+        self.pendingCountChanged.emit(0)
+
+    def items(self):
+        return [dict(item) for item in self._items.values()]
+
+    def takeItems(self):
+        items = self.items()
+        self.clear()
+        return items
+
+    def _addItem(self, entry):
+        url = QUrl(entry["url"])
+        urlStr = url.toString()
+        if not url.isValid() or url.scheme() not in ("http", "https") or not url.host():
+            return
+        item = self._items.get(urlStr)
+        if item is not None:
+            item["mirrors"] += [mirror for mirror in entry["mirrors"] if mirror not in item["mirrors"]]
+            item["checksum"] = item["checksum"] or entry["checksum"]
+            self._model.updateDownload(urlStr, mirrorCount=len(item["mirrors"]))
+            return
+
+        item = dict(entry, url=urlStr, probe=None, state=self._downloadState(urlStr) or "probing", errorMessage="")
+        self._items[urlStr] = item
+        self._model.addDownload(
+            urlStr,
+            filename=item["filename"] or self._filenameFromUrl(urlStr),
+            size=item["size"],
+            mirrorCount=len(item["mirrors"]),
+            state=item["state"]
+        )
+        if item["state"] == "probing":
+            self._waiting.append(urlStr)
+            self._pendingCount += 1
+
+    def _probeNext(self):
+        parallelism = max(1, self._settings.probeParallelism)
+        blocked = deque()
+        while self._waiting and len(self._probes) < parallelism:
+            urlStr = self._waiting.popleft()
+            if urlStr not in self._items:
+                continue
+            probe = self._cache.lookupMetadata(urlStr)
+            if probe is not None:
+                self._setProbe(urlStr, probe)
+                continue
+            hostKey = self._connections.hostKey(urlStr)
+            if not self._connections.canStart(hostKey):
+                # Tried again whenever a reply finishes
+                blocked.append(urlStr)
+                continue
+            reply = self._networkManager.head(self._createRequest(urlStr))
+            self._connections.register(hostKey, reply)
+            self._probes[reply] = urlStr
+            if self._tracer and self._tracer.enabled:
+                self._tracer.traceReply(urlStr, reply, "preflight")
+        self._waiting.extendleft(reversed(blocked))
+        self._model.commitChanges()
+        self.pendingCountChanged.emit(self._pendingCount)
+        if not self._waiting and not self._probes:
+            self.finished.emit()
+
+    def _onReplyFinished(self, reply):
+        urlStr = self._probes.pop(reply, None)
+        if urlStr is None:
+            # A download freed a connection that a waiting probe may use
+            if self._waiting:
+                self._probeNext()
+            return
+        reply.deleteLater()
+        if urlStr in self._items:
+            if reply.error() == QNetworkReply.NoError:
+                probe = DownloadCache.metadataFromReply(reply)
+                self._cache.storeMetadata(urlStr, probe)
+                self._setProbe(urlStr, probe)
+            else:
+                # The download itself still tries a plain GET, HEAD is not always allowed
+                self._setState(urlStr, "failed", errorMessage=reply.errorString())
+        self._probeNext()
+
+    def _setProbe(self, urlStr, probe):
+        item = self._items[urlStr]
+        size = probe["bytesTotal"] or item["size"]
+        if item["size"] and probe["bytesTotal"] and item["size"] != probe["bytesTotal"]:
+            self._setState(urlStr, "invalid", errorMessage="Size differs from the Metalink file")
+            return
+
+        item["probe"] = dict(probe, probedAt=time.time())
+        item["filename"] = item["filename"] or probe.get("filename") or self._filenameFromUrl(probe["location"] or urlStr)
+        self._setState(urlStr, "ready", filename=item["filename"], size=size, isResumable=probe["acceptRanges"] and size > 0)
+
+    def _setState(self, urlStr, state, **values):
+        item = self._items[urlStr]
+        if item["state"] == "probing":
+            self._pendingCount -= 1
+        item["state"] = state
+        item["errorMessage"] = values.get("errorMessage", "")
+        self._model.updateDownload(urlStr, state=state, **values)
+
+    def _filenameFromUrl(self, urlStr):
+        return QUrl(urlStr).fileName() or QUrl(urlStr).host()
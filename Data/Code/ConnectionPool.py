@@ -0,0 +1,90 @@
+from collections import deque
+from PySide6.QtCore import QUrl
+from PySide6.QtNetwork import QNetworkRequest
+
+# Qt opens at most six HTTP/1.1 connections per host, requests beyond that wait
+# inside Qt where their transfer timeout is already running
+MAX_HTTP1_CONNECTIONS = 6
+HTTP2_STREAM_LIMIT = 100
+
+class ConnectionPool:
+    def __init__(self, maxConnections=MAX_HTTP1_CONNECTIONS):
+        self._maxConnections = maxConnections
+        self._hosts = {}
+        self._replies = {}
+
+    def setMaxConnections(self, maxConnections):
+        self._maxConnections = max(1, min(MAX_HTTP1_CONNECTIONS, maxConnections))
+
+    def hostKey(self, urlStr):
+        url = QUrl(urlStr)
+        port = url.port(443 if url.scheme() == "https" else 80)
+        return f"{url.scheme()}://{url.host()}:{port}"
+
+    def canStart(self, key):
+        host = self._hosts.get(key)
+        return host is None or host["active"] < self._limit(host)
+
+    def register(self, key, reply):
+        # Every request is counted, including the ones started past the limit
+        host = self._host(key)
+        host["active"] += 1
+        host["peak"] = max(host["peak"], host["active"])
+        self._replies[reply] = key
+
+    def release(self, reply):
+        # Returns the host the reply counted against, None for unknown replies
+        key = self._replies.pop(reply, None)
+        if key is None:
+            return None
+        host = self._hosts[key]
+        host["active"] -= 1
+        # Only replies that got a response know which protocol the server speaks
+        if reply.attribute(QNetworkRequest.HttpStatusCodeAttribute):
+            host["isHttp2"] = bool(reply.attribute(QNetworkRequest.Http2WasUsedAttribute))
+        return key
+
+    def wait(self, key, owner, item):
+        self._host(key)["waiting"].append((owner, item))
+
+    def nextWaiting(self, key):
+        # (owner, item) of the oldest waiting request once the host has room, else None
+        host = self._hosts.get(key)
+        if host is None or not host["waiting"] or host["active"] >= self._limit(host):
+            return None
+        return host["waiting"].popleft()
+
+    def dropWaiting(self, owner):
+        for host in self._hosts.values():
+            if any(entry[0] == owner for entry in host["waiting"]):
+                host["waiting"] = deque(entry for entry in host["waiting"] if entry[0] != owner)
+
+    def hasWaiting(self, key):
+        host = self._hosts.get(key)
+        return bool(host and host["waiting"])
+
+    def stats(self):
+        # HTTP/2 multiplexes every request over one connection as a stream
+        stats = []
+        for key, host in self._hosts.items():
+            if not host["active"] and not host["waiting"]:
+                continue
+            stats.append({
+                "host": key,
+                "isHttp2": host["isHttp2"],
+                "connections": min(host["active"], 1) if host["isHttp2"] else host["active"],
+                "streams": host["active"],
+                "waiting": len(host["waiting"]),
+                "peak": host["peak"],
+            })
+        return stats
+
+    def _host(self, key):
+        host = self._hosts.get(key)
+        if host is None:
+            host = {"active": 0, "peak": 0, "isHttp2": False, "waiting": deque()}
+            self._hosts[key] = host
+        return host
+
+    def _limit(self, host):
+        return HTTP2_STREAM_LIMIT if host["isHttp2"] else self._maxConnections
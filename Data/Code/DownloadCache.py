@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import unquote
+from PySide6.QtCore import QCoreApplication, QObject, QTimer
+from PySide6.QtNetwork import QNetworkRequest
+
+# off: nothing is cached, metadata: HEAD and redirect results, payload: also keeps
+# copies of small files so they can be restored without downloading them again
+CACHE_MODES = ("off", "metadata", "payload")
+METADATA_MAX_AGE_S = 300
+METADATA_ENTRY_SIZE = 1024
+PAYLOAD_MAX_SIZE = 8 * 1024 * 1024
+INDEX_FILE = "index.json"
+SAVE_DELAY_MS = 1000
+
+class DownloadCache(QObject):
+    def __init__(self, folder, maxSize, mode="metadata", parent=None):
+        super().__init__(parent)
+        self._folder = ""
+        self._maxSize = max(0, maxSize)
+        self._mode = mode if mode in CACHE_MODES else "metadata"
+        # url -> entry, least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+        self._saveTimer = QTimer(self)
+        self._saveTimer.setSingleShot(True)
+        self._saveTimer.setInterval(SAVE_DELAY_MS)
+        self._saveTimer.timeout.connect(self._saveIndex)
+        if QCoreApplication.instance():
+            QCoreApplication.instance().aboutToQuit.connect(self._saveIndex)
+
+        self.setFolder(folder)
+
+    def setMode(self, mode):
+        if mode in CACHE_MODES:
+            self._mode = mode
+
+    def setMaxSize(self, maxSize):
+        self._maxSize = max(0, maxSize)
+        self._evict()
+
+    def setFolder(self, folder):
+        if folder == self._folder:
+            return
+        if self._saveTimer.isActive():
+            self._saveIndex()
+        self._folder = folder
+        self._loadIndex()
+
+    def stats(self):
+        lookups = self._hits + self._misses
+        return {
+            "cacheHits": self._hits,
+            "cacheMisses": self._misses,
+            "cacheHitRate": self._hits / lookups if lookups else 0.0,
+            "cacheSize": self._size,
+        }
+
+    @staticmethod
+    def metadataFromReply(reply):
+        # What a HEAD reply says about a file, in the form the cache keeps it
+        etag, lastModified = DownloadCache.validatorsFromReply(reply)
+        location = reply.url().toString()
+        return {
+            "bytesTotal": int(reply.header(QNetworkRequest.ContentLengthHeader) or 0),
+            "acceptRanges": reply.rawHeader("Accept-Ranges").data().strip().lower() == b"bytes",
+            "etag": etag,
+            "lastModified": lastModified,
+            # Where the redirects ended, segments go there directly
+            "location": location if location != reply.request().url().toString() else "",
+            "filename": DownloadCache.filenameFromReply(reply),
+        }
+
+    @staticmethod
+    def validatorsFromReply(reply):
+        # Weak ETags cannot be used with If-Range, Last-Modified is the next best validator
+        etag = reply.rawHeader("ETag").data().decode("latin-1").strip()
+        lastModified = reply.rawHeader("Last-Modified").data().decode("latin-1").strip()
+        return ("" if etag.startswith("W/") else etag), lastModified
+
+    @staticmethod
+    def filenameFromReply(reply):
+        # filename* (RFC 5987) wins over the plain filename parameter
+        header = reply.rawHeader("Content-Disposition").data().decode("latin-1")
+        match = re.search(r"filename\*\s*=\s*([\w-]*)'[^']*'([^;\s]+)", header, re.I)
+        if match:
+            try:
+                name = unquote(match.group(2), encoding=match.group(1) or "utf-8", errors="replace")
+            except LookupError:
+                name = unquote(match.group(2), errors="replace")
+        else:
+            match = re.search(r'filename\s*=\s*"([^"]*)"', header, re.I) or re.search(r"filename\s*=\s*([^;\s]+)", header, re.I)
+            name = match.group(1) if match else ""
+        # Only the last path component is ever used
+        return name.replace("\\", "/").split("/")[-1].strip()
+
+    def lookupMetadata(self, url):
+        # Probe results are trusted for a few minutes, after that the server is asked again
+        if self._mode == "off":
+            return None
+        entry = self._entries.get(url)
+        if entry is None or not entry["storedAt"] or time.time() - entry["storedAt"] > METADATA_MAX_AGE_S:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._touch(url)
+        return dict(entry["metadata"])
+
+    def storeMetadata(self, url, metadata):
+        # Without a validator a changed file could not be told apart from the cached one
+        if self._mode == "off" or not (metadata["etag"] or metadata["lastModified"]):
+            return
+        entry = self._entries.get(url) or self._createEntry(url)
+        entry["metadata"] = dict(metadata)
+        entry["storedAt"] = time.time()
+        self._touch(url)
+        self._evict()
+        self._scheduleSave()
+
+    def lookupPayload(self, url, size, etag, lastModified):
+        if self._mode != "payload" or not self._isCacheable(size, etag, lastModified):
+            return ""
+        entry = self._entries.get(url)
+        path = self._payloadPath(entry, size, etag, lastModified)
+        if not path or not os.path.isfile(path) or os.path.getsize(path) != size:
+            self._misses += 1
+            return ""
+        self._hits += 1
+        self._touch(url)
+        return path
+
+    def reservePayload(self, url, size, etag, lastModified):
+        # Returns where a finished download should be copied to, "" when it is not cached.
+        # Full-size downloads never go through the cache.
+        if self._mode != "payload" or not self._isCacheable(size, etag, lastModified):
+            return ""
+        entry = self._entries.get(url) or self._createEntry(url)
+        if self._payloadPath(entry, size, etag, lastModified):
+            return ""
+        self._removePayload(entry)
+        entry["payload"] = {
+            "file": hashlib.sha1(url.encode("utf-8")).hexdigest(),
+            "size": size,
+            "etag": etag,
+            "lastModified": lastModified,
+        }
+        self._size += size
+        self._touch(url)
+        self._evict()
+        self._scheduleSave()
+        if self._entries.get(url) is not entry:
+            return ""
+        os.makedirs(self._folder, exist_ok=True)
+        return os.path.join(self._folder, entry["payload"]["file"])
+
+    def _isCacheable(self, size, etag, lastModified):
+        # Without a validator there is no way to tell that a stored copy is still current
+        return 0 < size <= min(PAYLOAD_MAX_SIZE, self._maxSize) and bool(etag or lastModified)
+
+    def _createEntry(self, url):
+        entry = {"metadata": {}, "storedAt": 0, "payload": None}
+        self._entries[url] = entry
+        self._size += METADATA_ENTRY_SIZE
+        return entry
+
+    def _payloadPath(self, entry, size, etag, lastModified):
+        payload = entry and entry["payload"]
+        if not payload or payload["size"] != size:
+            return ""
+        if payload["etag"] != etag or payload["lastModified"] != lastModified:
+            return ""
+        return os.path.join(self._folder, payload["file"])
+
+    def _touch(self, url):
+        self._entries.move_to_end(url)
+
+    def _evict(self):
+        while self._entries and self._size > self._maxSize:
+            url, entry = self._entries.popitem(last=False)
+            self._removePayload(entry)
+            self._size -= METADATA_ENTRY_SIZE
+            self._scheduleSave()
+
+    def _removePayload(self, entry):
+        payload = entry["payload"]
+        if not payload:
+            return
+        entry["payload"] = None
+        self._size -= payload["size"]
+        try:
+            os.remove(os.path.join(self._folder, payload["file"]))
+        except OSError:
+            pass
+
+    def _scheduleSave(self):
+        if not self._saveTimer.isActive():
+            self._saveTimer.start()
+
+    def _loadIndex(self):
+        self._entries.clear()
+        self._size = 0
+        try:
+            with open(os.path.join(self._folder, INDEX_FILE), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+        for url, entry in saved:
+            self._entries[url] = entry
+            self._size += METADATA_ENTRY_SIZE + (entry["payload"]["size"] if entry["payload"] else 0)
+        self._evict()
+
+    def _saveIndex(self):
+        self._saveTimer.stop()
+        if not self._folder:
+            return
+        try:
+            os.makedirs(self._folder, exist_ok=True)
+            path = os.path.join(self._folder, INDEX_FILE)
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(list(self._entries.items()), f, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"Error saving cache index: {e.strerror or str(e)}")
@@ -1,20 +1,74 @@
+import bisect
+import itertools
 import json
-from PySide6.QtCore import QObject, Signal, Property, QDir, QFile, QUrl, QFileInfo
+import os
+import sqlite3
+from PySide6.QtCore import QCoreApplication, QObject, Signal, Property, QDir, QFile, QUrl, QFileInfo, QTimer
+from .FolderReconciler import FolderReconciler
+
+# Columns of the history table, new ones are added to existing databases on open
+RECORD_COLUMNS = {
+    'url': "TEXT PRIMARY KEY",
+    'filename': "TEXT NOT NULL DEFAULT ''",
+    'filesize': "INTEGER NOT NULL DEFAULT 0",
+    'folder': "TEXT NOT NULL DEFAULT ''",
+    'checksum': "TEXT NOT NULL DEFAULT ''",
+    'etag': "TEXT NOT NULL DEFAULT ''",
+    # mtime of the file when it was first seen after the download, 0 until then
+    'mtime': "INTEGER NOT NULL DEFAULT 0",
+}
+COMMIT_DELAY_MS = 500
+# date is the order records were added in, which is the order downloads finished
+SORT_KEYS = ("date", "size", "host", "name")
+# File info of a folder that has not been listed yet
+UNLISTED = object()
 
 class DownloadHistory(QObject):
     historyChanged = Signal()
+    recordAdded = Signal(str)  # url
+    recordRemoved = Signal(str)  # url
+    recordsRemoved = Signal(list)  # urls, removed together by removeRecords
+    recordMoved = Signal(str)  # url
+    filesChanged = Signal(list)  # urls whose file appeared, disappeared or changed
 
     def __init__(self, settings, parent=None):
         super().__init__(parent)
         self._settings = settings
-        self._history = []
+        self._records = {}
+        self._urlIndex = {}
+        self._contentIndex = {}
+        # Search index: url -> (lowercased "filename\nurl", host, position), and a sorted
+        # list of (lowercased filename or url, url) pairs for prefix matches
+        self._searchIndex = {}
+        self._prefixIndex = []
+        self._positions = itertools.count()
+        self._pendingWrites = {}
+        # Folder listings from the reconciler, file states are looked up here instead of
+        # calling stat for every record
+        self._folderFiles = {}
         self._downloadFolder = settings.downloadFolder
-        self._historyFile = QDir.current().filePath("Download_History.json")
+        self._historyFile = QDir.current().filePath("Download_History.db")
+        self._legacyHistoryFile = QDir.current().filePath("Download_History.json")
+        self._db = None
+
+        self._commitTimer = QTimer(self)
+        self._commitTimer.setSingleShot(True)
+        self._commitTimer.setInterval(COMMIT_DELAY_MS)
+        self._commitTimer.timeout.connect(self._commitPending)
+        self._reconciler = FolderReconciler(self)
+        self._reconciler.scanned.connect(self._onFolderScanned)
+        if QCoreApplication.instance():
+            QCoreApplication.instance().aboutToQuit.connect(self._commitPending)
+            QCoreApplication.instance().aboutToQuit.connect(self._reconciler.stop)
+
         self._ensureHistoryFile()
+        self._reconciler.start()
+        for folder in {record.get('folder') or self._downloadFolder for record in self._records.values()} | {self._downloadFolder}:
+            self._watchFolder(folder)
 
     @Property(list, notify=historyChanged)
     def history(self):
-        return self._history
+        return list(self._records.values())
 
     @Property(str)
     def downloadFolder(self):
@@ -23,36 +77,179 @@ class DownloadHistory(QObject):
     def setDownloadFolder(self, path):
         if path and QDir(path).exists():
             self._downloadFolder = path
+            self._watchFolder(path)
 
-    def addRecord(self, url, filename, folder=None):
+    def addRecord(self, url, filename, folder=None, checksum="", etag="", filesize=-1):
+        # filesize is passed by callers that just wrote the file, others look it up
+        if url in self._records:
+            return
         if not folder:
             folder = self._downloadFolder
-        filePath = QDir(folder).filePath(filename)
-        size = QFile(filePath).size() if QFile.exists(filePath) else 0
-        if not any(d['url'] == url for d in self._history):
-            self._history.append({
-                'url': url,
-                'filename': filename,
-                'filesize': size,
-                'folder': folder
-            })
-            self._saveHistory()
+        if filesize < 0:
+            fileInfo = self._fileInfo(folder, filename)
+            filesize = fileInfo[0] if fileInfo else 0
+        else:
+            # Known until the folder is listed again, the mtime is filled in then
+            files = self._folderFiles.get(self._folderKey(folder))
+            if files is not None:
+                files[filename] = (filesize, 0)
+        record = {
+            'url': url,
+            'filename': filename,
+            'filesize': filesize,
+            'folder': folder,
+            'checksum': checksum,
+            'etag': etag,
+            'mtime': 0
+        }
+        self._watchFolder(folder)
+        self._records[url] = record
+        self._indexRecord(record)
+        self._scheduleWrite(url, record)
+        self.recordAdded.emit(url)
+        self.historyChanged.emit()
 
     def removeRecord(self, url, deleteFile=False):
-        record = next((d for d in self._history if d['url'] == url), None)
-        if record and deleteFile:
+        record = self._records.pop(url, None)
+        if record is None:
+            return
+        if deleteFile:
             file_path = QDir(record.get('folder', self._downloadFolder)).filePath(record['filename'])
             if QFile.exists(file_path):
                 QFile.remove(file_path)
 
-        self._history = [d for d in self._history if d['url'] != url]
-        self._saveHistory()
+        self._unindexRecord(record)
+        self._scheduleWrite(url, None)
+        self.recordRemoved.emit(url)
+        self.historyChanged.emit()
+
+    def moveRecord(self, url, folder, filename):
+        # The file was moved or renamed after the download, it is still the same content
+        record = self._records.get(url)
+        if record is None:
+            return
+        position = self._searchIndex[url][2]
+        self._unindexRecord(record)
+        record['folder'] = folder
+        record['filename'] = filename
+        self._indexRecord(record, position=position)
+        files = self._folderFiles.get(self._folderKey(folder))
+        if files is not None and filename not in files:
+            files[filename] = (record['filesize'], record['mtime'])
+        self._watchFolder(folder)
+        self._scheduleWrite(url, record)
+        self.recordMoved.emit(url)
+        self.historyChanged.emit()
+
+    def removeRecords(self, urls, deleteFiles=False):
+        # Removed in one transaction, listeners get a single recordsRemoved
+        removed = []
+        for url in urls:
+            record = self._records.pop(url, None)
+            if record is None:
+                continue
+            if deleteFiles:
+                try:
+                    os.remove(self.getRecordPath(record))
+                except OSError:
+                    pass
+            self._unindexRecord(record, False)
+            self._pendingWrites[url] = None
+            removed.append(url)
+        if not removed:
+            return 0
+        removedSet = set(removed)
+        self._prefixIndex = [entry for entry in self._prefixIndex if entry[1] not in removedSet]
+        self._commitPending()
+        self.recordsRemoved.emit(removed)
+        self.historyChanged.emit()
+        return len(removed)
+
+    def query(self, text="", sortKey="date", descending=False, prefix=False):
+        # URLs whose filename or URL contains text, or starts with it when prefix is set
+        text = text.strip().lower()
+        if not text:
+            urls = list(self._records)
+        elif prefix:
+            start = bisect.bisect_left(self._prefixIndex, (text,))
+            matches = itertools.takewhile(lambda entry: entry[0].startswith(text), itertools.islice(self._prefixIndex, start, None))
+            urls = list(dict.fromkeys(url for _, url in matches))
+        else:
+            urls = [url for url, entry in self._searchIndex.items() if text in entry[0]]
+        if sortKey != "date" or prefix or descending:
+            urls.sort(key=lambda url: self.sortValue(url, sortKey), reverse=descending)
+        return urls
+
+    def matches(self, url, text="", prefix=False):
+        text = text.strip().lower()
+        entry = self._searchIndex.get(url)
+        if entry is None or not text:
+            return entry is not None
+        if prefix:
+            return any(value.startswith(text) for value in entry[0].split("\n"))
+        return text in entry[0]
+
+    def sortValue(self, url, sortKey):
+        record = self._records[url]
+        _, host, position = self._searchIndex[url]
+        if sortKey == "size":
+            return (record['filesize'], position)
+        if sortKey == "host":
+            return (host, record['filename'].lower(), position)
+        if sortKey == "name":
+            return (record['filename'].lower(), position)
+        return (position,)
+
+    def getRecord(self, url):
+        return self._records.get(url)
+
+    def urls(self):
+        return list(self._records)
+
+    def findContent(self, size=0, etag="", checksum=""):
+        # A checksum match is preferred, size + strong ETag identifies the same file
+        # served under another URL. Only records whose file is still intact count.
+        keys = []
+        if checksum:
+            keys.append(('checksum', checksum))
+        if size > 0 and etag:
+            keys.append(('etag', size, etag))
+        for key in keys:
+            record = self._records.get(self._contentIndex.get(key))
+            if record is None:
+                continue
+            fileInfo = self._recordFileInfo(record)
+            if fileInfo and fileInfo[0] == record['filesize']:
+                return record
+        return None
+
+    def refreshFiles(self):
+        # Lists every known folder again in the background, the watcher only
+        # reports files that are added, removed or renamed
+        for folder in list(self._folderFiles):
+            self._reconciler.scan(folder)
+
+    def fileState(self, url):
+        # Whether the downloaded file is still there and unchanged, from the last folder listing.
+        # Asked for every visible row, so nothing here touches the disk.
+        record = self._records.get(url)
+        fileInfo = self._listedFileInfo(record.get('folder') or self._downloadFolder, record['filename']) if record else None
+        if fileInfo is UNLISTED:
+            # Neither missing nor changed until the listing arrives with filesChanged
+            return {'fileExists': True, 'isModified': False}
+        return {
+            'fileExists': fileInfo is not None,
+            'isModified': fileInfo is not None and self._isModified(record, fileInfo),
+        }
+
+    def getRecordPath(self, record):
+        return QDir(record.get('folder', self._downloadFolder)).filePath(record['filename'])
 
     def getFileUrl(self, filename, folder=None):
         if not folder:
             folder = self._downloadFolder
         filePath = QDir(folder).filePath(filename)
-        return QUrl.fromLocalFile(filePath) if QFile.exists(filePath) else QUrl()
+        return QUrl.fromLocalFile(filePath) if self._fileInfo(folder, filename) else QUrl()
 
     def getFolderUrl(self, filename, folder=None):
         if not folder:
@@ -60,29 +257,196 @@ class DownloadHistory(QObject):
         filePath = QDir(folder).filePath(filename)
         return QUrl.fromLocalFile(QFileInfo(filePath).absolutePath())
 
+    def flush(self):
+        self._commitPending()
+
+    def _indexKey(self, url):
+        return url.strip().lower()
+
+    def _contentKeys(self, record):
+        keys = []
+        if record.get('checksum'):
+            keys.append(('checksum', record['checksum']))
+        if record.get('filesize', 0) > 0 and record.get('etag'):
+            keys.append(('etag', record['filesize'], record['etag']))
+        return keys
+
+    def _indexRecord(self, record, keepSorted=True, position=None):
+        # Bulk loads pass keepSorted=False and sort the prefix index once afterwards.
+        # position keeps a re-indexed record in its place in the date order.
+        url = record['url']
+        self._urlIndex[self._indexKey(url)] = url
+        for key in self._contentKeys(record):
+            self._contentIndex[key] = url
+        filename = record['filename'].lower()
+        self._searchIndex[url] = (f"{filename}\n{url.lower()}", QUrl(url).host().lower(),
+                                  next(self._positions) if position is None else position)
+        for entry in ((filename, url), (url.lower(), url)):
+            if keepSorted:
+                bisect.insort(self._prefixIndex, entry)
+            else:
+                self._prefixIndex.append(entry)
+
+    def _unindexRecord(self, record, keepSorted=True):
+        url = record['url']
+        self._urlIndex.pop(self._indexKey(url), None)
+        for key in self._contentKeys(record):
+            if self._contentIndex.get(key) == url:
+                del self._contentIndex[key]
+        self._searchIndex.pop(url, None)
+        if keepSorted:
+            for entry in ((record['filename'].lower(), url), (url.lower(), url)):
+                position = bisect.bisect_left(self._prefixIndex, entry)
+                if position < len(self._prefixIndex) and self._prefixIndex[position] == entry:
+                    del self._prefixIndex[position]
+
     def _ensureHistoryFile(self):
-        if not QFile.exists(self._historyFile):
-            self._history = []
-            self._saveHistory()
+        try:
+            self._db = sqlite3.connect(self._historyFile)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._ensureSchema()
+        except sqlite3.Error as e:
+            print(f"Error opening history database: {str(e)}")
+            self._db = None
+            return
         self._loadHistory()
+        if not self._records and QFile.exists(self._legacyHistoryFile):
+            self._migrateLegacyHistory()
+
+    def _ensureSchema(self):
+        columns = ", ".join(f"{name} {sqlType}" for name, sqlType in RECORD_COLUMNS.items())
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS history ({columns})")
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(history)")}
+        for name, sqlType in RECORD_COLUMNS.items():
+            if name not in existing:
+                self._db.execute(f"ALTER TABLE history ADD COLUMN {name} {sqlType}")
+        self._db.commit()
 
     def _loadHistory(self):
+        names = list(RECORD_COLUMNS)
+        cursor = self._db.execute(f"SELECT {', '.join(names)} FROM history ORDER BY rowid")
+        for row in cursor:
+            record = dict(zip(names, row))
+            self._records[record['url']] = record
+            self._indexRecord(record, False)
+        self._prefixIndex.sort()
+        self.historyChanged.emit()
+
+    def _migrateLegacyHistory(self):
         try:
-            with open(self._historyFile, 'r', encoding='utf-8') as f:
-                self._history = json.load(f)
-            self.historyChanged.emit()
-        except (json.JSONDecodeError, FileNotFoundError):
-            self._history = []
-
-    def _saveHistory(self):
-        with open(self._historyFile, 'w', encoding='utf-8') as f:
-            json.dump(self._history, f, indent=4, ensure_ascii=False)
+            with open(self._legacyHistoryFile, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+
+        for item in legacy:
+            url = item.get('url')
+            if not url or url in self._records:
+                continue
+            record = {name: item.get(name, self._columnDefault(name)) for name in RECORD_COLUMNS}
+            self._records[url] = record
+            self._indexRecord(record, False)
+            self._pendingWrites[url] = record
+
+        self._prefixIndex.sort()
+        self._commitPending()
+        # Keep the old file around under a new name so the migration runs only once
+        QFile.rename(self._legacyHistoryFile, self._legacyHistoryFile + ".bak")
         self.historyChanged.emit()
 
+    def _columnDefault(self, name):
+        return 0 if RECORD_COLUMNS[name].startswith("INTEGER") else ""
+
+    def _scheduleWrite(self, url, record):
+        self._pendingWrites[url] = record
+        if not self._commitTimer.isActive():
+            self._commitTimer.start()
+
+    def _commitPending(self):
+        self._commitTimer.stop()
+        if not self._pendingWrites or self._db is None:
+            return
+
+        pending, self._pendingWrites = self._pendingWrites, {}
+        names = list(RECORD_COLUMNS)
+        upserts = [tuple(record.get(name, self._columnDefault(name)) for name in names)
+                   for record in pending.values() if record is not None]
+        deletes = [(url,) for url, record in pending.items() if record is None]
+        try:
+            with self._db:
+                if upserts:
+                    # Upsert rather than REPLACE so records keep their rowid and order
+                    updates = ", ".join(f"{name} = excluded.{name}" for name in names[1:])
+                    self._db.executemany(
+                        f"INSERT INTO history ({', '.join(names)}) "
+                        f"VALUES ({', '.join('?' for _ in names)}) "
+                        f"ON CONFLICT(url) DO UPDATE SET {updates}",
+                        upserts
+                    )
+                if deletes:
+                    self._db.executemany("DELETE FROM history WHERE url = ?", deletes)
+        except sqlite3.Error as e:
+            print(f"Error saving history: {str(e)}")
+            pending.update(self._pendingWrites)
+            self._pendingWrites = pending
+
     def isUrlValid(self, url):
-        url = url.strip().lower()
-        for record in self._history:
-            if record['url'].lower() == url:
-                file_path = QDir(record.get('folder', self._downloadFolder)).filePath(record['filename'])
-                return QFile.exists(file_path)
-        return False
+        url = self._urlIndex.get(self._indexKey(url))
+        if url is None:
+            return False
+        return self._recordFileInfo(self._records[url]) is not None
+
+    def _folderKey(self, folder):
+        return os.path.normpath(folder)
+
+    def _watchFolder(self, folder):
+        key = self._folderKey(folder)
+        if key not in self._folderFiles or not self._reconciler.isWatching(key):
+            self._reconciler.watch(key)
+
+    def _listedFileInfo(self, folder, filename):
+        # (size, mtime), None when the file is missing or UNLISTED while the folder's
+        # first listing is still being made
+        key = self._folderKey(folder)
+        files = self._folderFiles.get(key)
+        if files is None:
+            self._reconciler.scan(key)
+            return UNLISTED
+        return files.get(filename)
+
+    def _fileInfo(self, folder, filename):
+        # Like _listedFileInfo, but a folder that was not listed yet is asked directly
+        fileInfo = self._listedFileInfo(folder, filename)
+        if fileInfo is not UNLISTED:
+            return fileInfo
+        try:
+            stat = os.stat(os.path.join(folder, filename))
+        except OSError:
+            return None
+        return (stat.st_size, int(stat.st_mtime))
+
+    def _recordFileInfo(self, record):
+        return self._fileInfo(record.get('folder') or self._downloadFolder, record['filename'])
+
+    def _isModified(self, record, fileInfo):
+        size, mtime = fileInfo
+        return size != record['filesize'] or bool(record['mtime'] and mtime and mtime != record['mtime'])
+
+    def _onFolderScanned(self, folder, files):
+        previous = self._folderFiles.get(folder)
+        self._folderFiles[folder] = files
+        changed = []
+        for url, record in self._records.items():
+            if self._folderKey(record.get('folder') or self._downloadFolder) != folder:
+                continue
+            name = record['filename']
+            fileInfo = files.get(name)
+            if fileInfo and not record['mtime'] and fileInfo[0] == record['filesize']:
+                # The first listing after the download is the reference for later changes
+                record['mtime'] = fileInfo[1]
+                self._scheduleWrite(url, record)
+            if previous is None or previous.get(name) != fileInfo:
+                changed.append(url)
+        if changed:
+            self.filesChanged.emit(changed)
@@ -0,0 +1,113 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt, Slot
+
+# Role names and the value a new row starts with
+DOWNLOAD_ROLES = {
+    "url": "",
+    "filename": "",
+    "savePath": "",
+    "progress": 0.0,
+    "speed": 0.0,
+    "eta": -1,
+    "retries": 0,
+    "mirror": "",
+    "bufferedBytes": 0,
+    "isError": False,
+    "isCompleted": False,
+    "isPaused": False,
+    "isQueued": False,
+    "errorMessage": "",
+    "postStage": "",
+    "postProgress": 0.0,
+}
+
+class DownloadListModel(QAbstractListModel):
+    def __init__(self, parent=None, roles=DOWNLOAD_ROLES):
+        super().__init__(parent)
+        self._rows = []
+        self._rowIndex = {}
+        self._dirtyRows = set()
+        self._dirtyRoles = set()
+        self._defaults = roles
+        self._roles = {Qt.UserRole + i: name for i, name in enumerate(roles)}
+        self._roleIds = {name: role for role, name in self._roles.items()}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        name = self._roles.get(role)
+        return self._rows[index.row()].get(name) if name else None
+
+    def roleNames(self):
+        return {role: name.encode() for role, name in self._roles.items()}
+
+    @Slot(str, result=bool)
+    def contains(self, url):
+        return url in self._rowIndex
+
+    def addDownload(self, url, **values):
+        if url in self._rowIndex:
+            self.updateDownload(url, **values)
+            self.commitChanges()
+            return
+
+        row = dict(self._defaults)
+        row["url"] = url
+        row.update(values)
+        position = len(self._rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.append(row)
+        self._rowIndex[url] = position
+        self.endInsertRows()
+
+    def updateDownload(self, url, **values):
+        # Changes are collected until commitChanges so a burst becomes one dataChanged
+        position = self._rowIndex.get(url)
+        if position is None:
+            return
+        self._rows[position].update(values)
+        self._dirtyRows.add(position)
+        self._dirtyRoles.update(self._roleIds[name] for name in values)
+
+    def commitChanges(self):
+        if not self._dirtyRows:
+            return
+        first, last = min(self._dirtyRows), max(self._dirtyRows)
+        roles = sorted(self._dirtyRoles)
+        self._dirtyRows.clear()
+        self._dirtyRoles.clear()
+        self.dataChanged.emit(self.index(first), self.index(last), roles)
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._rowIndex = {}
+        self._dirtyRows.clear()
+        self._dirtyRoles.clear()
+        self.endResetModel()
+
+    def removeDownload(self, url):
+        position = self._rowIndex.get(url)
+        if position is None:
+            return
+        self.commitChanges()
+        self.beginRemoveRows(QModelIndex(), position, position)
+        del self._rows[position]
+        self._reindex()
+        self.endRemoveRows()
+
+    @Slot()
+    def removeFinished(self):
+        self.commitChanges()
+        for position in range(len(self._rows) - 1, -1, -1):
+            row = self._rows[position]
+            if row["isError"] or row["isCompleted"]:
+                self.beginRemoveRows(QModelIndex(), position, position)
+                del self._rows[position]
+                self.endRemoveRows()
+        self._reindex()
+
+    def _reindex(self):
+        self._rowIndex = {row["url"]: position for position, row in enumerate(self._rows)}
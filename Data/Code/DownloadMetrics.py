@@ -0,0 +1,60 @@
+import math
+from PySide6.QtCore import QElapsedTimer
+
+SPEED_TIME_CONSTANT = 2.0
+
+class DownloadMetrics:
+    def __init__(self):
+        self._clock = QElapsedTimer()
+        self._clock.start()
+        self._jobs = {}
+
+    def startJob(self, key, bytesReceived=0):
+        # Called whenever a job (re)starts transferring so paused time never counts
+        self._jobs[key] = {
+            "sampleBytes": bytesReceived,
+            "sampleTime": self._clock.elapsed(),
+            "speed": 0.0,
+            "hasSample": False
+        }
+
+    def stopJob(self, key):
+        self._jobs.pop(key, None)
+
+    def update(self, key, bytesReceived):
+        job = self._jobs.get(key)
+        if job is None:
+            return 0.0
+
+        now = self._clock.elapsed()
+        seconds = (now - job["sampleTime"]) / 1000.0
+        if seconds <= 0:
+            return job["speed"]
+
+        # A restarted transfer (e.g. server ignored Range) must not look like negative speed
+        delta = max(0, bytesReceived - job["sampleBytes"])
+        rate = delta / seconds
+        if job["hasSample"]:
+            # Exponential moving average weighted by the real sample interval
+            alpha = 1.0 - math.exp(-seconds / SPEED_TIME_CONSTANT)
+            job["speed"] += alpha * (rate - job["speed"])
+        else:
+            job["speed"] = rate
+            job["hasSample"] = True
+        job["sampleBytes"] = bytesReceived
+        job["sampleTime"] = now
+        return job["speed"]
+
+    def speed(self, key):
+        job = self._jobs.get(key)
+        return job["speed"] if job else 0.0
+
+    def eta(self, key, bytesRemaining):
+        speed = self.speed(key)
+        # Below one byte per second the transfer is treated as stalled
+        if bytesRemaining <= 0 or speed < 1:
+            return -1
+        return int(math.ceil(bytesRemaining / speed))
+
+    def totalSpeed(self):
+        return sum(job["speed"] for job in self._jobs.values())
@@ -1,17 +1,16 @@
-from PySide6.QtCore import QObject, Signal, Property, Slot, QUrl
-from .DownloadHistory import DownloadHistory
+from PySide6.QtCore import QObject, Property, Slot, QUrl
+from .DownloadHistory import SORT_KEYS
+from .HistoryListModel import HistoryListModel
 
 class DownloadedPage(QObject):
-    downloadsChanged = Signal()
-
     def __init__(self, settings, parent=None):
         super().__init__(parent)
-        self._history = DownloadHistory(settings, self) 
-        self._history.historyChanged.connect(self.downloadsChanged)
+        self._history = settings.downloadHistory
+        self._model = HistoryListModel(self._history, self)
 
-    @Property(list, notify=downloadsChanged)
-    def downloads(self):
-        return self._history.history
+    @Property(QObject, constant=True)
+    def model(self):
+        return self._model
 
     @Property(str)
     def downloadFolder(self):
@@ -29,6 +28,27 @@ class DownloadedPage(QObject):
     def removeDownload(self, url, deleteFile=False):
         self._history.removeRecord(url, deleteFile) 
 
+    @Slot(str, str, bool, bool)
+    def setFilter(self, text, sortKey="date", descending=False, prefix=False):
+        # Filters and sorts the model, text matches the filename or URL
+        self._model.setQuery(text, sortKey if sortKey in SORT_KEYS else "date", descending, prefix)
+
+    @Slot(str, str, bool, bool, int, int, result=list)
+    def query(self, text, sortKey="date", descending=False, prefix=False, limit=-1, offset=0):
+        # One page of matching records, limit -1 returns everything after offset
+        urls = self._history.query(text, sortKey if sortKey in SORT_KEYS else "date", descending, prefix)
+        urls = urls[max(0, offset):] if limit < 0 else urls[max(0, offset):max(0, offset) + limit]
+        return [dict(self._history.getRecord(url)) for url in urls]
+
+    @Slot(bool, result=int)
+    def removeFiltered(self, deleteFiles=False):
+        # Removes every record matching the current filter, returns how many were removed
+        return self._history.removeRecords(self._model.urls(), deleteFiles)
+
+    @Slot()
+    def refreshFiles(self):
+        self._history.refreshFiles()
+
     @Slot(str, str, result=QUrl)
     def getFileUrl(self, filename, folder=None):
         return self._history.getFileUrl(filename, folder)
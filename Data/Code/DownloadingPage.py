@@ -1,105 +1,383 @@
-from PySide6.QtCore import QObject, Signal, Property, Slot, QUrl, QFile, QIODevice, QDir, QFileInfo, QTimer, QElapsedTimer
-from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply, QNetworkDiskCache
+import hashlib
+import heapq
+import json
+import shutil
+import time
+from PySide6.QtCore import QCoreApplication, QObject, Signal, Property, Slot, QUrl, QFile, QDir, QFileInfo, QTimer, QElapsedTimer
+from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+from .BandwidthLimiter import BandwidthLimiter, MIN_READ_BUFFER, MAX_READ_BUFFER
+from .BulkImporter import BulkImporter
+from .ConnectionPool import ConnectionPool
+from .DownloadCache import DownloadCache, METADATA_MAX_AGE_S
+from .DownloadListModel import DownloadListModel
+from .DownloadMetrics import DownloadMetrics
+from .RefcountGuard import RefcountGuard
+from .FileWriter import FileWriter, CHECKSUM_ALGORITHMS
+from .JobJournal import JobJournal
+from .PostProcessor import PostProcessor
+from .RetryPolicy import RetryPolicy
+from .Tracer import Tracer
+
+MIN_SEGMENT_SIZE = 1024 * 1024
+# Resume state sidecars of older versions, moved into the job journal on start
+RESUME_STATE_SUFFIX = ".json"
+PROGRESS_INTERVAL_MS = 200
+TRANSFER_TIMEOUT_MS = 60 * 1000
+MIRROR_FAILURE_LIMIT = 2
+MIRROR_CHECK_INTERVAL_MS = 5000
+SLOW_MIRROR_RATIO = 0.25
 
 class DownloadingPage(QObject):
+    downloadQueued = Signal(str, str, int)  # url, filename, priority
     downloadStarted = Signal(str, str, str)  # url, filename, savePath
+    downloadFirstByte = Signal(str)  # url
     downloadProgress = Signal(str, float, float)  # url, progress, speed
     downloadCompleted = Signal(str, str)  # url, savePath
     downloadError = Signal(str, str)  # url, errorMessage
     downloadCancelled = Signal(str)  # url
     downloadPaused = Signal(str)  # url
     downloadResumed = Signal(str)  # url
-
+    downloadRetrying = Signal(str, int, int, str)  # url, retries, delayMs, errorMessage
+    downloadReused = Signal(str, str)  # url, sourcePath
+    queueChanged = Signal(int)  # queued count
+    statsChanged = Signal()
 
     def __init__(self, settings, parent=None):
         super().__init__(parent)
+        # Every job makes thousands of Qt calls, more than some PySide6 releases survive
+        RefcountGuard.install()
         self._settings = settings
         self._activeDownloads = {}
+        self._queue = []
+        self._queueCounter = 0
+        self._queuedCount = 0
+        self._isScheduling = False
+        self._model = DownloadListModel(self)
+        self._metrics = DownloadMetrics()
+        self._stats = {}
+        self._hostStats = []
+        self._completedCount = 0
+        self._failedCount = 0
+        self._retryPolicy = RetryPolicy(settings.maxRetries, settings.retryBaseDelay, settings.retryMaxDelay)
+        settings.maxRetriesChanged.connect(lambda value: self._applyRetryPolicy())
+        settings.retryBaseDelayChanged.connect(lambda value: self._applyRetryPolicy())
+        settings.retryMaxDelayChanged.connect(lambda value: self._applyRetryPolicy())
         self._networkManager = QNetworkAccessManager(self)
         self._history = settings.downloadHistory
-        cache = QNetworkDiskCache(self._networkManager)
-        cacheDir = QDir(self.downloadFolder).filePath(".http_cache")
-        cache.setCacheDirectory(cacheDir)
-        cache.setMaximumCacheSize(512 * 1024 * 1024) 
-        self._networkManager.setCache(cache)
         self._networkManager.finished.connect(self._onReplyFinished)
+        # Off by default, every hot path checks tracer.enabled before doing any work
+        self._tracer = Tracer(lambda: dict(self._stats, hosts=self._hostStats), self)
+        self._tracer.setPath(settings.traceFile)
+        self._tracer.setStatsPort(settings.statsPort)
+        self._tracer.setEnabled(settings.tracingEnabled)
+        settings.traceFileChanged.connect(self._tracer.setPath)
+        settings.statsPortChanged.connect(self._tracer.setStatsPort)
+        settings.tracingEnabledChanged.connect(self._tracer.setEnabled)
+        # Requests past the per-host limit wait here instead of inside Qt
+        self._connections = ConnectionPool()
+        self._applyConnectionLimit()
+        settings.maxConnectionsPerHostChanged.connect(lambda value: self._applyConnectionLimit())
+        # Probe results and small files are cached outside the download folder,
+        # segment downloads never pass through a cache
+        self._cache = DownloadCache(settings.cacheFolder, settings.cacheSize, settings.cacheMode, self)
+        settings.cacheModeChanged.connect(self._cache.setMode)
+        settings.cacheSizeChanged.connect(self._cache.setMaxSize)
+        settings.cacheFolderChanged.connect(self._cache.setFolder)
+        # Imported URLs are probed before they are queued, the results save the jobs their own HEAD
+        self._importer = BulkImporter(settings, self._networkManager, self._connections, self._createRequest, self._cache, self._downloadState, self._tracer, self)
+        settings.concurrentDownloadsChanged.connect(lambda value: self._scheduleDownloads())
+
+        # Unfinished jobs are journaled so they are restored after a restart
+        self._journal = JobJournal(self)
+        self._resumeStateTimer = QTimer(self)
+        self._resumeStateTimer.setInterval(5000)
+        self._resumeStateTimer.timeout.connect(self._saveAllResumeStates)
+        self._resumeStateTimer.start()
+        # Disk writes, renames and removals run on the writer thread
+        self._writer = FileWriter(self._tracer, self)
+        self._writer.writeFailed.connect(self._handleWriteFailed)
+        self._writer.drained.connect(self._readPendingData)
+        self._writer.finalized.connect(self._onWriterFinalized)
+        self._writer.verifyFailed.connect(self._onWriterVerifyFailed)
+        self._writer.copied.connect(self._onWriterCopied)
+        self._writer.setSyncMode(settings.syncMode)
+        settings.syncModeChanged.connect(self._writer.setSyncMode)
+        self._writer.start()
+        # Queued before any download, the writer finishes its tasks before it stops
+        if not settings.legacyCacheRemoved:
+            self._writer.removeFolder("", QDir(self.downloadFolder).filePath(".http_cache"))
+            settings.legacyCacheRemoved = True
+        # Finished files are moved, extracted and handed to the user's command off the GUI thread
+        self._postProcessor = PostProcessor(settings, self._history, self)
+        self._postProcessor.stageStarted.connect(self._onPostStageStarted)
+        self._postProcessor.stageProgress.connect(self._onPostStageProgress)
+        self._postProcessor.processed.connect(self._onPostProcessed)
+        self._postProcessor.processingFailed.connect(self._onPostProcessingFailed)
+
+        # Half of the memory budget bounds the write queue, the other half is split
+        # between the read buffers of all replies
+        self._readBufferShare = MAX_READ_BUFFER
+        self._limiter = BandwidthLimiter(self)
+        self._limiter.resumed.connect(self._readPendingData)
+        self._applySpeedLimits()
+        self._applyMemoryBudget()
+        settings.memoryBudgetChanged.connect(lambda value: self._applyMemoryBudget())
+        settings.globalSpeedLimitChanged.connect(lambda value: self._applySpeedLimits())
+        settings.perDownloadSpeedLimitChanged.connect(lambda value: self._applySpeedLimits())
+        if QCoreApplication.instance():
+            QCoreApplication.instance().aboutToQuit.connect(self._shutdown)
+
+        # Progress and metrics are sampled for all running jobs and published once per tick
+        self._progressTimer = QTimer(self)
+        self._progressTimer.setInterval(PROGRESS_INTERVAL_MS)
+        self._progressTimer.timeout.connect(self._publishProgress)
+        # Segments are moved off mirrors that are much slower than the others
+        self._mirrorTimer = QTimer(self)
+        self._mirrorTimer.setInterval(MIRROR_CHECK_INTERVAL_MS)
+        self._mirrorTimer.timeout.connect(self._checkMirrors)
+        self._clock = QElapsedTimer()
+        self._clock.start()
+
+        self.downloadQueued.connect(self._onDownloadQueued)
+        self.downloadStarted.connect(self._onDownloadStarted)
+        self.downloadCompleted.connect(self._onDownloadCompleted)
+        self.downloadError.connect(self._onDownloadError)
+        self.downloadCancelled.connect(self._model.removeDownload)
+        self.downloadPaused.connect(self._onDownloadPaused)
+        self.downloadResumed.connect(self._onDownloadResumed)
+        self.downloadCompleted.connect(lambda url, savePath: self._tracer.finishJob(url, "completed"))
+        self.downloadError.connect(lambda url, errorMessage: self._tracer.finishJob(url, "failed"))
+        self.downloadCancelled.connect(lambda url: self._tracer.finishJob(url, "cancelled"))
+        self.downloadPaused.connect(lambda url: self._tracer.finishJob(url, "paused"))
+        self._restoreDownloads()
 
     @Property(str, constant=True)
     def downloadFolder(self):
         return self._settings.downloadFolder
 
+    @Property(QObject, constant=True)
+    def downloadModel(self):
+        return self._model
+
+    @Property(QObject, constant=True)
+    def bulkImporter(self):
+        return self._importer
+
+    @Property(QObject, constant=True)
+    def postProcessor(self):
+        return self._postProcessor
+
+    @Property("QVariantMap", notify=statsChanged)
+    def stats(self):
+        return self._stats
+
+    @Property(list, notify=statsChanged)
+    def hostStats(self):
+        return self._hostStats
+
+    @Property(int, notify=queueChanged)
+    def queuedCount(self):
+        return sum(1 for info in self._activeDownloads.values() if info["state"] == "queued")
+
     @Slot(QUrl)
     def startDownload(self, url):
-        urlStr = url.toString()
+        self.startDownloadWithPriority(url, 0)
+
+    @Slot(QUrl, str)
+    def startDownloadWithChecksum(self, url, checksum):
+        # checksum is "algorithm:hexdigest", e.g. "sha256:9f86d08..."
+        normalized = self._normalizeChecksum(checksum)
+        if not normalized:
+            self.downloadError.emit(url.toString(), "Invalid checksum")
+            return
+        self.startDownloadWithPriority(url, 0, normalized)
+
+    @Slot(QUrl, int)
+    def startDownloadWithPriority(self, url, priority, checksum=""):
+        self._addDownload(url.toString(), priority, checksum)
+
+    @Slot(result=list)
+    def queueImported(self):
+        # Queues every imported row, returns the URLs that are now downloading.
+        # Rows for jobs that already exist only add their mirrors.
+        queued = []
+        for item in self._importer.takeItems():
+            urlStr = item["url"]
+            if item["state"] in ("downloaded", "invalid") or self._history.isUrlValid(urlStr):
+                continue
+            info = self._activeDownloads.get(urlStr)
+            if info is not None:
+                self.addDownloadMirrors(QUrl(urlStr), item["mirrors"])
+                self.resumeDownload(QUrl(urlStr))
+                queued.append(urlStr)
+                continue
+            checksum = self._normalizeChecksum(item["checksum"]) if item["checksum"] else ""
+            if item["checksum"] and not checksum:
+                self.downloadError.emit(urlStr, "Invalid checksum")
+                continue
+            if self._addDownload(urlStr, 0, checksum, item["filename"], item["mirrors"], item["probe"]):
+                queued.append(urlStr)
+        return queued
+
+    def _addDownload(self, urlStr, priority=0, checksum="", filename="", mirrors=(), probe=None):
         if not urlStr:
             self.downloadError.emit("", "URL cannot be empty")
-            return
+            return False
         
         if hasattr(self._settings, 'downloadHistory') and self._settings.downloadHistory.isUrlValid(urlStr):
             self.downloadError.emit(urlStr, "This URL has already been downloaded")
-            return
+            return False
         
         if not self._isValidUrl(urlStr):
             self.downloadError.emit(urlStr, "Invalid URL")
-            return
+            return False
 
         if urlStr in self._activeDownloads:
             self.downloadError.emit(urlStr, "Download already in progress")
+            return False
+
+        safeName = self._sanitizeFilename(filename or self._getFilenameFromUrl(urlStr))
+        self._activeDownloads[urlStr] = {
+            "filename": safeName,
+            "savePath": "",
+            "tempPath": "",
+            "state": "queued",
+            "priority": priority,
+            "queueEntry": None,
+            "bytesReceived": 0,
+            "bytesTotal": 0,
+            "etag": "",
+            "lastModified": "",
+            "validatorMirror": 0,
+            "checksum": checksum,
+            "mirrors": [self._createMirror(urlStr)],
+            "retries": 0,
+            "probe": None,
+            "probeRetry": {"mirror": 0, "attempt": 0},
+            # Result of an import probe, used instead of a HEAD while it is fresh
+            "preflight": probe,
+            "segments": [],
+            "isCancelled": False
+        }
+        if mirrors:
+            self.addDownloadMirrors(QUrl(urlStr), mirrors)
+        self._enqueueDownload(urlStr)
+        self._saveResumeState(urlStr)
+        self.downloadQueued.emit(urlStr, safeName, priority)
+        self._scheduleDownloads()
+        return True
+
+    def _downloadState(self, urlStr):
+        if urlStr in self._activeDownloads:
+            return "active"
+        return "downloaded" if self._history.isUrlValid(urlStr) else ""
+
+    @Slot(QUrl, int)
+    def setDownloadPriority(self, url, priority):
+        urlStr = url.toString()
+        info = self._activeDownloads.get(urlStr)
+        if info is None or info["priority"] == priority:
             return
 
-        try:
-            filename = self._getFilenameFromUrl(urlStr)
-            safeName = self._sanitizeFilename(filename)
-            finalPath = self._getAvailablePath(QDir(self.downloadFolder).filePath(safeName))
-            tempPath = f"{finalPath}.downloading"
+        info["priority"] = priority
+        if info["state"] == "queued":
+            self._enqueueDownload(urlStr)
+        self._saveResumeState(urlStr)
 
-            if not self._ensureDirectoryExists(finalPath):
-                raise Exception("Cannot create directory")
+    def _enqueueDownload(self, urlStr):
+        # Superseded heap entries are skipped lazily in _scheduleDownloads
+        info = self._activeDownloads[urlStr]
+        self._queueCounter += 1
+        entry = (-info["priority"], self._queueCounter, urlStr)
+        info["queueEntry"] = entry
+        heapq.heappush(self._queue, entry)
+        self._publishQueuedCount()
 
-            file = QFile(tempPath)
-            if not file.open(QIODevice.WriteOnly):
-                raise Exception("Cannot create temp file")
+    def _runningCount(self):
+        return sum(1 for info in self._activeDownloads.values() if info["state"] == "running")
 
-            request = QNetworkRequest(QUrl(urlStr))
-            request.setAttribute(QNetworkRequest.Http2AllowedAttribute, True)
-            request.setAttribute(QNetworkRequest.Http2CleartextAllowedAttribute, True)
-            request.setHeader(QNetworkRequest.UserAgentHeader, "Mozilla/5.0")
-            request.setRawHeader(b"Accept-Ranges", b"bytes")
-            request.setRawHeader(b"Cache-Control", b"no-cache")
+    def _scheduleDownloads(self):
+        if self._isScheduling:
+            return
 
-            timer = QElapsedTimer()
-            timer.start()
+        self._isScheduling = True
+        try:
+            limit = max(1, self._settings.concurrentDownloads)
+            while self._queue and self._runningCount() < limit:
+                entry = heapq.heappop(self._queue)
+                info = self._activeDownloads.get(entry[2])
+                if info is None or info["state"] != "queued" or info["queueEntry"] is not entry:
+                    continue
+                self._beginDownload(entry[2])
+        finally:
+            self._isScheduling = False
+        self._publishQueuedCount()
+        self._updateStats()
 
-            self._activeDownloads[urlStr] = {
-                "filename": safeName,
-                "savePath": finalPath,
-                "tempPath": tempPath,
-                "file": file,
-                "timer": timer,
-                "bytesReceived": 0,
-                "reply": None,
-                "isCancelled": False
-            }
+    def _publishQueuedCount(self):
+        # Scheduling runs whenever a job changes state, the count rarely changes with it
+        count = self.queuedCount
+        if count != self._queuedCount:
+            self._queuedCount = count
+            self.queueChanged.emit(count)
 
-            self.downloadStarted.emit(urlStr, safeName, finalPath)
-            reply = self._networkManager.get(request)
+    def _beginDownload(self, urlStr):
+        info = self._activeDownloads[urlStr]
+        info["state"] = "running"
+        info["queueEntry"] = None
+        try:
+            isResume = bool(info["tempPath"])
+            if isResume:
+                finalPath = info["savePath"]
+                tempPath = info["tempPath"]
+            else:
+                finalPath = self._getAvailablePath(QDir(self.downloadFolder).filePath(info["filename"]))
+                tempPath = f"{finalPath}.downloading"
 
-            reply.downloadProgress.connect(
-                lambda br, bt, url=urlStr: self._handleProgress(url, br, bt)
-            )
-            reply.finished.connect(
-                lambda url=urlStr, reply=reply: self._handleFinished(url, reply)
-            )
-            reply.errorOccurred.connect(
-                lambda error, url=urlStr: self._handleError(url, error)
-            )
-            reply.readyRead.connect(lambda: self._writeData(urlStr, reply, file))
+            if not self._ensureDirectoryExists(finalPath):
+                raise Exception("Cannot create directory")
+
+            # Resumed jobs keep the bytes already in the temp file
+            algorithm = info["checksum"].split(":", 1)[0]
+            self._writer.open(urlStr, tempPath, not (isResume and info["segments"]), algorithm)
 
-            self._activeDownloads[urlStr]["reply"] = reply
+            info["savePath"] = finalPath
+            info["tempPath"] = tempPath
+            self._saveResumeState(urlStr)
+            self._metrics.startJob(urlStr, info["bytesReceived"])
+            if not self._progressTimer.isActive():
+                self._progressTimer.start()
+            if len(info["mirrors"]) > 1 and not self._mirrorTimer.isActive():
+                self._mirrorTimer.start()
+
+            if self._tracer.enabled:
+                self._tracer.record("started", urlStr, offset=info["bytesReceived"], savePath=finalPath)
+                self._tracer.begin(urlStr, "transfer")
+            if isResume:
+                self.downloadResumed.emit(urlStr)
+            else:
+                self.downloadStarted.emit(urlStr, info["filename"], finalPath)
+
+            if not info["segments"]:
+                # A known checksum is looked up before touching the network
+                if info["checksum"] and self._reuseExistingContent(urlStr):
+                    return
+                self._probeDownload(urlStr)
+            elif all(segment["isFinished"] for segment in info["segments"]):
+                self._finalizeDownload(urlStr)
+            else:
+                for segment in info["segments"]:
+                    if not segment["isFinished"]:
+                        self._startSegment(urlStr, segment)
 
         except Exception as e:
             self.downloadError.emit(urlStr, f"Download failed: {str(e)}")
-            self._cleanupDownload(urlStr)
+            if isResume:
+                info["state"] = "failed"
+                self._saveResumeState(urlStr)
+                self._scheduleDownloads()
+            else:
+                self._discardDownload(urlStr)
 
     @Slot(QUrl)
     def cancelDownload(self, url):
@@ -110,57 +388,38 @@ class DownloadingPage(QObject):
         downloadInfo = self._activeDownloads[urlStr]
         downloadInfo["isCancelled"] = True
 
-        # 1. Pause data reception
-        if "reply" in downloadInfo and downloadInfo["reply"]:
-            reply = downloadInfo["reply"]
+        for reply in self._downloadReplies(downloadInfo):
+            # 1. Pause data reception, a size of 0 would make the buffer unlimited
             try:
-                # Pause data reception
-                reply.setReadBufferSize(0)
+                reply.setReadBufferSize(1)
             except Exception as e:
                 self.downloadError.emit(urlStr, f"Error pausing reply: {str(e)}")
 
-        # 2. Disconnect all signals
-        if "reply" in downloadInfo and downloadInfo["reply"]:
-            reply = downloadInfo["reply"]
-            try:
-                reply.downloadProgress.disconnect()
-                reply.finished.disconnect()
-                reply.errorOccurred.disconnect()
-                reply.readyRead.disconnect()
-            except TypeError:
-                # Handle case where signals weren't connected
-                pass
-            except Exception as e:
-                self.downloadError.emit(urlStr, f"Error disconnecting signals: {str(e)}")
+            # 2. Disconnect all signals
+            self._disconnectReply(reply, urlStr)
 
-        # 3. Abort network request
-        if "reply" in downloadInfo and downloadInfo["reply"]:
-            reply = downloadInfo["reply"]
+            # 3. Abort network request
             try:
                 if reply.isRunning():
                     # Use single-shot timer to safely abort in event loop
-                    QTimer.singleShot(50, lambda: self._safeAbortReply(reply, urlStr))
+                    QTimer.singleShot(50, lambda reply=reply: self._safeAbortReply(reply, urlStr))
                 else:
                     self._cleanupReply(reply, urlStr)
             except Exception as e:
                 self.downloadError.emit(urlStr, f"Error handling reply: {str(e)}")
 
         # 4. Close and remove temp file
-        if "file" in downloadInfo:
-            try:
-                if downloadInfo["file"].isOpen():
-                    downloadInfo["file"].close()
-                if "tempPath" in downloadInfo:
-                    tempFile = QFile(downloadInfo["tempPath"])
-                    if tempFile.exists():
-                        tempFile.remove()
-            except Exception as e:
-                self.downloadError.emit(urlStr, f"Error closing/removing temp file: {str(e)}")
-                
-        # 5. Clear access cache
-        self._networkManager.clearAccessCache()
+        if downloadInfo.get("tempPath"):
+            self._writer.discard(urlStr, [downloadInfo["tempPath"]])
+        self._writer.dropState(urlStr, self._journal.saveJob)
+
+        # Pooled connections stay open for the other jobs on the same hosts
+        self._connections.dropWaiting(urlStr)
         self.downloadCancelled.emit(urlStr)
         self._activeDownloads.pop(urlStr, None)
+        self._limiter.removeJob(urlStr)
+        self._metrics.stopJob(urlStr)
+        self._scheduleDownloads()
 
     def _safeAbortReply(self, reply, urlStr):
         try:
@@ -172,6 +431,466 @@ class DownloadingPage(QObject):
     def _cleanupReply(self, reply, urlStr):
         reply.deleteLater()
 
+    def _disconnectReply(self, reply, urlStr):
+        # Disconnecting finished also cuts the manager's own notification
+        self._freeConnection(reply)
+        try:
+            reply.finished.disconnect()
+            reply.errorOccurred.disconnect()
+            reply.readyRead.disconnect()
+        except (TypeError, RuntimeError):
+            # Handle case where signals weren't connected
+            pass
+        except Exception as e:
+            self.downloadError.emit(urlStr, f"Error disconnecting signals: {str(e)}")
+
+    def _releaseReply(self, reply, urlStr):
+        self._disconnectReply(reply, urlStr)
+        # A reply that is reporting an error is already being torn down by Qt
+        if reply.isRunning() and reply.error() == QNetworkReply.NoError:
+            reply.abort()
+        reply.deleteLater()
+
+    def _downloadReplies(self, info):
+        replies = [segment["reply"] for segment in info.get("segments", []) if segment["reply"]]
+        if info.get("probe"):
+            replies.append(info["probe"])
+        return replies
+
+    def _createRequest(self, urlStr):
+        request = QNetworkRequest(QUrl(urlStr))
+        # With HTTP/2 every segment to a host is a stream on one shared connection
+        request.setAttribute(QNetworkRequest.Http2AllowedAttribute, self._settings.http2Enabled)
+        request.setAttribute(QNetworkRequest.Http2CleartextAllowedAttribute, self._settings.http2Enabled)
+        request.setHeader(QNetworkRequest.UserAgentHeader, "Mozilla/5.0")
+        # Stalled connections fail with TimeoutError and go through the retry policy
+        request.setTransferTimeout(TRANSFER_TIMEOUT_MS)
+        return request
+
+    def _probeDownload(self, urlStr):
+        info = self._activeDownloads[urlStr]
+        mirrorUrl = info["mirrors"][info["probeRetry"]["mirror"]]["url"]
+        preflight, info["preflight"] = info["preflight"], None
+        if preflight and info["probeRetry"]["mirror"] == 0 and time.time() - preflight["probedAt"] <= METADATA_MAX_AGE_S:
+            probe = preflight
+        else:
+            probe = self._cache.lookupMetadata(mirrorUrl)
+        if probe is not None:
+            self._applyProbe(urlStr, probe)
+            return
+        reply = self._networkManager.head(self._createRequest(mirrorUrl))
+        self._connections.register(self._connections.hostKey(mirrorUrl), reply)
+        if self._tracer.enabled:
+            self._tracer.traceReply(urlStr, reply, "probe")
+        info["probe"] = reply
+        reply.finished.connect(
+            lambda url=urlStr, reply=reply: self._handleProbeFinished(url, reply)
+        )
+
+    def _handleProbeFinished(self, urlStr, reply):
+        reply.deleteLater()
+        info = self._activeDownloads.get(urlStr)
+        if info is None or info["isCancelled"] or info["probe"] is not reply:
+            return
+        info["probe"] = None
+
+        # Connection failures and overloaded servers are retried, servers that
+        # reject HEAD still get the plain single-stream download
+        error = reply.error()
+        statusCode = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) or 0
+        if error != QNetworkReply.NoError and (not statusCode or self._retryPolicy.isTransient(error, statusCode)):
+            restart = lambda: self._restartProbe(urlStr, info)
+            if not self._retryRequest(urlStr, info["probeRetry"], reply, error, reply.errorString(), restart):
+                self._failDownload(urlStr, reply.errorString())
+            return
+
+        probe = {"bytesTotal": 0, "acceptRanges": False, "etag": "", "lastModified": "", "location": ""}
+        if error == QNetworkReply.NoError:
+            probe = DownloadCache.metadataFromReply(reply)
+            self._cache.storeMetadata(info["mirrors"][info["probeRetry"]["mirror"]]["url"], probe)
+        self._applyProbe(urlStr, probe)
+
+    def _applyProbe(self, urlStr, probe):
+        info = self._activeDownloads[urlStr]
+        probeMirror = info["probeRetry"]["mirror"]
+        info["etag"] = probe["etag"]
+        info["lastModified"] = probe["lastModified"]
+        info["validatorMirror"] = probeMirror
+        info["mirrors"][probeMirror]["location"] = probe["location"]
+
+        try:
+            info["bytesTotal"] = probe["bytesTotal"]
+            if not info["checksum"] and (self._reuseExistingContent(urlStr) or self._reuseCachedContent(urlStr)):
+                return
+            if probe["bytesTotal"] > 0:
+                self._checkDiskSpace(info, probe["bytesTotal"])
+                self._writer.allocate(urlStr, probe["bytesTotal"])
+            info["segments"] = self._planSegments(probe["bytesTotal"], probe["acceptRanges"])
+            # Segments are spread over the usable mirrors, starting with the probed one
+            mirrors = self._usableMirrors(info, probeMirror)
+            for i, segment in enumerate(info["segments"]):
+                segment["mirror"] = mirrors[i % len(mirrors)]
+            self._saveResumeState(urlStr)
+            for segment in info["segments"]:
+                self._startSegment(urlStr, segment)
+        except Exception as e:
+            self.downloadError.emit(urlStr, f"Download failed: {str(e)}")
+            self._discardDownload(urlStr)
+
+    def _reuseExistingContent(self, urlStr):
+        # Files already in the history are linked or copied instead of downloaded again.
+        # With an expected checksum only a checksum match is trusted.
+        info = self._activeDownloads[urlStr]
+        if info["checksum"]:
+            record = self._history.findContent(checksum=info["checksum"])
+        else:
+            record = self._history.findContent(info["bytesTotal"], info["etag"])
+        if record is None:
+            return False
+        info["etag"] = info["etag"] or record["etag"]
+        self._reuseFile(urlStr, self._history.getRecordPath(record), record["filesize"], record["checksum"])
+        return True
+
+    def _reuseCachedContent(self, urlStr):
+        info = self._activeDownloads[urlStr]
+        cachePath = self._cache.lookupPayload(urlStr, info["bytesTotal"], info["etag"], info["lastModified"])
+        if not cachePath:
+            return False
+        # Copied rather than linked so changes to the download never reach the cache
+        self._reuseFile(urlStr, cachePath, info["bytesTotal"], "", False)
+        return True
+
+    def _reuseFile(self, urlStr, sourcePath, size, checksum, link=True):
+        info = self._activeDownloads[urlStr]
+        info["state"] = "finalizing"
+        info["bytesTotal"] = size
+        info["bytesReceived"] = size
+        self._metrics.stopJob(urlStr)
+        self.downloadReused.emit(urlStr, sourcePath)
+        self._writer.reuse(urlStr, sourcePath, info["tempPath"], info["savePath"], [], checksum, link)
+        self._scheduleDownloads()
+
+    def _checkDiskSpace(self, info, size):
+        # Other jobs preallocate their files, so the free space already excludes them
+        free = shutil.disk_usage(QFileInfo(info["tempPath"]).path()).free
+        if free < size:
+            raise Exception(f"Not enough disk space: {size // (1024 * 1024)} MB needed, {free // (1024 * 1024)} MB free")
+
+    def _planSegments(self, bytesTotal, acceptRanges):
+        if not acceptRanges or bytesTotal <= 0:
+            return [self._createSegment(0, -1)]
+
+        count = max(1, min(self._settings.maxThreadsPerDownload, bytesTotal // MIN_SEGMENT_SIZE))
+        size = bytesTotal // count
+        segments = []
+        for i in range(count):
+            start = i * size
+            end = bytesTotal - 1 if i == count - 1 else start + size - 1
+            segments.append(self._createSegment(start, end))
+        return segments
+
+    def _createSegment(self, start, end):
+        # end == -1 marks the single-stream fallback without a Range header
+        return {
+            "start": start,
+            "end": end,
+            "received": 0,
+            "reply": None,
+            "mirror": 0,
+            "attempt": 0,
+            "sampleReceived": -1,
+            "requestStarted": 0,
+            "requestReceived": 0,
+            "isWaiting": False,
+            "isVerified": True,
+            "isFinished": False
+        }
+
+    def _createMirror(self, urlStr):
+        return {"url": urlStr, "location": "", "failures": 0, "rate": 0.0, "isDisabled": False}
+
+    def _usableMirrors(self, info, first=0):
+        count = len(info["mirrors"])
+        order = [(first + i) % count for i in range(count)]
+        usable = [i for i in order if not info["mirrors"][i]["isDisabled"]]
+        return usable or [first]
+
+    def _nextMirror(self, info, current):
+        # Round robin over the mirrors that have not been ruled out, -1 if there is none
+        for index in self._usableMirrors(info, current):
+            if index != current:
+                return index
+        return -1
+
+    def _activeMirror(self, info):
+        if len(info["mirrors"]) < 2:
+            return ""
+        counts = {}
+        for segment in info["segments"]:
+            if segment["reply"]:
+                counts[segment["mirror"]] = counts.get(segment["mirror"], 0) + 1
+        index = max(counts, key=counts.get) if counts else info["probeRetry"]["mirror"]
+        return info["mirrors"][index]["url"]
+
+    def _resetRetries(self, info):
+        info["probeRetry"]["attempt"] = 0
+        for mirror in info["mirrors"]:
+            mirror["failures"] = 0
+            mirror["isDisabled"] = False
+        for segment in info["segments"]:
+            segment["attempt"] = 0
+
+    def _startSegment(self, urlStr, segment):
+        info = self._activeDownloads[urlStr]
+        mirror = info["mirrors"][segment["mirror"]]
+        requestUrl = mirror["location"] or mirror["url"]
+        hostKey = self._connections.hostKey(requestUrl)
+        if not self._connections.canStart(hostKey):
+            # Started by _startWaitingSegments once a connection to the host is free
+            if not segment["isWaiting"]:
+                segment["isWaiting"] = True
+                self._connections.wait(hostKey, urlStr, segment)
+            return
+        segment["isWaiting"] = False
+        request = self._createRequest(requestUrl)
+        offset = segment["start"] + segment["received"]
+        segment["isVerified"] = False
+        segment["sampleReceived"] = -1
+        segment["requestStarted"] = self._clock.elapsed()
+        segment["requestReceived"] = segment["received"]
+        if segment["end"] >= 0:
+            request.setRawHeader(b"Range", f"bytes={offset}-{segment['end']}".encode())
+        elif offset > 0:
+            request.setRawHeader(b"Range", f"bytes={offset}-".encode())
+
+        # If-Range makes the server send the whole body when the file has changed,
+        # validators are only sent to the mirror they came from
+        validator = info["etag"] or info["lastModified"]
+        if offset > 0 and validator and segment["mirror"] == info["validatorMirror"]:
+            request.setRawHeader(b"If-Range", validator.encode())
+
+        reply = self._networkManager.get(request)
+        self._connections.register(hostKey, reply)
+        if self._tracer.enabled:
+            self._tracer.traceReply(urlStr, reply, "segment")
+        segment["reply"] = reply
+        self._updateReadBufferShare()
+        reply.setReadBufferSize(self._readBufferSize(urlStr))
+        reply.finished.connect(
+            lambda url=urlStr, reply=reply: self._handleFinished(url, reply)
+        )
+        reply.errorOccurred.connect(
+            lambda error, url=urlStr, reply=reply: self._handleError(url, reply, error)
+        )
+        reply.readyRead.connect(
+            lambda url=urlStr, segment=segment: self._writeData(url, segment)
+        )
+
+    def _fallbackToSingleStream(self, urlStr, mirror=0):
+        info = self._activeDownloads[urlStr]
+        for segment in info["segments"]:
+            if segment["reply"]:
+                self._releaseReply(segment["reply"], urlStr)
+
+        info["bytesReceived"] = 0
+        info["bytesTotal"] = 0
+        info["etag"] = ""
+        info["lastModified"] = ""
+        info["validatorMirror"] = mirror
+        self._writer.allocate(urlStr, 0)
+        info["segments"] = [self._createSegment(0, -1)]
+        info["segments"][0]["mirror"] = mirror
+        self._startSegment(urlStr, info["segments"][0])
+
+    def _moveSegment(self, urlStr, segment, mirror):
+        reply = segment["reply"]
+        if reply:
+            # Bytes already buffered from the old mirror are still valid
+            if segment["isVerified"] and reply.bytesAvailable() > 0:
+                self._writeData(urlStr, segment, force=True)
+            self._releaseReply(reply, urlStr)
+            segment["reply"] = None
+        segment["mirror"] = mirror
+        self._startSegment(urlStr, segment)
+
+    def _checkMirrors(self):
+        isRunning = False
+        for urlStr, info in list(self._activeDownloads.items()):
+            if info["state"] != "running":
+                continue
+            isRunning = True
+            if len(info["mirrors"]) > 1:
+                self._moveSlowSegments(urlStr, info)
+        if not isRunning:
+            self._mirrorTimer.stop()
+
+    def _moveSlowSegments(self, urlStr, info):
+        # Average bytes per second and connection of each mirror since the last check,
+        # mirrors that have run out of segments keep their last rate so they can take over
+        received = {}
+        for segment in info["segments"]:
+            if segment["reply"] is None or segment["isFinished"]:
+                continue
+            if segment["sampleReceived"] >= 0:
+                received.setdefault(segment["mirror"], []).append(segment["received"] - segment["sampleReceived"])
+            segment["sampleReceived"] = segment["received"]
+        for index, values in received.items():
+            info["mirrors"][index]["rate"] = sum(values) / len(values) / (MIRROR_CHECK_INTERVAL_MS / 1000.0)
+
+        rates = {index: mirror["rate"] for index, mirror in enumerate(info["mirrors"]) if mirror["rate"] > 0 and not mirror["isDisabled"]}
+        if len(rates) < 2:
+            return
+        fastest = max(rates, key=rates.get)
+        for segment in info["segments"]:
+            mirror = segment["mirror"]
+            if segment["reply"] and mirror in received and rates[mirror] < rates[fastest] * SLOW_MIRROR_RATIO:
+                self._moveSegment(urlStr, segment, fastest)
+
+    def _storeValidators(self, info, reply):
+        info["etag"], info["lastModified"] = DownloadCache.validatorsFromReply(reply)
+
+    def _replyTotalSize(self, reply):
+        contentRange = reply.rawHeader("Content-Range").data().decode("latin-1")
+        if "/" in contentRange and not contentRange.endswith("*"):
+            return int(contentRange.rsplit("/", 1)[1])
+        return int(reply.header(QNetworkRequest.ContentLengthHeader) or 0)
+
+    def _saveResumeState(self, urlStr, state=""):
+        info = self._activeDownloads.get(urlStr)
+        if info is None:
+            return
+
+        job = {
+            "filename": info["filename"],
+            "savePath": info["savePath"],
+            "tempPath": info["tempPath"],
+            "state": state or info["state"],
+            "priority": info["priority"],
+            "bytesTotal": info["bytesTotal"],
+            "etag": info["etag"],
+            "lastModified": info["lastModified"],
+            "validatorMirror": info["validatorMirror"],
+            "checksum": info["checksum"],
+            "mirrors": [mirror["url"] for mirror in info["mirrors"]],
+            "segments": [
+                {"start": s["start"], "end": s["end"], "received": s["received"]}
+                for s in info["segments"]
+            ]
+        }
+        # Queued behind the job's pending writes so the offsets are already on disk
+        self._writer.saveState(urlStr, job, self._journal.saveJob)
+
+    def _saveAllResumeStates(self):
+        for urlStr, info in self._activeDownloads.items():
+            if info["state"] == "running":
+                self._saveResumeState(urlStr)
+
+    def _restoreDownloads(self):
+        self._migrateResumeStates()
+        restarted = False
+        for job in self._journal.jobs():
+            urlStr = job["url"]
+            if urlStr in self._activeDownloads:
+                continue
+            if self._history.isUrlValid(urlStr) or self._restoreFinalized(job):
+                self._journal.saveJob(urlStr, None)
+                continue
+
+            segments = []
+            if job["tempPath"] and QFile.exists(job["tempPath"]):
+                for saved in job["segments"]:
+                    segment = self._createSegment(saved["start"], saved["end"])
+                    segment["received"] = saved["received"]
+                    segment["isFinished"] = saved["end"] >= 0 and saved["received"] >= saved["end"] - saved["start"] + 1
+                    segments.append(segment)
+            elif job["tempPath"]:
+                # The partial file is gone, the job starts over under a new name
+                job["tempPath"] = job["savePath"] = ""
+
+            # Jobs that were waiting or transferring continue, paused and failed ones stay that way
+            state = job["state"] if job["state"] in ("paused", "failed") else "queued"
+            self._activeDownloads[urlStr] = {
+                "filename": job["filename"],
+                "savePath": job["savePath"],
+                "tempPath": job["tempPath"],
+                "state": state,
+                "priority": job["priority"],
+                "queueEntry": None,
+                "bytesReceived": sum(s["received"] for s in segments),
+                "bytesTotal": job["bytesTotal"],
+                "etag": job["etag"],
+                "lastModified": job["lastModified"],
+                "validatorMirror": job["validatorMirror"],
+                "checksum": job["checksum"],
+                "mirrors": [self._createMirror(mirror) for mirror in job["mirrors"] or [urlStr]],
+                "retries": 0,
+                "probe": None,
+                "probeRetry": {"mirror": 0, "attempt": 0},
+                "preflight": None,
+                "segments": segments,
+                "isCancelled": False
+            }
+            self._model.addDownload(
+                urlStr,
+                filename=job["filename"],
+                savePath=job["savePath"],
+                progress=self.getDownloadProgress(QUrl(urlStr)),
+                isPaused=state != "queued",
+                isQueued=state == "queued"
+            )
+            if state == "queued":
+                self._enqueueDownload(urlStr)
+                restarted = True
+        if restarted:
+            # Started from the event loop so the UI is connected before the first signals
+            QTimer.singleShot(0, self._scheduleDownloads)
+
+    def _restoreFinalized(self, job):
+        # A job stopped after its file was renamed into place only misses its history record
+        if job["state"] != "finalizing" or QFile.exists(job["tempPath"]) or not QFile.exists(job["savePath"]):
+            return False
+        if job["bytesTotal"] <= 0 or QFileInfo(job["savePath"]).size() != job["bytesTotal"]:
+            return False
+        self._history.addRecord(
+            job["url"],
+            QFileInfo(job["savePath"]).fileName(),
+            QFileInfo(job["savePath"]).path(),
+            job["checksum"],
+            job["etag"],
+            job["bytesTotal"]
+        )
+        return True
+
+    def _migrateResumeStates(self):
+        folder = QDir(self.downloadFolder)
+        for name in folder.entryList([f"*.downloading{RESUME_STATE_SUFFIX}"], QDir.Files):
+            statePath = folder.filePath(name)
+            tempPath = statePath[:-len(RESUME_STATE_SUFFIX)]
+            try:
+                with open(statePath, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                continue
+
+            urlStr = state.get("url", "")
+            if urlStr and QFile.exists(tempPath):
+                self._journal.saveJob(urlStr, dict(
+                    state,
+                    savePath=state.get("savePath", tempPath[:-len(".downloading")]),
+                    tempPath=tempPath,
+                    state="paused"
+                ))
+            QFile.remove(statePath)
+        self._journal.flush()
+
+    def _normalizeChecksum(self, checksum):
+        algorithm, _, digest = checksum.strip().lower().partition(":")
+        if algorithm not in CHECKSUM_ALGORITHMS or not digest:
+            return ""
+        if len(digest) != hashlib.new(algorithm).digest_size * 2 or any(c not in "0123456789abcdef" for c in digest):
+            return ""
+        return f"{algorithm}:{digest}"
+
     def _isValidUrl(self, urlStr):
         url = QUrl(urlStr)
         return url.isValid() and url.scheme() in ('http', 'https') and url.host()
@@ -196,49 +915,201 @@ class DownloadingPage(QObject):
         return safeName
 
     def _getAvailablePath(self, desiredPath):
+        # One listing of the folder, plus the paths of jobs that have not written their files yet
         fileInfo = QFileInfo(desiredPath)
-        if not fileInfo.exists():
-            return desiredPath
-            
+        dirPath = fileInfo.dir()
+        taken = set(dirPath.entryList(QDir.AllEntries | QDir.Hidden | QDir.System | QDir.NoDotAndDotDot))
+        for info in self._activeDownloads.values():
+            if info["savePath"] and QFileInfo(info["savePath"]).dir() == dirPath:
+                taken.add(QFileInfo(info["savePath"]).fileName())
+
         base = fileInfo.completeBaseName()
         suffix = fileInfo.suffix()
-        dirPath = fileInfo.dir()
-        counter = 1
-        
-        while True:
-            newPath = dirPath.filePath(f"{base}_{counter}.{suffix}" if suffix else f"{base}_{counter}")
-            if not QFileInfo(newPath).exists():
-                return newPath
+        name = fileInfo.fileName()
+        counter = 0
+        while name in taken or f"{name}.downloading" in taken:
             counter += 1
+            name = f"{base}_{counter}.{suffix}" if suffix else f"{base}_{counter}"
+        return dirPath.filePath(name)
 
     def _getFilenameFromUrl(self, urlStr):
         path = QUrl(urlStr).path()
         return path.split('/')[-1] if path else "download"
 
-    def _writeData(self, urlStr, reply, file):
+    def _writeData(self, urlStr, segment, force=False):
         if urlStr not in self._activeDownloads or self._activeDownloads[urlStr]["isCancelled"]:
             return
-            
-        data = reply.readAll()
-        print(f"Writing {data.size()} bytes for URL: {urlStr}")
+
+        # Leave the data in the reply buffer until the writer catches up
+        writable = -1 if force else self._writer.writableBytes(urlStr)
+        if writable == 0:
+            return
+
+        info = self._activeDownloads[urlStr]
+        reply = segment["reply"]
+        if not segment["isVerified"]:
+            statusCode = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) or 0
+            # Error bodies are never written, the error handler decides what happens next
+            if statusCode >= 400:
+                return
+            # A 206 for a different total size means the file changed since it was probed
+            if statusCode == 206 and info["bytesTotal"] > 0 and self._replyTotalSize(reply) not in (0, info["bytesTotal"]):
+                self._fallbackToSingleStream(urlStr, segment["mirror"])
+                return
+            # A 200 instead of 206 means the server ignored our Range header or If-Range failed
+            if statusCode != 206:
+                if segment["end"] >= 0:
+                    # A mirror that ignores ranges is dropped rather than restarting the whole file
+                    nextMirror = self._nextMirror(info, segment["mirror"])
+                    if nextMirror >= 0 and segment["mirror"] != info["validatorMirror"]:
+                        info["mirrors"][segment["mirror"]]["isDisabled"] = True
+                        self._moveSegment(urlStr, segment, nextMirror)
+                    else:
+                        self._fallbackToSingleStream(urlStr, segment["mirror"])
+                    return
+                info["bytesReceived"] = 0
+                info["bytesTotal"] = 0
+                self._writer.allocate(urlStr, 0)
+                segment["received"] = 0
+            segment["isVerified"] = True
+            if not info["etag"] and not info["lastModified"]:
+                self._storeValidators(info, reply)
+                info["validatorMirror"] = segment["mirror"]
+
+        # Throttled bytes stay in the reply buffer until the limiter wakes the job
+        # Reads are cut to the room left in the write queue, so it stays within the memory budget
+        wanted = reply.bytesAvailable() if writable < 0 else min(writable, reply.bytesAvailable())
+        granted = self._limiter.acquire(urlStr, wanted, force)
+        if granted <= 0:
+            return
+        data = reply.read(granted)
+        if segment["end"] >= 0:
+            remaining = segment["end"] - segment["start"] - segment["received"] + 1
+            if data.size() > remaining:
+                data = data.left(remaining)
+        elif info["bytesTotal"] <= 0:
+            info["bytesTotal"] = self._replyTotalSize(reply)
+
         if data.size() > 0:
-            bytesWritten = file.write(data)
-            if bytesWritten == -1:
-                print(f"Error writing to file: {file.errorString()}")
-            self._activeDownloads[urlStr]["bytesReceived"] += data.size()
+            if info["bytesReceived"] == 0:
+                self.downloadFirstByte.emit(urlStr)
+            if self._tracer.enabled:
+                self._tracer.addChunk(urlStr, data.size())
+            self._writer.write(urlStr, segment["start"] + segment["received"], data)
+            segment["received"] += data.size()
+            info["bytesReceived"] += data.size()
+            if segment["attempt"]:
+                segment["attempt"] = 0
+                info["mirrors"][segment["mirror"]]["failures"] = 0
 
-    def _handleProgress(self, urlStr, bytesReceived, bytesTotal):
+    def _handleProgress(self, urlStr):
         if urlStr not in self._activeDownloads or self._activeDownloads[urlStr]["isCancelled"]:
             return
             
         info = self._activeDownloads[urlStr]
-        elapsed = info["timer"].elapsed() / 1000.0
-        speed = bytesReceived / max(0.001, elapsed)
+        bytesReceived = info["bytesReceived"]
+        bytesTotal = info["bytesTotal"]
+        speed = self._metrics.update(urlStr, bytesReceived)
+        eta = self._metrics.eta(urlStr, bytesTotal - bytesReceived) if bytesTotal > 0 else -1
         progress = (bytesReceived / bytesTotal * 100) if bytesTotal > 0 else 0
         progress = max(0, min(100, progress))
         
+        self._model.updateDownload(
+            urlStr, progress=progress, speed=speed, eta=eta,
+            retries=info["retries"], mirror=self._activeMirror(info),
+            bufferedBytes=self._bufferedBytes(urlStr)
+        )
         self.downloadProgress.emit(urlStr, progress, speed)
 
+    def _publishProgress(self):
+        # Stalled jobs are sampled too so their speed decays instead of freezing
+        running = [urlStr for urlStr, info in self._activeDownloads.items() if info["state"] == "running"]
+        for urlStr in running:
+            self._handleProgress(urlStr)
+        self._model.commitChanges()
+        self._updateStats()
+        if not running:
+            self._progressTimer.stop()
+
+    def _updateStats(self):
+        counts = {"running": 0, "queued": 0, "paused": 0, "failed": 0, "finalizing": 0}
+        bytesReceived = 0
+        bytesTotal = 0
+        bufferedBytes = self._writer.totalPendingBytes()
+        for info in self._activeDownloads.values():
+            counts[info["state"]] += 1
+            bytesReceived += info["bytesReceived"]
+            bytesTotal += info["bytesTotal"]
+            bufferedBytes += sum(reply.bytesAvailable() for reply in self._downloadReplies(info))
+
+        stats = {
+            "bytesPerSecond": self._metrics.totalSpeed(),
+            "bytesReceived": bytesReceived,
+            "bytesTotal": bytesTotal,
+            "active": counts["running"] + counts["finalizing"],
+            "queued": counts["queued"],
+            "paused": counts["paused"],
+            "failed": counts["failed"] + self._failedCount,
+            "completed": self._completedCount,
+            "bufferedBytes": bufferedBytes,
+            "memoryBudget": self._settings.memoryBudget,
+        }
+        stats.update(self._cache.stats())
+        hostStats = self._connections.stats()
+        if stats != self._stats or hostStats != self._hostStats:
+            self._stats = stats
+            self._hostStats = hostStats
+            self.statsChanged.emit()
+
+    def _onDownloadQueued(self, urlStr, filename, priority):
+        self._model.addDownload(urlStr, filename=filename, isQueued=True, isPaused=False)
+
+    def _onDownloadStarted(self, urlStr, filename, savePath):
+        self._model.addDownload(urlStr, filename=filename, savePath=savePath, isQueued=False)
+
+    def _onDownloadCompleted(self, urlStr, savePath):
+        self._model.updateDownload(urlStr, isCompleted=True, progress=100.0, speed=0.0, eta=-1)
+        self._model.commitChanges()
+
+    def _onDownloadError(self, urlStr, errorMessage):
+        # Deferred so the row reflects the job state after the error was handled
+        QTimer.singleShot(0, lambda: self._syncErrorRow(urlStr, errorMessage))
+
+    def _syncErrorRow(self, urlStr, errorMessage):
+        info = self._activeDownloads.get(urlStr)
+        if info is None:
+            self._model.updateDownload(urlStr, isError=True, errorMessage=errorMessage)
+        elif info["state"] == "failed":
+            self._model.updateDownload(urlStr, isPaused=True, errorMessage=errorMessage)
+        self._model.commitChanges()
+
+    def _onDownloadPaused(self, urlStr):
+        self._model.updateDownload(urlStr, isPaused=True, speed=0.0, eta=-1)
+        self._model.commitChanges()
+
+    def _onDownloadResumed(self, urlStr):
+        self._model.updateDownload(urlStr, isPaused=False, isQueued=False, errorMessage="")
+        self._model.commitChanges()
+
+    def _onPostStageStarted(self, urlStr, stage):
+        self._model.updateDownload(urlStr, postStage=stage, postProgress=0.0)
+        self._model.commitChanges()
+
+    def _onPostStageProgress(self, urlStr, stage, progress):
+        self._model.updateDownload(urlStr, postProgress=progress)
+        self._model.commitChanges()
+
+    def _onPostProcessed(self, urlStr, path):
+        self._model.updateDownload(urlStr, postStage="", postProgress=0.0, savePath=path,
+                                   filename=QFileInfo(path).fileName())
+        self._model.commitChanges()
+
+    def _onPostProcessingFailed(self, urlStr, stage, errorMessage):
+        # The download itself succeeded, so the row stays completed and only shows the error
+        self._model.updateDownload(urlStr, postStage="", postProgress=0.0,
+                                   errorMessage=f"Post-processing ({stage}) failed: {errorMessage}")
+        self._model.commitChanges()
+
     def _handleFinished(self, urlStr, reply):
         if urlStr not in self._activeDownloads:
             return
@@ -247,69 +1118,367 @@ class DownloadingPage(QObject):
         
         if info["isCancelled"] or reply.error() != QNetworkReply.NoError:
             return
-            
+
+        segment = next((s for s in info["segments"] if s["reply"] is reply), None)
+        if segment is None or segment["isFinished"]:
+            return
+        if reply.bytesAvailable() > 0:
+            # Data the write queue has no room for stays in the reply, the segment
+            # is finished from _readPendingData once all of it has been written
+            self._writeData(urlStr, segment)
+            if reply.bytesAvailable() > 0:
+                return
+
+        expected = segment["end"] - segment["start"] + 1 if segment["end"] >= 0 else info["bytesTotal"]
+        if expected > 0 and segment["received"] < expected:
+            # The server closed the connection early, the rest of the range is fetched again
+            self._releaseReply(reply, urlStr)
+            segment["reply"] = None
+            errorMessage = "Connection closed before the transfer completed"
+            restart = lambda: self._restartSegment(urlStr, info, segment)
+            if not self._retryRequest(urlStr, segment, reply, QNetworkReply.RemoteHostClosedError, errorMessage, restart):
+                self._failDownload(urlStr, errorMessage)
+            return
+        segment["isFinished"] = True
+        if len(info["mirrors"]) > 1:
+            # Mirrors that finish their segments early are remembered as fast
+            seconds = max(0.001, (self._clock.elapsed() - segment["requestStarted"]) / 1000.0)
+            info["mirrors"][segment["mirror"]]["rate"] = (segment["received"] - segment["requestReceived"]) / seconds
+        if all(s["isFinished"] for s in info["segments"]):
+            self._finalizeDownload(urlStr)
+
+    def _finalizeDownload(self, urlStr):
+        info = self._activeDownloads[urlStr]
+        for s in info["segments"]:
+            if s["end"] >= 0 and s["received"] != s["end"] - s["start"] + 1:
+                self.downloadError.emit(urlStr, "Completion error: Incomplete segment received")
+                self._discardDownload(urlStr)
+                return
+
+        # The network part is done, so the slot is free while the writer renames the file
+        info["state"] = "finalizing"
+        self._metrics.stopJob(urlStr)
+        if self._tracer.enabled:
+            self._tracer.end(urlStr, "transfer", bytes=info["bytesReceived"])
+            self._tracer.begin(urlStr, "finalize")
+        self._writer.finalize(urlStr, info["tempPath"], info["savePath"], [], info["checksum"])
+        self._scheduleDownloads()
+
+    def _onWriterFinalized(self, urlStr, savePath, checksum, errorMessage):
+        info = self._activeDownloads.get(urlStr)
+        if info is None or info["isCancelled"] or info["state"] != "finalizing":
+            return
+        if self._tracer.enabled:
+            self._tracer.end(urlStr, "finalize", savePath=savePath)
+
         try:
-            info["file"].close()
-            tempFile = QFile(info["tempPath"])
-            if tempFile.exists():
-                finalFile = QFile(info["savePath"])
-                if finalFile.exists():
-                    finalFile.remove()
-                if not tempFile.rename(info["savePath"]):
-                    raise Exception("Rename failed")
-            
+            if errorMessage:
+                raise Exception(errorMessage)
+
+            # The writer picks another name if the original one was taken in the meantime
+            info["savePath"] = savePath
             if hasattr(self._settings, 'downloadHistory'):
                 self._settings.downloadHistory.addRecord(
                     urlStr, 
                     QFileInfo(info["savePath"]).fileName(),
-                    QFileInfo(info["savePath"]).path()
+                    QFileInfo(info["savePath"]).path(),
+                    checksum,
+                    info["etag"],
+                    info["bytesReceived"]
                 )
+            # Post-processing is held until the cache copy is made, the file may be moved away
+            cachePath = self._cache.reservePayload(urlStr, info["bytesTotal"], info["etag"], info["lastModified"])
+            if cachePath:
+                self._writer.copy(urlStr, info["savePath"], cachePath)
+            self._postProcessor.process(urlStr, info["savePath"], bool(cachePath))
             
+            self._completedCount += 1
             self.downloadCompleted.emit(urlStr, info["savePath"])
         except Exception as e:
+            self._failedCount += 1
             self.downloadError.emit(urlStr, f"Completion error: {str(e)}")
         finally:
             self._cleanupDownload(urlStr)
+            self._updateStats()
+
+    def _onWriterCopied(self, urlStr, sourcePath, errorMessage):
+        if errorMessage:
+            print(f"Error copying to cache: {errorMessage}")
+        self._postProcessor.release(urlStr)
 
-    def _handleError(self, urlStr, error):
-        if urlStr not in self._activeDownloads or error == QNetworkReply.OperationCanceledError:
+    def _onWriterVerifyFailed(self, urlStr, expected, actual):
+        info = self._activeDownloads.get(urlStr)
+        if info is None or info["isCancelled"] or info["state"] != "finalizing":
             return
-            
-        errorMsg = self._activeDownloads[urlStr]["reply"].errorString()
+        # The data is corrupt, so nothing is kept to resume from
+        self.downloadError.emit(urlStr, f"Checksum mismatch: expected {expected}, got {actual}")
+        self._discardDownload(urlStr)
+
+    def _handleError(self, urlStr, reply, error):
+        info = self._activeDownloads.get(urlStr)
+        if info is None or error == QNetworkReply.OperationCanceledError:
+            return
+        segment = next((s for s in info["segments"] if s["reply"] is reply), None)
+        if segment is None:
+            return
+
+        # Bytes that arrived before the connection broke are kept
+        if segment["isVerified"] and reply.bytesAvailable() > 0:
+            self._writeData(urlStr, segment, force=True)
+        self._releaseReply(reply, urlStr)
+        segment["reply"] = None
+        restart = lambda: self._restartSegment(urlStr, info, segment)
+        if not self._retryRequest(urlStr, segment, reply, error, reply.errorString(), restart):
+            self._failDownload(urlStr, reply.errorString())
+
+    def _retryRequest(self, urlStr, target, reply, error, errorMessage, restart):
+        # target is a segment or the probe state, both track their mirror and attempt count
+        info = self._activeDownloads[urlStr]
+        statusCode = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) or 0
+        isTransient = self._retryPolicy.isTransient(error, statusCode)
+        mirror = info["mirrors"][target["mirror"]]
+        if mirror["location"] and not isTransient:
+            # The redirect target may have expired, the next attempt goes through the original URL
+            mirror["location"] = ""
+            isTransient = True
+        mirror["failures"] += 1
+        nextMirror = self._nextMirror(info, target["mirror"])
+        if not isTransient:
+            mirror["isDisabled"] = True
+            if nextMirror < 0:
+                return False
+        if not self._retryPolicy.canRetry(target["attempt"]):
+            return False
+
+        delay = self._retryPolicy.delay(target["attempt"], self._retryPolicy.retryAfter(reply))
+        if nextMirror >= 0 and (not isTransient or mirror["failures"] >= MIRROR_FAILURE_LIMIT):
+            target["mirror"] = nextMirror
+            # Switching to a mirror that has not been failing needs no backoff
+            if info["mirrors"][nextMirror]["failures"] < MIRROR_FAILURE_LIMIT:
+                delay = 0
+        target["attempt"] += 1
+        info["retries"] += 1
+        self._tracer.record("retrying", urlStr, retries=info["retries"], delayMs=delay, message=errorMessage)
+        self.downloadRetrying.emit(urlStr, info["retries"], delay, errorMessage)
+        QTimer.singleShot(delay, restart)
+        return True
+
+    def _restartSegment(self, urlStr, info, segment):
+        # The job may have been paused, cancelled or restarted while waiting
+        if self._activeDownloads.get(urlStr) is not info or info["state"] != "running":
+            return
+        if segment["reply"] or segment["isWaiting"] or segment["isFinished"] or not any(s is segment for s in info["segments"]):
+            return
+        self._startSegment(urlStr, segment)
+
+    def _startWaitingSegments(self, hostKey):
+        while True:
+            entry = self._connections.nextWaiting(hostKey)
+            if entry is None:
+                return
+            urlStr, segment = entry
+            info = self._activeDownloads.get(urlStr)
+            if info is None or info["state"] != "running" or not segment["isWaiting"]:
+                continue
+            if not any(s is segment for s in info["segments"]):
+                continue
+            segment["isWaiting"] = False
+            self._startSegment(urlStr, segment)
+
+    def _restartProbe(self, urlStr, info):
+        if self._activeDownloads.get(urlStr) is not info or info["state"] != "running":
+            return
+        if info["probe"] or info["segments"]:
+            return
+        self._probeDownload(urlStr)
+
+    def _handleWriteFailed(self, urlStr, errorMessage):
+        info = self._activeDownloads.get(urlStr)
+        if info is None or info["state"] not in ("running", "finalizing"):
+            return
+        self._failDownload(urlStr, errorMessage)
+
+    def _readPendingData(self, urlStr):
+        info = self._activeDownloads.get(urlStr)
+        if info is None or info["state"] != "running":
+            return
+        for segment in list(info["segments"]):
+            reply = segment["reply"]
+            if info["state"] != "running":
+                break
+            if reply and reply.bytesAvailable() > 0:
+                self._writeData(urlStr, segment)
+                if reply.isFinished() and reply.bytesAvailable() == 0 and not segment["isFinished"]:
+                    self._handleFinished(urlStr, reply)
+
+    def _applyRetryPolicy(self):
+        # Retries already scheduled keep their delay, the next attempt uses the new policy
+        self._retryPolicy = RetryPolicy(self._settings.maxRetries, self._settings.retryBaseDelay, self._settings.retryMaxDelay)
+
+    def _applySpeedLimits(self):
+        self._limiter.setLimits(self._settings.globalSpeedLimit, self._settings.perDownloadSpeedLimit)
+        self._applyReadBuffers()
+
+    def _applyMemoryBudget(self):
+        self._writer.setMaxPendingBytes(self._settings.memoryBudget // 2)
+        self._readBufferShare = 0
+        self._updateReadBufferShare()
+
+    def _updateReadBufferShare(self):
+        # Rounded down to a power of two, so the replies are only resized when
+        # their number roughly doubles or halves
+        replyCount = sum(1 for info in self._activeDownloads.values() for segment in info["segments"]
+                         if segment["reply"] and not segment["isFinished"])
+        budget = self._settings.memoryBudget - self._settings.memoryBudget // 2
+        share = max(MIN_READ_BUFFER, min(MAX_READ_BUFFER, budget // max(1, replyCount)))
+        share = 1 << (share.bit_length() - 1)
+        if share != self._readBufferShare:
+            self._readBufferShare = share
+            self._applyReadBuffers()
+
+    def _applyReadBuffers(self):
+        for urlStr, info in self._activeDownloads.items():
+            bufferSize = self._readBufferSize(urlStr)
+            for segment in info["segments"]:
+                if segment["reply"]:
+                    segment["reply"].setReadBufferSize(bufferSize)
+
+    def _readBufferSize(self, urlStr):
+        info = self._activeDownloads[urlStr]
+        replyCount = sum(1 for segment in info["segments"] if not segment["isFinished"])
+        return min(self._readBufferShare, self._limiter.readBufferSize(urlStr, replyCount))
+
+    def _bufferedBytes(self, urlStr):
+        # Data received but not written yet, in the reply buffers and the write queue
+        info = self._activeDownloads.get(urlStr)
+        if info is None:
+            return 0
+        return self._writer.pendingBytes(urlStr) + sum(reply.bytesAvailable() for reply in self._downloadReplies(info))
+
+    def _failDownload(self, urlStr, errorMsg):
+        info = self._activeDownloads[urlStr]
+        if info["bytesReceived"] == 0:
+            self.downloadError.emit(urlStr, errorMsg)
+            self._discardDownload(urlStr)
+            return
+
+        # Keep the partial file so the job can be resumed later
+        self._suspendDownload(urlStr, "failed")
         self.downloadError.emit(urlStr, errorMsg)
+        self._scheduleDownloads()
+
+    def _suspendDownload(self, urlStr, state, journalState=""):
+        info = self._activeDownloads[urlStr]
+        for reply in self._downloadReplies(info):
+            self._releaseReply(reply, urlStr)
+        info["probe"] = None
+        for segment in info["segments"]:
+            segment["reply"] = None
+            segment["isWaiting"] = False
+        self._connections.dropWaiting(urlStr)
+
+        info["state"] = state
+        self._saveResumeState(urlStr, journalState)
+        self._writer.close(urlStr)
+        self._limiter.removeJob(urlStr)
+        self._metrics.stopJob(urlStr)
+        self._updateReadBufferShare()
+        self._updateStats()
+
+    def _pauseAllDownloads(self):
+        # Journaled as running, so the jobs continue on their own after a restart
+        for urlStr, info in list(self._activeDownloads.items()):
+            if info["state"] == "running":
+                self._suspendDownload(urlStr, "paused", "running")
+
+    def _shutdown(self):
+        self._pauseAllDownloads()
+        self._writer.stop()
+        self._journal.flush()
+
+    def _discardDownload(self, urlStr):
+        info = self._activeDownloads.get(urlStr)
+        self._failedCount += 1
         self._cleanupDownload(urlStr)
+        if info and info.get("tempPath"):
+            self._writer.discard(urlStr, [info["tempPath"]])
 
     def _cleanupDownload(self, urlStr):
         if urlStr in self._activeDownloads:
             info = self._activeDownloads.pop(urlStr)
-            if "file" in info and info["file"].isOpen():
-                info["file"].close()
+            self._writer.close(urlStr)
+            self._writer.dropState(urlStr, self._journal.saveJob)
+            self._limiter.removeJob(urlStr)
+            self._metrics.stopJob(urlStr)
+            self._connections.dropWaiting(urlStr)
             
-            if "reply" in info:
-                info["reply"].deleteLater()
+            for reply in self._downloadReplies(info):
+                self._releaseReply(reply, urlStr)
+            self._updateReadBufferShare()
+        self._scheduleDownloads()
 
     def _onReplyFinished(self, reply):
-        if reply.operation() == QNetworkAccessManager.GetOperation:
-            reply.setReadBufferSize(4 * 1024 * 1024)
+        self._freeConnection(reply)
+
+    def _freeConnection(self, reply):
+        hostKey = self._connections.release(reply)
+        if hostKey and self._connections.hasWaiting(hostKey):
+            # Deferred so replies released inside a loop never start new ones there
+            QTimer.singleShot(0, lambda: self._startWaitingSegments(hostKey))
+
+    def _applyConnectionLimit(self):
+        self._connections.setMaxConnections(self._settings.maxConnectionsPerHost)
+        for host in self._connections.stats():
+            self._startWaitingSegments(host["host"])
 
     @Slot(QUrl, result=float)
     def getDownloadProgress(self, url):
         urlStr = url.toString()
         if urlStr in self._activeDownloads:
             bytesReceived = self._activeDownloads[urlStr]["bytesReceived"]
-            reply = self._activeDownloads[urlStr].get("reply")
-            bytesTotal = reply.header(QNetworkRequest.ContentLengthHeader) if reply else 0
+            bytesTotal = self._activeDownloads[urlStr]["bytesTotal"]
             return (bytesReceived / bytesTotal * 100) if bytesTotal > 0 else 0
         return 0
 
     @Slot(QUrl, result=float)
     def getDownloadSpeed(self, url):
         urlStr = url.toString()
-        if urlStr in self._activeDownloads:
-            info = self._activeDownloads[urlStr]
-            elapsed = info["timer"].elapsed() / 1000.0
-            return info["bytesReceived"] / max(0.001, elapsed)
-        return 0
+        return self._metrics.speed(urlStr)
+
+    @Slot(QUrl, result=int)
+    def getDownloadEta(self, url):
+        urlStr = url.toString()
+        info = self._activeDownloads.get(urlStr)
+        if info is None or info["bytesTotal"] <= 0:
+            return -1
+        return self._metrics.eta(urlStr, info["bytesTotal"] - info["bytesReceived"])
+
+    @Slot(QUrl, result=int)
+    def getDownloadRetries(self, url):
+        return self._activeDownloads.get(url.toString(), {}).get("retries", 0)
+
+    @Slot(QUrl, result=str)
+    def getDownloadMirror(self, url):
+        info = self._activeDownloads.get(url.toString())
+        return self._activeMirror(info) if info else ""
+
+    @Slot(QUrl, result=int)
+    def getDownloadBufferedBytes(self, url):
+        return self._bufferedBytes(url.toString())
+
+    @Slot(QUrl, list)
+    def addDownloadMirrors(self, url, mirrors):
+        info = self._activeDownloads.get(url.toString())
+        if info is None:
+            return
+        known = {mirror["url"] for mirror in info["mirrors"]}
+        for mirrorUrl in mirrors:
+            mirrorUrl = QUrl(mirrorUrl).toString()
+            if mirrorUrl not in known and self._isValidUrl(mirrorUrl):
+                info["mirrors"].append(self._createMirror(mirrorUrl))
+                known.add(mirrorUrl)
+        if info["state"] == "running" and len(info["mirrors"]) > 1 and not self._mirrorTimer.isActive():
+            self._mirrorTimer.start()
 
     @Slot(QUrl, result=str)
     def getDownloadFilename(self, url):
@@ -338,21 +1507,16 @@ class DownloadingPage(QObject):
             return
         
         info = self._activeDownloads[urlStr]
-        if info.get("isPaused", False):
+        if info["state"] != "running":
             return
         
-        reply = info.get("reply")
-        if reply:
-            try:
-                reply.blockSignals(True) 
-                reply.setReadBufferSize(0)  
-                info["file"].flush() 
-                info["isPaused"] = True
-                self.downloadPaused.emit(urlStr)
-                print(f"Paused: {urlStr} | Buffer size: {reply.readBufferSize()}")
-            except Exception as e:
-                print(f"Pause error: {str(e)}")
-                self.downloadError.emit(urlStr, f"Pause failed: {str(e)}")
+        try:
+            self._suspendDownload(urlStr, "paused")
+            self._tracer.record("paused", urlStr, offset=info["bytesReceived"])
+            self.downloadPaused.emit(urlStr)
+        except Exception as e:
+            self.downloadError.emit(urlStr, f"Pause failed: {str(e)}")
+        self._scheduleDownloads()
 
     @Slot(QUrl)
     def resumeDownload(self, url):
@@ -361,20 +1525,24 @@ class DownloadingPage(QObject):
             return
         
         info = self._activeDownloads[urlStr]
-        if not info.get("isPaused", False):
+        if info["state"] not in ("paused", "failed"):
             return
         
-        reply = info.get("reply")
-        if reply:
-            try:
-                reply.blockSignals(False)
-                reply.setReadBufferSize(4 * 1024 * 1024)  # 恢复缓冲
-                info["isPaused"] = False
-                self.downloadResumed.emit(urlStr)
-            except Exception as e:
-                print(f"Resume error: {str(e)}")
+        # Resumed jobs wait for a free slot like any other queued job
+        self._tracer.record("resumeRequested", urlStr, offset=info["bytesReceived"])
+        info["state"] = "queued"
+        self._resetRetries(info)
+        self._enqueueDownload(urlStr)
+        self._saveResumeState(urlStr)
+        self.downloadQueued.emit(urlStr, info["filename"], info["priority"])
+        self._scheduleDownloads()
+
+    @Slot(QUrl, result=bool)
+    def isDownloadQueued(self, url):
+        urlStr = url.toString()
+        return self._activeDownloads.get(urlStr, {}).get("state") == "queued"
 
     @Slot(QUrl, result=bool)
     def isDownloadPaused(self, url):
         urlStr = url.toString()
-        return self._activeDownloads.get(urlStr, {}).get("isPaused", False)
\ No newline at end of file
+        return self._activeDownloads.get(urlStr, {}).get("state") in ("paused", "failed")
\ No newline at end of file
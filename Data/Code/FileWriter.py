@@ -0,0 +1,387 @@
+import errno
+import hashlib
+import os
+import queue
+import shutil
+import threading
+import time
+from PySide6.QtCore import QThread, Signal
+
+MAX_PENDING_BYTES = 16 * 1024 * 1024
+# Downloaded data held in memory by the whole engine, half of it for the write
+# queue and half for the network read buffers
+MEMORY_BUDGET = 256 * 1024 * 1024
+MIN_MEMORY_BUDGET = 16 * 1024 * 1024
+HASH_READ_SIZE = 1024 * 1024
+CHECKSUM_ALGORITHMS = ("md5", "sha1", "sha256", "sha512")
+# throughput leaves flushing to the OS, durability syncs data before every resume
+# state and before a finished file is renamed into place
+SYNC_MODES = ("throughput", "durability")
+
+class FileWriter(QThread):
+    writeFailed = Signal(str, str)  # key, errorMessage
+    drained = Signal(str)  # key
+    finalized = Signal(str, str, str, str)  # key, savePath, checksum, errorMessage
+    copied = Signal(str, str, str)  # key, sourcePath, errorMessage
+    verifyFailed = Signal(str, str, str)  # key, expectedChecksum, actualChecksum
+
+    def __init__(self, tracer=None, parent=None):
+        super().__init__(parent)
+        self._tracer = tracer
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self._pendingBytes = {}
+        self._totalPending = 0
+        self._maxPendingBytes = MEMORY_BUDGET // 2
+        self._blocked = set()
+        self._files = {}
+        self._hashes = {}
+        self._syncMode = "throughput"
+
+    # The public methods are called from the GUI thread and only enqueue work,
+    # every file handle is owned by the writer thread.
+
+    def setSyncMode(self, mode):
+        if mode in SYNC_MODES:
+            self._syncMode = mode
+
+    def open(self, key, path, truncate=True, algorithm=""):
+        self._tasks.put((self._open, key, path, truncate, algorithm))
+
+    def allocate(self, key, size):
+        self._tasks.put((self._allocate, key, size))
+
+    def setMaxPendingBytes(self, size):
+        # Limit for the data queued by all jobs together, a job is also blocked
+        # on its own once it has MAX_PENDING_BYTES queued
+        with self._lock:
+            self._maxPendingBytes = max(1, size)
+        self._releaseBlocked()
+
+    def write(self, key, offset, data):
+        # Returns False once the job or all jobs together have too much data queued,
+        # the caller then stops reading from the network until drained is emitted
+        with self._lock:
+            pending = self._pendingBytes.get(key, 0) + data.size()
+            self._pendingBytes[key] = pending
+            self._totalPending += data.size()
+            isBlocked = pending >= self._jobLimit() or self._totalPending >= self._maxPendingBytes
+            if isBlocked:
+                self._blocked.add(key)
+        self._tasks.put((self._write, key, offset, data))
+        return not isBlocked
+
+    def writableBytes(self, key):
+        # How much the job may queue before it is blocked, a job with no room
+        # left is blocked until drained is emitted
+        with self._lock:
+            if key in self._blocked:
+                return 0
+            size = min(self._jobLimit() - self._pendingBytes.get(key, 0), self._maxPendingBytes - self._totalPending)
+            if size <= 0:
+                self._blocked.add(key)
+            return max(0, size)
+
+    def pendingBytes(self, key):
+        with self._lock:
+            return self._pendingBytes.get(key, 0)
+
+    def totalPendingBytes(self):
+        with self._lock:
+            return self._totalPending
+
+    def saveState(self, key, state, sink):
+        # sink(key, state) runs on the writer thread after the job's queued data
+        # is flushed, so the saved offsets never run ahead of the file
+        self._tasks.put((self._saveState, key, state, sink))
+
+    def dropState(self, key, sink):
+        self._tasks.put((self._dropState, key, sink))
+
+    def close(self, key):
+        self._tasks.put((self._close, key))
+
+    def finalize(self, key, tempPath, savePath, removePaths=(), checksum=""):
+        # checksum is "algorithm:hexdigest", a mismatch leaves the temp file in place
+        self._tasks.put((self._finalize, key, tempPath, savePath, tuple(removePaths), checksum))
+
+    def reuse(self, key, sourcePath, tempPath, savePath, removePaths=(), checksum="", link=True):
+        # Places an already downloaded file at savePath, hard linked when possible
+        self._tasks.put((self._reuse, key, sourcePath, tempPath, savePath, tuple(removePaths), checksum, link))
+
+    def copy(self, key, sourcePath, targetPath):
+        self._tasks.put((self._copy, key, sourcePath, targetPath))
+
+    def discard(self, key, removePaths):
+        self._tasks.put((self._discard, key, tuple(removePaths)))
+
+    def removeFolder(self, key, path):
+        self._tasks.put((self._removeFolder, key, path))
+
+    def stop(self):
+        self._tasks.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            method, key, *args = task
+            try:
+                method(key, *args)
+            except OSError as e:
+                self._closeFile(key)
+                self.writeFailed.emit(key, f"File error: {e.strerror or str(e)}")
+            except Exception as e:
+                # Anything else fails this job only, the thread keeps serving the others
+                self._closeFile(key)
+                self.writeFailed.emit(key, f"Write task failed: {str(e)}")
+        for key in list(self._files):
+            self._closeFile(key)
+
+    def _open(self, key, path, truncate, algorithm):
+        self._closeFile(key)
+        # Opened for reading too, hashing reads back chunks that arrived out of order
+        mode = "w+b" if truncate or not os.path.exists(path) else "r+b"
+        self._files[key] = open(path, mode)
+        if algorithm:
+            self._resetHash(key, algorithm)
+
+    def _allocate(self, key, size):
+        file = self._files.get(key)
+        if file is not None:
+            file.truncate(size)
+            if size > 0:
+                self._preallocate(file, size)
+        state = self._hashes.get(key)
+        if state is not None and size < state["offset"]:
+            self._resetHash(key, state["hasher"].name)
+
+    def _write(self, key, offset, data):
+        size = data.size()
+        started = time.perf_counter_ns() if self._tracer and self._tracer.enabled else 0
+        try:
+            file = self._files.get(key)
+            if file is not None:
+                file.seek(offset)
+                file.write(memoryview(data))
+                if key in self._hashes:
+                    self._updateHash(key, file, offset, data)
+            if started:
+                self._tracer.addWrite(key, size, time.perf_counter_ns() - started)
+        finally:
+            with self._lock:
+                self._pendingBytes[key] = max(0, self._pendingBytes.get(key, 0) - size)
+                self._totalPending = max(0, self._totalPending - size)
+            self._releaseBlocked()
+
+    def _jobLimit(self):
+        return min(MAX_PENDING_BYTES, self._maxPendingBytes)
+
+    def _releaseBlocked(self):
+        # Jobs resume reading once both their own queue and the shared one are half empty
+        with self._lock:
+            if not self._blocked or self._totalPending > self._maxPendingBytes // 2:
+                return
+            released = [key for key in self._blocked if self._pendingBytes.get(key, 0) <= self._jobLimit() // 2]
+            self._blocked.difference_update(released)
+        for key in released:
+            self.drained.emit(key)
+
+    def _preallocate(self, file, size):
+        # Reserves the blocks so a full disk fails here rather than halfway through,
+        # file systems without fallocate keep the sparse file from truncate
+        if not hasattr(os, "posix_fallocate"):
+            return
+        try:
+            os.posix_fallocate(file.fileno(), 0, size)
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                raise
+
+    def _saveState(self, key, state, sink):
+        file = self._files.get(key)
+        if file is not None:
+            file.flush()
+            if self._syncMode == "durability":
+                os.fsync(file.fileno())
+        sink(key, state)
+
+    def _dropState(self, key, sink):
+        sink(key, None)
+
+    def _close(self, key):
+        self._closeFile(key)
+        with self._lock:
+            self._totalPending = max(0, self._totalPending - self._pendingBytes.pop(key, 0))
+            self._blocked.discard(key)
+
+    def _finalize(self, key, tempPath, savePath, removePaths, checksum):
+        actual = ""
+        if checksum:
+            algorithm = checksum.split(":", 1)[0]
+            actual = f"{algorithm}:{self._finishHash(key, tempPath, algorithm)}"
+        file = self._files.get(key)
+        if file is not None and self._syncMode == "durability":
+            file.flush()
+            os.fsync(file.fileno())
+        self._close(key)
+        if checksum and actual != checksum:
+            self.verifyFailed.emit(key, checksum, actual)
+            return
+        self._replace(key, tempPath, savePath, removePaths, actual)
+
+    def _replace(self, key, tempPath, savePath, removePaths, checksum):
+        try:
+            if os.path.exists(tempPath):
+                savePath = self._rename(tempPath, savePath)
+            for path in removePaths:
+                if os.path.exists(path):
+                    os.remove(path)
+        except OSError as e:
+            self.finalized.emit(key, savePath, checksum, f"Rename failed: {e.strerror or str(e)}")
+            return
+        self.finalized.emit(key, savePath, checksum, "")
+
+    def _rename(self, tempPath, savePath):
+        # A hard link never replaces an existing file, so a file that showed up at
+        # savePath while downloading is kept and the download gets a free name instead
+        while True:
+            try:
+                os.link(tempPath, savePath)
+            except FileExistsError:
+                savePath = self._nextFreePath(savePath)
+                continue
+            except OSError:
+                # No hard link support, the rename itself is still atomic
+                if os.path.exists(savePath):
+                    savePath = self._nextFreePath(savePath)
+                os.replace(tempPath, savePath)
+                break
+            os.remove(tempPath)
+            break
+        if self._syncMode == "durability" and hasattr(os, "O_DIRECTORY"):
+            folder = os.open(os.path.dirname(savePath) or ".", os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(folder)
+            finally:
+                os.close(folder)
+        return savePath
+
+    def _nextFreePath(self, path):
+        folder, name = os.path.split(path)
+        base, suffix = os.path.splitext(name)
+        taken = set(os.listdir(folder or "."))
+        counter = 1
+        while f"{base}_{counter}{suffix}" in taken:
+            counter += 1
+        return os.path.join(folder, f"{base}_{counter}{suffix}")
+
+    def _reuse(self, key, sourcePath, tempPath, savePath, removePaths, checksum, link):
+        self._close(key)
+        try:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            try:
+                if not link:
+                    raise OSError
+                os.link(sourcePath, tempPath)
+            except OSError:
+                # Other file systems or volumes, or no hard link support
+                shutil.copyfile(sourcePath, tempPath)
+        except OSError as e:
+            self.finalized.emit(key, savePath, checksum, f"Copy failed: {e.strerror or str(e)}")
+            return
+        self._replace(key, tempPath, savePath, removePaths, checksum)
+
+    def _copy(self, key, sourcePath, targetPath):
+        # Written under a temporary name so a half copied file is never picked up
+        try:
+            shutil.copyfile(sourcePath, f"{targetPath}.part")
+            os.replace(f"{targetPath}.part", targetPath)
+        except OSError as e:
+            self.copied.emit(key, sourcePath, f"Copy failed: {e.strerror or str(e)}")
+            return
+        self.copied.emit(key, sourcePath, "")
+
+    def _discard(self, key, removePaths):
+        self._close(key)
+        for path in removePaths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _removeFolder(self, key, path):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+        except OSError as e:
+            print(f"Error removing {path}: {e.strerror or str(e)}")
+
+    def _closeFile(self, key):
+        self._hashes.pop(key, None)
+        file = self._files.pop(key, None)
+        if file is not None:
+            file.close()
+
+    # Hashes follow the contiguous prefix of the file. Chunks that arrive in order
+    # are hashed straight from memory, chunks past a gap are remembered and read
+    # back once the gap is filled, so every byte is hashed exactly once.
+
+    def _resetHash(self, key, algorithm):
+        self._hashes[key] = {
+            "hasher": hashlib.new(algorithm),
+            "offset": 0,
+            "ranges": {}
+        }
+
+    def _updateHash(self, key, file, offset, data):
+        state = self._hashes[key]
+        end = offset + data.size()
+        if offset < state["offset"]:
+            # Already hashed bytes were rewritten, the final pass starts over
+            self._resetHash(key, state["hasher"].name)
+            return
+        if offset > state["offset"]:
+            self._addRange(state["ranges"], offset, end)
+            return
+
+        state["hasher"].update(memoryview(data))
+        state["offset"] = end
+        ranges = state["ranges"]
+        while state["offset"] in ranges:
+            start = state["offset"]
+            self._hashFile(state, file, start, ranges.pop(start))
+
+    def _addRange(self, ranges, start, end):
+        # Chunks of one segment arrive in order, so a new range usually extends an old one
+        for rangeStart, rangeEnd in ranges.items():
+            if rangeEnd == start:
+                ranges[rangeStart] = end
+                return
+        ranges[start] = end
+
+    def _hashFile(self, state, file, start, end):
+        file.seek(start)
+        while end < 0 or start < end:
+            chunk = file.read(HASH_READ_SIZE if end < 0 else min(HASH_READ_SIZE, end - start))
+            if not chunk:
+                break
+            state["hasher"].update(chunk)
+            start += len(chunk)
+        state["offset"] = start
+
+    def _finishHash(self, key, path, algorithm):
+        # Whatever was not hashed while downloading (resumed or reordered data) is
+        # read once from disk here
+        state = self._hashes.get(key)
+        file = self._files.get(key)
+        if state is not None and file is not None:
+            file.flush()
+            self._hashFile(state, file, state["offset"], -1)
+            return state["hasher"].hexdigest()
+
+        state = {"hasher": hashlib.new(algorithm), "offset": 0, "ranges": {}}
+        with open(path, "rb") as f:
+            self._hashFile(state, f, 0, -1)
+        return state["hasher"].hexdigest()
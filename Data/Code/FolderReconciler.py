@@ -0,0 +1,83 @@
+import os
+import queue
+import threading
+from PySide6.QtCore import QThread, QTimer, QFileSystemWatcher, Signal
+
+RESCAN_DELAY_MS = 300
+
+class FolderReconciler(QThread):
+    scanned = Signal(str, object)  # folder, {filename: (size, mtime)}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self._queued = set()
+        self._changed = set()
+
+        # Changes arrive in bursts while a file is written, each folder is listed once per burst
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._onDirectoryChanged)
+        self._rescanTimer = QTimer(self)
+        self._rescanTimer.setSingleShot(True)
+        self._rescanTimer.setInterval(RESCAN_DELAY_MS)
+        self._rescanTimer.timeout.connect(self._rescanChanged)
+
+    # watch and scan are called from the GUI thread, listings are made on the
+    # reconciler thread and reported through scanned
+
+    def watch(self, folder):
+        if os.path.isdir(folder) and folder not in self._watcher.directories():
+            self._watcher.addPath(folder)
+        self.scan(folder)
+
+    def isWatching(self, folder):
+        return folder in self._watcher.directories()
+
+    def scan(self, folder):
+        with self._lock:
+            if folder in self._queued:
+                return
+            self._queued.add(folder)
+        self._tasks.put(folder)
+
+    def stop(self):
+        self._rescanTimer.stop()
+        self._tasks.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            folder = self._tasks.get()
+            if folder is None:
+                break
+            with self._lock:
+                self._queued.discard(folder)
+            self.scanned.emit(folder, self._listFolder(folder))
+
+    def _listFolder(self, folder):
+        # One listing per folder, a missing or unreadable folder has no files
+        files = {}
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            files[entry.name] = (stat.st_size, int(stat.st_mtime))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return files
+
+    def _onDirectoryChanged(self, folder):
+        self._changed.add(folder)
+        if not self._rescanTimer.isActive():
+            self._rescanTimer.start()
+
+    def _rescanChanged(self):
+        changed, self._changed = self._changed, set()
+        for folder in changed:
+            # A removed and recreated folder drops out of the watcher
+            self.watch(folder)
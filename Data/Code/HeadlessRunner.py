@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import sys
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, QUrl
+from .DownloadCache import CACHE_MODES
+from .DownloadingPage import DownloadingPage
+from .FileWriter import SYNC_MODES
+from .SettingPage import Settings
+
+PROGRESS_INTERVAL_MS = 1000
+
+class HeadlessRunner(QObject):
+    def __init__(self, arguments, parent=None):
+        super().__init__(parent)
+        self._arguments = arguments
+        self._pending = set()
+        self._completed = set()
+        self._failed = set()
+        self._settings = None
+        self._page = None
+
+        self._progressTimer = QTimer(self)
+        self._progressTimer.setInterval(arguments.progressInterval)
+        self._progressTimer.timeout.connect(self._printProgress)
+
+    @staticmethod
+    def parseArguments(argv):
+        parser = argparse.ArgumentParser(prog="Downloader.py --headless", description="Download URLs without a user interface.")
+        parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+        parser.add_argument("urls", nargs="*", help="URLs to download, read from --input when omitted")
+        parser.add_argument("-i", "--input", default="-", help="Metalink file or file with one URL per line followed by optional mirror URLs and an algorithm:hexdigest checksum, '-' for stdin")
+        parser.add_argument("-o", "--output", help="download folder, defaults to the configured one")
+        parser.add_argument("-c", "--concurrent", type=int, help="number of downloads running at once")
+        parser.add_argument("-t", "--threads", type=int, help="maximum segments per download")
+        parser.add_argument("--limit", type=int, help="global speed limit in bytes per second, 0 for unlimited")
+        parser.add_argument("--per-download-limit", dest="perDownloadLimit", type=int, help="per download speed limit in bytes per second")
+        parser.add_argument("--connections-per-host", dest="connectionsPerHost", type=int, help="maximum connections opened to one host")
+        parser.add_argument("--no-http2", dest="http2", action="store_false", default=None, help="use separate HTTP/1.1 connections instead of HTTP/2 streams")
+        parser.add_argument("--cache", choices=CACHE_MODES, help="what is cached between downloads")
+        parser.add_argument("--sync", choices=SYNC_MODES, help="whether written data is synced to disk before it is relied on")
+        parser.add_argument("--retries", type=int, help="retries per segment for transient errors")
+        parser.add_argument("--memory-budget", dest="memoryBudget", type=int, help="bytes of downloaded data held in memory before network reads stop")
+        parser.add_argument("--trace", metavar="FILE", help="write a JSON lines performance trace to FILE")
+        parser.add_argument("--stats-port", dest="statsPort", type=int, help="serve live stats as JSON on 127.0.0.1 at this port")
+        parser.add_argument("--progress-interval", dest="progressInterval", type=int, default=PROGRESS_INTERVAL_MS, help="milliseconds between progress lines")
+        return parser.parse_args(argv[1:])
+
+    @staticmethod
+    def main(argv):
+        arguments = HeadlessRunner.parseArguments(argv)
+        app = QCoreApplication(argv)
+        runner = HeadlessRunner(arguments)
+        QTimer.singleShot(0, runner.start)
+        return app.exec()
+
+    def start(self):
+        try:
+            text = self._readInput()
+        except (OSError, UnicodeDecodeError) as e:
+            self._printEvent("error", "", message=f"Cannot read URL list: {e.strerror or str(e)}")
+            QCoreApplication.exit(2)
+            return
+
+        self._settings = self._createSettings()
+        self._page = DownloadingPage(self._settings)
+        self._page.downloadQueued.connect(lambda url, filename, priority: self._printEvent("queued", url, filename=filename))
+        self._page.downloadStarted.connect(lambda url, filename, savePath: self._printEvent("started", url, filename=filename, savePath=savePath))
+        self._page.downloadResumed.connect(lambda url: self._printEvent("resumed", url))
+        self._page.downloadReused.connect(lambda url, sourcePath: self._printEvent("reused", url, sourcePath=sourcePath))
+        self._page.downloadRetrying.connect(
+            lambda url, retries, delay, message: self._printEvent("retrying", url, retries=retries, delay=delay, message=message)
+        )
+        self._page.downloadCompleted.connect(self._onDownloadCompleted)
+        self._page.downloadError.connect(self._onDownloadError)
+        postProcessor = self._page.postProcessor
+        postProcessor.processed.connect(lambda url, path: self._printEvent("processed", url, path=path))
+        postProcessor.processingFailed.connect(
+            lambda url, stage, message: self._printEvent("processingFailed", url, stage=stage, message=message)
+        )
+        postProcessor.activeCountChanged.connect(lambda count: self._checkFinished())
+
+        # Every URL is probed first, downloads start once all of them have an answer
+        importer = self._page.bulkImporter
+        importer.finished.connect(self._onImportFinished)
+        error = importer.importText(text)
+        if error:
+            self._printEvent("error", "", message=error)
+            QCoreApplication.exit(2)
+
+    def _readInput(self):
+        if self._arguments.urls:
+            return "\n".join(self._arguments.urls)
+        if self._arguments.input == "-":
+            return sys.stdin.read()
+        with open(self._arguments.input, 'r', encoding='utf-8-sig') as f:
+            return f.read()
+
+    def _onImportFinished(self):
+        for item in self._page.bulkImporter.items():
+            if item["state"] == "downloaded":
+                self._printEvent("skipped", item["url"], message="This URL has already been downloaded")
+            elif item["state"] in ("failed", "invalid"):
+                self._printEvent("probeFailed", item["url"], message=item["errorMessage"])
+        # Downloads left over from an earlier run are picked up where they stopped
+        self._pending.update(self._page.queueImported())
+        self._progressTimer.start()
+        self._checkFinished()
+
+    def _createSettings(self):
+        # Command line values override the config for this run without being saved
+        settings = Settings(autoSave=False)
+        if self._arguments.output:
+            folder = os.path.abspath(self._arguments.output)
+            os.makedirs(folder, exist_ok=True)
+            settings.downloadFolder = folder
+        if self._arguments.concurrent is not None:
+            settings.concurrentDownloads = max(1, self._arguments.concurrent)
+        if self._arguments.threads is not None:
+            settings.maxThreadsPerDownload = max(1, self._arguments.threads)
+        if self._arguments.limit is not None:
+            settings.globalSpeedLimit = self._arguments.limit
+        if self._arguments.perDownloadLimit is not None:
+            settings.perDownloadSpeedLimit = self._arguments.perDownloadLimit
+        if self._arguments.connectionsPerHost is not None:
+            settings.maxConnectionsPerHost = max(1, self._arguments.connectionsPerHost)
+        if self._arguments.http2 is not None:
+            settings.http2Enabled = self._arguments.http2
+        if self._arguments.cache is not None:
+            settings.cacheMode = self._arguments.cache
+        if self._arguments.sync is not None:
+            settings.syncMode = self._arguments.sync
+        if self._arguments.retries is not None:
+            settings.maxRetries = self._arguments.retries
+        if self._arguments.memoryBudget is not None:
+            settings.memoryBudget = self._arguments.memoryBudget
+        if self._arguments.trace:
+            settings.traceFile = os.path.abspath(self._arguments.trace)
+            settings.tracingEnabled = True
+        if self._arguments.statsPort is not None:
+            settings.statsPort = self._arguments.statsPort
+        return settings
+
+    def _onDownloadCompleted(self, urlStr, savePath):
+        record = self._settings.downloadHistory.getRecord(urlStr) or {}
+        self._printEvent("completed", urlStr, savePath=savePath, checksum=record.get("checksum", ""))
+        if urlStr in self._pending:
+            self._pending.discard(urlStr)
+            self._completed.add(urlStr)
+        self._checkFinished()
+
+    def _onDownloadError(self, urlStr, errorMessage):
+        self._printEvent("error", urlStr, message=errorMessage)
+        if urlStr in self._pending:
+            self._pending.discard(urlStr)
+            self._failed.add(urlStr)
+        self._checkFinished()
+
+    def _printProgress(self):
+        for urlStr in sorted(self._pending):
+            url = QUrl(urlStr)
+            if self._page.isDownloadQueued(url) or self._page.isDownloadPaused(url):
+                continue
+            self._printEvent(
+                "progress", urlStr,
+                progress=round(self._page.getDownloadProgress(url), 1),
+                speed=int(self._page.getDownloadSpeed(url)),
+                eta=self._page.getDownloadEta(url),
+                retries=self._page.getDownloadRetries(url),
+                mirror=self._page.getDownloadMirror(url),
+                buffered=self._page.getDownloadBufferedBytes(url)
+            )
+        self._printEvent("memory", "", buffered=self._page.stats.get("bufferedBytes", 0), budget=self._settings.memoryBudget)
+        if self._page.hostStats:
+            self._printEvent("hosts", "", hosts=self._page.hostStats)
+
+    def _checkFinished(self):
+        # Finished downloads may still be moved, extracted or passed to the command
+        if self._pending or self._page.postProcessor.activeCount:
+            return
+        self._progressTimer.stop()
+        stats = self._page.stats
+        self._printEvent(
+            "summary", "", completed=len(self._completed), failed=len(self._failed),
+            cacheHits=stats.get("cacheHits", 0), cacheMisses=stats.get("cacheMisses", 0)
+        )
+        # Deferred so the page finishes handling the signal that got us here before
+        # aboutToQuit pauses what is left and stops the writer
+        exitCode = 1 if self._failed else 0
+        QTimer.singleShot(0, lambda: QCoreApplication.exit(exitCode))
+
+    def _printEvent(self, event, urlStr, **values):
+        line = {"event": event, "url": urlStr}
+        line.update(values)
+        print(json.dumps(line, ensure_ascii=False), flush=True)
@@ -0,0 +1,154 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt, Signal, Property
+
+HISTORY_ROLES = (
+    "url",
+    "filename",
+    "filesize",
+    "folder",
+)
+# Answered from the history's folder listings rather than the record
+FILE_STATE_ROLES = (
+    "fileExists",
+    "isModified",
+)
+# Rows handed to the view at a time, more are fetched as it scrolls
+FETCH_SIZE = 100
+
+class HistoryListModel(QAbstractListModel):
+    matchCountChanged = Signal(int)  # count
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        # _urls holds every URL matching the query in display order, only the
+        # first _fetched of them are rows the view knows about. _rowIndex has every
+        # URL of _urls, its position goes stale when rows are added or removed before it.
+        self._history = history
+        self._query = {"text": "", "sortKey": "date", "descending": False, "prefix": False}
+        self._urls = history.query()
+        self._rowIndex = {url: position for position, url in enumerate(self._urls)}
+        self._fetched = min(FETCH_SIZE, len(self._urls))
+        self._roles = {Qt.UserRole + i: name for i, name in enumerate(HISTORY_ROLES + FILE_STATE_ROLES)}
+        self._fileStateRoles = [role for role, name in self._roles.items() if name in FILE_STATE_ROLES]
+        history.recordAdded.connect(self._onRecordAdded)
+        history.recordRemoved.connect(self._onRecordRemoved)
+        history.recordsRemoved.connect(lambda urls: self._reload())
+        history.recordMoved.connect(self._onRecordMoved)
+        history.filesChanged.connect(self._onFilesChanged)
+
+    @Property(int, notify=matchCountChanged)
+    def matchCount(self):
+        return len(self._urls)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._fetched < len(self._urls)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(FETCH_SIZE, len(self._urls) - self._fetched)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._fetched:
+            return None
+        name = self._roles.get(role)
+        if name in FILE_STATE_ROLES:
+            return self._history.fileState(self._urls[index.row()])[name]
+        record = self._history.getRecord(self._urls[index.row()])
+        return record.get(name) if name and record else None
+
+    def roleNames(self):
+        return {role: name.encode() for role, name in self._roles.items()}
+
+    def setQuery(self, text="", sortKey="date", descending=False, prefix=False):
+        query = {"text": text, "sortKey": sortKey, "descending": descending, "prefix": prefix}
+        if query != self._query:
+            self._query = query
+            self._reload()
+
+    def urls(self):
+        return list(self._urls)
+
+    def _reload(self):
+        self.beginResetModel()
+        self._urls = self._history.query(**self._query)
+        self._rowIndex = {url: position for position, url in enumerate(self._urls)}
+        self._fetched = min(FETCH_SIZE, len(self._urls))
+        self.endResetModel()
+        self.matchCountChanged.emit(len(self._urls))
+
+    def _insertPosition(self, url):
+        # Binary search in display order, equal keys keep the order they were added in
+        sortKey, descending = self._query["sortKey"], self._query["descending"]
+        key = self._history.sortValue(url, sortKey)
+        low, high = 0, len(self._urls)
+        while low < high:
+            middle = (low + high) // 2
+            value = self._history.sortValue(self._urls[middle], sortKey)
+            if (value < key) if descending else (value > key):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def _onRecordAdded(self, url):
+        if url in self._rowIndex or not self._history.matches(url, self._query["text"], self._query["prefix"]):
+            return
+        position = self._insertPosition(url)
+        # Rows past the fetched ones are only added to the list, the view gets them on fetchMore
+        isVisible = position < self._fetched or self._fetched == len(self._urls)
+        if isVisible:
+            self.beginInsertRows(QModelIndex(), position, position)
+        self._urls.insert(position, url)
+        self._rowIndex[url] = position
+        if isVisible:
+            self._fetched += 1
+            self.endInsertRows()
+        self.matchCountChanged.emit(len(self._urls))
+
+    def _onRecordRemoved(self, url):
+        position = self._rowPosition(url)
+        if position is None:
+            return
+        isVisible = position < self._fetched
+        if isVisible:
+            self.beginRemoveRows(QModelIndex(), position, position)
+        del self._urls[position]
+        del self._rowIndex[url]
+        if isVisible:
+            self._fetched -= 1
+            self.endRemoveRows()
+        self.matchCountChanged.emit(len(self._urls))
+
+    def _rowPosition(self, url, end=None):
+        # Re-indexing every row on each change would cost a full pass per download,
+        # instead a stale position is searched for in _urls[:end] when it is needed
+        position = self._rowIndex.get(url)
+        if position is None or (position < len(self._urls) and self._urls[position] == url):
+            return position
+        try:
+            position = self._urls.index(url, 0, len(self._urls) if end is None else end)
+        except ValueError:
+            return None
+        self._rowIndex[url] = position
+        return position
+
+    def _onRecordMoved(self, url):
+        # The name may sort differently now
+        self._onRecordRemoved(url)
+        self._onRecordAdded(url)
+
+    def _onFilesChanged(self, urls):
+        # A folder listing can change many rows, neighbouring rows are reported together
+        positions = sorted(position for position in (self._rowPosition(url, self._fetched) for url in urls)
+                           if position is not None and position < self._fetched)
+        first = 0
+        for i, position in enumerate(positions):
+            if i + 1 == len(positions) or positions[i + 1] != position + 1:
+                self.dataChanged.emit(self.index(positions[first]), self.index(position), self._fileStateRoles)
+                first = i + 1
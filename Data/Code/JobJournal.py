@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import threading
+from PySide6.QtCore import QObject, QDir, QTimer, QMetaObject, Qt
+
+# Columns of the jobs table, new ones are added to existing databases on open
+JOB_COLUMNS = {
+    'url': "TEXT PRIMARY KEY",
+    'filename': "TEXT NOT NULL DEFAULT ''",
+    'savePath': "TEXT NOT NULL DEFAULT ''",
+    'tempPath': "TEXT NOT NULL DEFAULT ''",
+    'state': "TEXT NOT NULL DEFAULT 'queued'",
+    'priority': "INTEGER NOT NULL DEFAULT 0",
+    'bytesTotal': "INTEGER NOT NULL DEFAULT 0",
+    'etag': "TEXT NOT NULL DEFAULT ''",
+    'lastModified': "TEXT NOT NULL DEFAULT ''",
+    'validatorMirror': "INTEGER NOT NULL DEFAULT 0",
+    'checksum': "TEXT NOT NULL DEFAULT ''",
+    'mirrors': "TEXT NOT NULL DEFAULT '[]'",
+    'segments': "TEXT NOT NULL DEFAULT '[]'",
+}
+JSON_COLUMNS = ('mirrors', 'segments')
+COMMIT_DELAY_MS = 1000
+
+class JobJournal(QObject):
+    # Jobs that have not finished yet, so the queue survives a restart or crash.
+    # saveJob is called from the writer thread once a job's data is on disk,
+    # the database itself is only touched from the GUI thread.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._journalFile = QDir.current().filePath("Download_Jobs.db")
+        self._pendingWrites = {}
+        self._lock = threading.Lock()
+        self._db = None
+
+        self._commitTimer = QTimer(self)
+        self._commitTimer.setSingleShot(True)
+        self._commitTimer.setInterval(COMMIT_DELAY_MS)
+        self._commitTimer.timeout.connect(self._commitPending)
+
+        self._ensureJournalFile()
+
+    def jobs(self):
+        if self._db is None:
+            return []
+        names = list(JOB_COLUMNS)
+        jobs = []
+        try:
+            for row in self._db.execute(f"SELECT {', '.join(names)} FROM jobs ORDER BY rowid"):
+                job = dict(zip(names, row))
+                for name in JSON_COLUMNS:
+                    job[name] = json.loads(job[name] or "[]")
+                jobs.append(job)
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            print(f"Error reading job journal: {str(e)}")
+        return jobs
+
+    def saveJob(self, url, job):
+        # None removes the job, writes for the same URL replace each other until committed
+        with self._lock:
+            wasEmpty = not self._pendingWrites
+            self._pendingWrites[url] = job
+        if wasEmpty:
+            QMetaObject.invokeMethod(self._commitTimer, "start", Qt.QueuedConnection)
+
+    def flush(self):
+        self._commitPending()
+
+    def _ensureJournalFile(self):
+        try:
+            self._db = sqlite3.connect(self._journalFile)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            columns = ", ".join(f"{name} {sqlType}" for name, sqlType in JOB_COLUMNS.items())
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS jobs ({columns})")
+            existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for name, sqlType in JOB_COLUMNS.items():
+                if name not in existing:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {sqlType}")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening job journal: {str(e)}")
+            self._db = None
+
+    def _columnValue(self, job, name):
+        if name in JSON_COLUMNS:
+            return json.dumps(job.get(name, []), ensure_ascii=False)
+        default = 0 if JOB_COLUMNS[name].startswith("INTEGER") else ""
+        return job.get(name, default)
+
+    def _commitPending(self):
+        self._commitTimer.stop()
+        with self._lock:
+            pending, self._pendingWrites = self._pendingWrites, {}
+        if not pending or self._db is None:
+            return
+
+        names = list(JOB_COLUMNS)
+        upserts = [tuple(self._columnValue(dict(job, url=url), name) for name in names)
+                   for url, job in pending.items() if job is not None]
+        deletes = [(url,) for url, job in pending.items() if job is None]
+        try:
+            with self._db:
+                if upserts:
+                    # Upsert rather than REPLACE so jobs keep their rowid and queue order
+                    updates = ", ".join(f"{name} = excluded.{name}" for name in names[1:])
+                    self._db.executemany(
+                        f"INSERT INTO jobs ({', '.join(names)}) "
+                        f"VALUES ({', '.join('?' for _ in names)}) "
+                        f"ON CONFLICT(url) DO UPDATE SET {updates}",
+                        upserts
+                    )
+                if deletes:
+                    self._db.executemany("DELETE FROM jobs WHERE url = ?", deletes)
+        except sqlite3.Error as e:
+            print(f"Error saving job journal: {str(e)}")
+            with self._lock:
+                pending.update(self._pendingWrites)
+                self._pendingWrites = pending
+            # saveJob only starts the timer for the first pending write, so retry from here
+            self._commitTimer.start()
@@ -0,0 +1,210 @@
+import os
+import shlex
+import shutil
+import subprocess
+import tarfile
+import zipfile
+from PySide6.QtCore import QObject, QThreadPool, Signal, Property
+
+# Stages run in this order, each one on its own pool
+STAGES = ("move", "extract", "hook")
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+HOOK_TIMEOUT_S = 10 * 60
+PROGRESS_STEP = 0.01
+
+class PostProcessor(QObject):
+    stageStarted = Signal(str, str)  # url, stage
+    stageProgress = Signal(str, str, float)  # url, stage, progress from 0 to 1
+    stageFinished = Signal(str, str, str, str)  # url, stage, path, errorMessage
+    processed = Signal(str, str)  # url, path
+    processingFailed = Signal(str, str, str)  # url, stage, errorMessage
+    activeCountChanged = Signal(int)  # count
+
+    def __init__(self, settings, history, parent=None):
+        super().__init__(parent)
+        # Stages run on thread pools and report back through stageFinished, which is
+        # delivered on the GUI thread where the next stage is started
+        self._settings = settings
+        self._history = history
+        self._jobs = {}
+        self._pools = {stage: QThreadPool(self) for stage in STAGES}
+        self._applyLimits()
+        settings.moveConcurrencyChanged.connect(lambda value: self._applyLimits())
+        settings.extractConcurrencyChanged.connect(lambda value: self._applyLimits())
+        settings.hookConcurrencyChanged.connect(lambda value: self._applyLimits())
+        self.stageFinished.connect(self._onStageFinished)
+
+    @staticmethod
+    def parseMoveRules(text):
+        # "mp4,mkv=Videos; pdf=/home/me/Documents", folders are relative to the download folder
+        rules = []
+        for rule in text.split(";"):
+            extensions, separator, folder = rule.partition("=")
+            extensions = {f".{extension.strip().lstrip('.').lower()}" for extension in extensions.split(",") if extension.strip()}
+            if separator and extensions and folder.strip():
+                rules.append((extensions, folder.strip()))
+        return rules
+
+    @Property(int, notify=activeCountChanged)
+    def activeCount(self):
+        return len(self._jobs)
+
+    def process(self, url, path, isHeld=False):
+        # Stages and their settings are fixed when the job is added. A held job
+        # counts as active but waits for release() before its first stage runs.
+        stages = []
+        folder = self._moveFolder(path)
+        if folder:
+            stages.append(("move", (folder,)))
+        if self._settings.postExtract and self._archiveSuffix(path):
+            stages.append(("extract", ()))
+        if self._settings.postCommand.strip():
+            stages.append(("hook", (self._settings.postCommand,)))
+        if not stages or url in self._jobs:
+            return False
+        self._jobs[url] = {"path": path, "stages": stages, "isHeld": isHeld}
+        self.activeCountChanged.emit(len(self._jobs))
+        if not isHeld:
+            self._startNext(url)
+        return True
+
+    def release(self, url):
+        job = self._jobs.get(url)
+        if job is not None and job["isHeld"]:
+            job["isHeld"] = False
+            self._startNext(url)
+
+    def _applyLimits(self):
+        self._pools["move"].setMaxThreadCount(max(1, self._settings.moveConcurrency))
+        self._pools["extract"].setMaxThreadCount(max(1, self._settings.extractConcurrency))
+        self._pools["hook"].setMaxThreadCount(max(1, self._settings.hookConcurrency))
+
+    def _moveFolder(self, path):
+        name = os.path.basename(path).lower()
+        for extensions, folder in self.parseMoveRules(self._settings.postMoveRules):
+            if any(name.endswith(extension) for extension in extensions):
+                folder = os.path.join(self._settings.downloadFolder, os.path.expanduser(folder))
+                return "" if os.path.normpath(folder) == os.path.dirname(os.path.normpath(path)) else folder
+        return ""
+
+    def _archiveSuffix(self, path):
+        name = path.lower()
+        return next((suffix for suffix in ZIP_SUFFIXES + TAR_SUFFIXES if name.endswith(suffix)), "")
+
+    def _startNext(self, url):
+        job = self._jobs[url]
+        if not job["stages"]:
+            del self._jobs[url]
+            self.processed.emit(url, job["path"])
+            self.activeCountChanged.emit(len(self._jobs))
+            return
+        stage, args = job["stages"].pop(0)
+        path = job["path"]
+        self.stageStarted.emit(url, stage)
+        self._pools[stage].start(lambda: self._runStage(url, stage, path, args))
+
+    def _runStage(self, url, stage, path, args):
+        # Runs on a pool thread
+        try:
+            path = getattr(self, f"_{stage}")(url, path, *args)
+        except Exception as e:
+            self.stageFinished.emit(url, stage, path, getattr(e, "strerror", None) or str(e))
+            return
+        self.stageFinished.emit(url, stage, path, "")
+
+    def _onStageFinished(self, url, stage, path, errorMessage):
+        job = self._jobs.get(url)
+        if job is None:
+            return
+        if errorMessage:
+            del self._jobs[url]
+            self.processingFailed.emit(url, stage, errorMessage)
+            self.activeCountChanged.emit(len(self._jobs))
+            return
+        if stage == "move":
+            self._history.moveRecord(url, os.path.dirname(path), os.path.basename(path))
+        job["path"] = path
+        self._startNext(url)
+
+    def _move(self, url, path, folder):
+        os.makedirs(folder, exist_ok=True)
+        target = self._freePath(os.path.join(folder, os.path.basename(path)))
+        shutil.move(path, target)
+        return target
+
+    def _extract(self, url, path):
+        # Unpacked next to the archive into a folder named after it, under a temporary
+        # name until everything is out. Returns the archive path for the next stages.
+        suffix = self._archiveSuffix(path)
+        target = self._freePath(path[:-len(suffix)])
+        partial = f"{target}.extracting"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        try:
+            if suffix in ZIP_SUFFIXES:
+                self._extractZip(url, path, partial)
+            else:
+                self._extractTar(url, path, partial)
+            os.replace(partial, target)
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+        return path
+
+    def _extractZip(self, url, path, folder):
+        with zipfile.ZipFile(path) as archive:
+            members = archive.infolist()
+            reporter = self._progressReporter(url, "extract", sum(member.file_size for member in members))
+            for member in members:
+                self._checkMemberPath(folder, member.filename)
+                archive.extract(member, folder)
+                reporter(member.file_size)
+
+    def _extractTar(self, url, path, folder):
+        with tarfile.open(path, "r:*") as archive:
+            members = archive.getmembers()
+            reporter = self._progressReporter(url, "extract", sum(member.size for member in members))
+            for member in members:
+                if hasattr(tarfile, "data_filter"):
+                    archive.extract(member, folder, filter="data")
+                elif member.isfile() or member.isdir():
+                    # Links are skipped where the data filter is not available
+                    self._checkMemberPath(folder, member.name)
+                    archive.extract(member, folder)
+                reporter(member.size)
+
+    def _checkMemberPath(self, folder, name):
+        root = os.path.realpath(folder)
+        if os.path.commonpath([root, os.path.realpath(os.path.join(folder, name))]) != root:
+            raise ValueError(f"Archive member outside the target folder: {name}")
+
+    def _hook(self, url, path, command):
+        # Arguments are substituted after splitting, so paths with spaces stay one argument
+        arguments = [argument.replace("{path}", path).replace("{url}", url)
+                     for argument in shlex.split(command, posix=os.name != "nt")]
+        result = subprocess.run(arguments, capture_output=True, timeout=HOOK_TIMEOUT_S)
+        if result.returncode != 0:
+            output = result.stderr.decode(errors="replace").strip().splitlines()
+            raise Exception(f"Command exited with {result.returncode}" + (f": {output[-1]}" if output else ""))
+        return path
+
+    def _progressReporter(self, url, stage, total):
+        # Progress is reported in steps of PROGRESS_STEP so large archives do not flood the GUI thread
+        state = {"done": 0, "reported": 0.0}
+        def report(size):
+            state["done"] += size
+            progress = state["done"] / total if total else 1.0
+            if progress - state["reported"] >= PROGRESS_STEP or (progress >= 1.0 > state["reported"]):
+                state["reported"] = progress
+                self.stageProgress.emit(url, stage, progress)
+        return report
+
+    def _freePath(self, path):
+        if not os.path.exists(path):
+            return path
+        base, suffix = os.path.splitext(path)
+        counter = 1
+        while os.path.exists(f"{base}_{counter}{suffix}"):
+            counter += 1
+        return f"{base}_{counter}{suffix}"
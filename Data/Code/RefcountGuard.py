@@ -0,0 +1,38 @@
+import ctypes
+import sys
+from PySide6.QtCore import QObject, Signal
+
+PROBE_CALLS = 64
+# Far more calls than one process makes, at a million per second it lasts a decade
+RESERVED_REFERENCES = 1 << 48
+
+class _Probe(QObject):
+    probed = Signal()
+
+class RefcountGuard:
+    # Some PySide6 wheels (6.12.0 among them) return None, True and False without a
+    # reference of their own, as if they were immortal the way they are on Python 3.12.
+    # On older Pythons every void call and every Signal.emit then releases a reference
+    # it never took, and after a few thousand calls Python aborts with "none_dealloc"
+    # or "bool_dealloc". Where that is detected the references are added up front,
+    # these objects are never freed so the extra ones cost nothing.
+    _isInstalled = False
+
+    @staticmethod
+    def install():
+        if RefcountGuard._isInstalled:
+            return
+        RefcountGuard._isInstalled = True
+        if sys.implementation.name != "cpython":
+            return
+
+        singletons = (None, True, False)
+        probe = _Probe()
+        before = sum(sys.getrefcount(value) for value in singletons)
+        for index in range(PROBE_CALLS):
+            probe.setObjectName("")
+            probe.probed.emit()
+        if before - sum(sys.getrefcount(value) for value in singletons) < PROBE_CALLS:
+            return
+        for value in singletons:
+            ctypes.c_ssize_t.from_address(id(value)).value += RESERVED_REFERENCES
@@ -0,0 +1,50 @@
+import random
+from PySide6.QtNetwork import QNetworkReply
+
+MAX_RETRIES = 6
+BASE_DELAY_MS = 1000
+MAX_DELAY_MS = 60 * 1000
+
+# Network level failures that usually go away on their own
+TRANSIENT_ERRORS = {
+    QNetworkReply.ConnectionRefusedError,
+    QNetworkReply.RemoteHostClosedError,
+    QNetworkReply.HostNotFoundError,
+    QNetworkReply.TimeoutError,
+    QNetworkReply.TemporaryNetworkFailureError,
+    QNetworkReply.NetworkSessionFailedError,
+    QNetworkReply.UnknownNetworkError,
+    QNetworkReply.ProxyConnectionRefusedError,
+    QNetworkReply.ProxyConnectionClosedError,
+    QNetworkReply.ProxyTimeoutError,
+    QNetworkReply.InternalServerError,
+    QNetworkReply.ServiceUnavailableError,
+    QNetworkReply.UnknownServerError,
+}
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+class RetryPolicy:
+    def __init__(self, maxRetries=MAX_RETRIES, baseDelay=BASE_DELAY_MS, maxDelay=MAX_DELAY_MS):
+        self.maxRetries = maxRetries
+        self._baseDelay = baseDelay
+        self._maxDelay = maxDelay
+
+    def isTransient(self, error, statusCode=0):
+        # A connection can still break after a successful status line
+        if statusCode >= 400:
+            return statusCode in TRANSIENT_STATUS_CODES
+        return error in TRANSIENT_ERRORS
+
+    def canRetry(self, attempt):
+        return attempt < self.maxRetries
+
+    def delay(self, attempt, retryAfter=0):
+        # Capped exponential backoff, jittered so failed segments do not retry in lockstep
+        delay = min(self._maxDelay, self._baseDelay * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)
+        return int(min(self._maxDelay, max(delay, retryAfter * 1000)))
+
+    def retryAfter(self, reply):
+        # Only the delta-seconds form of Retry-After is honoured
+        value = reply.rawHeader("Retry-After").data().strip()
+        return int(value) if value.isdigit() else 0
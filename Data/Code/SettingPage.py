@@ -1,99 +1,331 @@
-from PySide6.QtCore import QCoreApplication, QObject, Signal, Property, QUrl, Slot, QDir, QStandardPaths, QFile, QTextStream, QRegularExpression
+from PySide6.QtCore import QCoreApplication, QObject, Signal, Property, Slot, QDir, QStandardPaths, QRegularExpression
+from .DownloadCache import CACHE_MODES
 from .DownloadHistory import DownloadHistory
+from .FileWriter import SYNC_MODES, MEMORY_BUDGET, MIN_MEMORY_BUDGET
+from .RetryPolicy import MAX_RETRIES, BASE_DELAY_MS, MAX_DELAY_MS
+from .SettingsStore import SettingsStore
 
 class Settings(QObject):
-    def __init__(self):
+    def __init__(self, autoSave=True, configFile=None):
         super().__init__()
+        # Without autoSave changed values only live for this process (used by headless runs)
         appDir = QCoreApplication.applicationDirPath()
-        self.configFile = f"{appDir}/Downloader.ini"
-        self._downloadFolder = ""
-        self._concurrentDownloads = 0
-        self._maxThreadsPerDownload = 0
-        self.downloadHistory = DownloadHistory(self)
+        self.configFile = configFile or f"{appDir}/Downloader.ini"
+        self._downloadHistory = None
+        self._store = SettingsStore(self.configFile, self._schema(), autoSave, self)
         self.loadConfig()
 
+    @property
+    def downloadHistory(self):
+        # Created on first use so it sees the loaded config, then shared by every backend
+        if self._downloadHistory is None:
+            self._downloadHistory = DownloadHistory(self, self)
+            self.downloadFolderChanged.connect(self._downloadHistory.setDownloadFolder)
+        return self._downloadHistory
+
+    def _schema(self):
+        # INI key: (default, normalize), see SettingsStore
+        return {
+            "download_folder": (QStandardPaths.writableLocation(QStandardPaths.DownloadLocation), self._localPath),
+            "concurrentDownloads": (5, lambda value: max(1, value)),
+            "maxThreadsPerDownload": (32, lambda value: max(1, value)),
+            "globalSpeedLimit": (0, lambda value: max(0, value)),
+            "perDownloadSpeedLimit": (0, lambda value: max(0, value)),
+            "cacheMode": ("metadata", lambda value: value if value in CACHE_MODES else "metadata"),
+            "cacheSize": (64 * 1024 * 1024, lambda value: max(0, value)),
+            "cacheFolder": (self.defaultCacheFolder(), lambda value: self._localPath(value) or self.defaultCacheFolder()),
+            "syncMode": ("throughput", lambda value: value if value in SYNC_MODES else "throughput"),
+            "maxConnectionsPerHost": (6, lambda value: max(1, value)),
+            "http2Enabled": (True, None),
+            "probeParallelism": (4, lambda value: max(1, value)),
+            "tracingEnabled": (False, None),
+            "traceFile": (self.defaultTraceFile(), lambda value: self._localPath(value) or self.defaultTraceFile()),
+            "statsPort": (0, lambda value: max(0, min(65535, value))),
+            "maxRetries": (MAX_RETRIES, lambda value: max(0, value)),
+            "retryBaseDelay": (BASE_DELAY_MS, lambda value: max(0, value)),
+            "retryMaxDelay": (MAX_DELAY_MS, lambda value: max(0, value)),
+            "postMoveRules": ("", None),
+            "postExtract": (False, None),
+            "postCommand": ("", None),
+            "moveConcurrency": (2, lambda value: max(1, value)),
+            "extractConcurrency": (1, lambda value: max(1, value)),
+            "hookConcurrency": (2, lambda value: max(1, value)),
+            "memoryBudget": (MEMORY_BUDGET, lambda value: max(MIN_MEMORY_BUDGET, value)),
+            "legacyCacheRemoved": (False, None),
+        }
+
     def loadConfig(self):
-        config = QFile(self.configFile)
-        if not config.exists():
-            self.setDefaultValues()
-            self.saveConfig()
-            return
-
-        if not config.open(QFile.ReadOnly | QFile.Text):
-            print(f"Error opening config file for reading: {config.errorString()}")
-            self.setDefaultValues()
-            return
-
-        stream = QTextStream(config)
-        self.downloadFolder = self.readConfigValue(stream, "download_folder", QStandardPaths.writableLocation(QStandardPaths.DownloadLocation))
-        self.concurrentDownloads = int(self.readConfigValue(stream, "concurrentDownloads", "5"))
-        self.maxThreadsPerDownload = int(self.readConfigValue(stream, "maxThreadsPerDownload", "32"))
-        config.close()
-
-    def readConfigValue(self, stream, key, default):
-        regex = QRegularExpression(f"^{key}=(.*)$")
-        while not stream.atEnd():
-            line = stream.readLine()
-            match = regex.match(line)
-            if match.hasMatch():
-                return match.captured(1)
-        return default
-
-    def setDefaultValues(self):
-        self.downloadFolder = QStandardPaths.writableLocation(QStandardPaths.DownloadLocation)
-        self.concurrentDownloads = 5
-        self.maxThreadsPerDownload = 32
+        self._store.load()
+
+    def defaultCacheFolder(self):
+        return QDir(QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation)).filePath("Downloader")
+
+    def defaultTraceFile(self):
+        return QDir(QStandardPaths.writableLocation(QStandardPaths.TempLocation)).filePath("Downloader-trace.jsonl")
+
+    def values(self):
+        return self._store.values()
 
     def saveConfig(self):
-        config = QFile(self.configFile)
-        if not config.open(QFile.WriteOnly | QFile.Text):
-            print(f"Error opening config file for writing: {config.errorString()}")
-            return
+        # Changes are written shortly after they are made, this writes them right away
+        self._store.flush()
+
+    def _localPath(self, value):
+        return value[8:] if value.startswith("file:///") else value
 
-        stream = QTextStream(config)
-        stream << f"download_folder={self._downloadFolder}\n"
-        stream << f"concurrentDownloads={self._concurrentDownloads}\n"
-        stream << f"maxThreadsPerDownload={self._maxThreadsPerDownload}\n"
-        config.close()
+    def _setValue(self, key, value, changed):
+        if self._store.setValue(key, value):
+            changed.emit(self._store.value(key))
 
     downloadFolderChanged = Signal(str)
     concurrentDownloadsChanged = Signal(int)
     maxThreadsPerDownloadChanged = Signal(int)
+    globalSpeedLimitChanged = Signal(int)
+    perDownloadSpeedLimitChanged = Signal(int)
+    cacheModeChanged = Signal(str)
+    cacheSizeChanged = Signal("qint64")
+    cacheFolderChanged = Signal(str)
+    syncModeChanged = Signal(str)
+    maxConnectionsPerHostChanged = Signal(int)
+    http2EnabledChanged = Signal(bool)
+    probeParallelismChanged = Signal(int)
+    tracingEnabledChanged = Signal(bool)
+    traceFileChanged = Signal(str)
+    statsPortChanged = Signal(int)
+    maxRetriesChanged = Signal(int)
+    retryBaseDelayChanged = Signal(int)
+    retryMaxDelayChanged = Signal(int)
+    postMoveRulesChanged = Signal(str)
+    postExtractChanged = Signal(bool)
+    postCommandChanged = Signal(str)
+    moveConcurrencyChanged = Signal(int)
+    extractConcurrencyChanged = Signal(int)
+    hookConcurrencyChanged = Signal(int)
+    memoryBudgetChanged = Signal(int)
+    legacyCacheRemovedChanged = Signal(bool)
 
     @Property(str, notify=downloadFolderChanged)
     def downloadFolder(self):
-        return self._downloadFolder
+        return self._store.value("download_folder")
 
     @downloadFolder.setter
     def downloadFolder(self, value):
-        if value.startswith("file:///"):
-            value = value[8:]
-        if self._downloadFolder != value:
-            self._downloadFolder = value
-            self.downloadFolderChanged.emit(value)
-            self.saveConfig()
+        self._setValue("download_folder", value, self.downloadFolderChanged)
 
     @Property(int, notify=concurrentDownloadsChanged)
     def concurrentDownloads(self):
-        return self._concurrentDownloads
+        return self._store.value("concurrentDownloads")
 
     @concurrentDownloads.setter
     def concurrentDownloads(self, value):
-        if self._concurrentDownloads != value:
-            self._concurrentDownloads = value
-            self.concurrentDownloadsChanged.emit(value)
-            self.saveConfig()
+        self._setValue("concurrentDownloads", value, self.concurrentDownloadsChanged)
 
     @Property(int, notify=maxThreadsPerDownloadChanged)
     def maxThreadsPerDownload(self):
-        return self._maxThreadsPerDownload
+        return self._store.value("maxThreadsPerDownload")
 
     @maxThreadsPerDownload.setter
     def maxThreadsPerDownload(self, value):
-        if self._maxThreadsPerDownload != value:
-            self._maxThreadsPerDownload = value
-            self.maxThreadsPerDownloadChanged.emit(value)
-            self.saveConfig()
+        self._setValue("maxThreadsPerDownload", value, self.maxThreadsPerDownloadChanged)
+
+    # Speed limits are in bytes per second, 0 means unlimited
+    @Property(int, notify=globalSpeedLimitChanged)
+    def globalSpeedLimit(self):
+        return self._store.value("globalSpeedLimit")
+
+    @globalSpeedLimit.setter
+    def globalSpeedLimit(self, value):
+        self._setValue("globalSpeedLimit", value, self.globalSpeedLimitChanged)
+
+    @Property(int, notify=perDownloadSpeedLimitChanged)
+    def perDownloadSpeedLimit(self):
+        return self._store.value("perDownloadSpeedLimit")
+
+    @perDownloadSpeedLimit.setter
+    def perDownloadSpeedLimit(self, value):
+        self._setValue("perDownloadSpeedLimit", value, self.perDownloadSpeedLimitChanged)
+
+    # One of "off", "metadata" or "payload", see DownloadCache
+    @Property(str, notify=cacheModeChanged)
+    def cacheMode(self):
+        return self._store.value("cacheMode")
+
+    @cacheMode.setter
+    def cacheMode(self, value):
+        self._setValue("cacheMode", value, self.cacheModeChanged)
+
+    # Size limit in bytes for everything kept in the cache folder
+    @Property("qint64", notify=cacheSizeChanged)
+    def cacheSize(self):
+        return self._store.value("cacheSize")
+
+    @cacheSize.setter
+    def cacheSize(self, value):
+        self._setValue("cacheSize", value, self.cacheSizeChanged)
+
+    @Property(str, notify=cacheFolderChanged)
+    def cacheFolder(self):
+        return self._store.value("cacheFolder")
+
+    @cacheFolder.setter
+    def cacheFolder(self, value):
+        self._setValue("cacheFolder", value, self.cacheFolderChanged)
+
+    # "throughput" or "durability", see FileWriter
+    @Property(str, notify=syncModeChanged)
+    def syncMode(self):
+        return self._store.value("syncMode")
+
+    @syncMode.setter
+    def syncMode(self, value):
+        self._setValue("syncMode", value, self.syncModeChanged)
+
+    # Segments beyond this wait for a free connection to the same host
+    @Property(int, notify=maxConnectionsPerHostChanged)
+    def maxConnectionsPerHost(self):
+        return self._store.value("maxConnectionsPerHost")
+
+    @maxConnectionsPerHost.setter
+    def maxConnectionsPerHost(self, value):
+        self._setValue("maxConnectionsPerHost", value, self.maxConnectionsPerHostChanged)
+
+    @Property(bool, notify=http2EnabledChanged)
+    def http2Enabled(self):
+        return self._store.value("http2Enabled")
+
+    @http2Enabled.setter
+    def http2Enabled(self, value):
+        self._setValue("http2Enabled", value, self.http2EnabledChanged)
+
+    # HEAD requests sent at once while checking imported URLs
+    @Property(int, notify=probeParallelismChanged)
+    def probeParallelism(self):
+        return self._store.value("probeParallelism")
+
+    @probeParallelism.setter
+    def probeParallelism(self, value):
+        self._setValue("probeParallelism", value, self.probeParallelismChanged)
+
+    # Timing spans, chunk sizes and event loop latency written as JSON lines to traceFile
+    @Property(bool, notify=tracingEnabledChanged)
+    def tracingEnabled(self):
+        return self._store.value("tracingEnabled")
+
+    @tracingEnabled.setter
+    def tracingEnabled(self, value):
+        self._setValue("tracingEnabled", value, self.tracingEnabledChanged)
+
+    @Property(str, notify=traceFileChanged)
+    def traceFile(self):
+        return self._store.value("traceFile")
+
+    @traceFile.setter
+    def traceFile(self, value):
+        self._setValue("traceFile", value, self.traceFileChanged)
+
+    # Live stats are served as JSON on 127.0.0.1 at this port, 0 turns the endpoint off
+    @Property(int, notify=statsPortChanged)
+    def statsPort(self):
+        return self._store.value("statsPort")
+
+    @statsPort.setter
+    def statsPort(self, value):
+        self._setValue("statsPort", value, self.statsPortChanged)
+
+    # Retries per segment for transient errors, with capped exponential backoff in ms
+    @Property(int, notify=maxRetriesChanged)
+    def maxRetries(self):
+        return self._store.value("maxRetries")
+
+    @maxRetries.setter
+    def maxRetries(self, value):
+        self._setValue("maxRetries", value, self.maxRetriesChanged)
+
+    @Property(int, notify=retryBaseDelayChanged)
+    def retryBaseDelay(self):
+        return self._store.value("retryBaseDelay")
+
+    @retryBaseDelay.setter
+    def retryBaseDelay(self, value):
+        self._setValue("retryBaseDelay", value, self.retryBaseDelayChanged)
+
+    @Property(int, notify=retryMaxDelayChanged)
+    def retryMaxDelay(self):
+        return self._store.value("retryMaxDelay")
+
+    @retryMaxDelay.setter
+    def retryMaxDelay(self, value):
+        self._setValue("retryMaxDelay", value, self.retryMaxDelayChanged)
+
+    # Finished files are moved by extension, e.g. "mp4,mkv=Videos; pdf=Documents", see PostProcessor
+    @Property(str, notify=postMoveRulesChanged)
+    def postMoveRules(self):
+        return self._store.value("postMoveRules")
+
+    @postMoveRules.setter
+    def postMoveRules(self, value):
+        self._setValue("postMoveRules", value, self.postMoveRulesChanged)
+
+    # zip and tar archives are unpacked next to themselves
+    @Property(bool, notify=postExtractChanged)
+    def postExtract(self):
+        return self._store.value("postExtract")
+
+    @postExtract.setter
+    def postExtract(self, value):
+        self._setValue("postExtract", value, self.postExtractChanged)
+
+    # Run for every finished file, {path} and {url} are replaced in each argument
+    @Property(str, notify=postCommandChanged)
+    def postCommand(self):
+        return self._store.value("postCommand")
+
+    @postCommand.setter
+    def postCommand(self, value):
+        self._setValue("postCommand", value, self.postCommandChanged)
+
+    # Post-processing jobs running at once in each stage
+    @Property(int, notify=moveConcurrencyChanged)
+    def moveConcurrency(self):
+        return self._store.value("moveConcurrency")
+
+    @moveConcurrency.setter
+    def moveConcurrency(self, value):
+        self._setValue("moveConcurrency", value, self.moveConcurrencyChanged)
+
+    @Property(int, notify=extractConcurrencyChanged)
+    def extractConcurrency(self):
+        return self._store.value("extractConcurrency")
+
+    @extractConcurrency.setter
+    def extractConcurrency(self, value):
+        self._setValue("extractConcurrency", value, self.extractConcurrencyChanged)
+
+    @Property(int, notify=hookConcurrencyChanged)
+    def hookConcurrency(self):
+        return self._store.value("hookConcurrency")
+
+    @hookConcurrency.setter
+    def hookConcurrency(self, value):
+        self._setValue("hookConcurrency", value, self.hookConcurrencyChanged)
+
+    # Bytes of downloaded data held in memory before reads from the network stop
+    @Property(int, notify=memoryBudgetChanged)
+    def memoryBudget(self):
+        return self._store.value("memoryBudget")
+
+    @memoryBudget.setter
+    def memoryBudget(self, value):
+        self._setValue("memoryBudget", value, self.memoryBudgetChanged)
+
+    # Set once the .http_cache folder of older versions has been removed
+    @Property(bool, notify=legacyCacheRemovedChanged)
+    def legacyCacheRemoved(self):
+        return self._store.value("legacyCacheRemoved")
+
+    @legacyCacheRemoved.setter
+    def legacyCacheRemoved(self, value):
+        self._setValue("legacyCacheRemoved", value, self.legacyCacheRemovedChanged)
 
     @Slot(str, result=bool)
     def isValidPath(self, path):
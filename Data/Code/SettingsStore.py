@@ -0,0 +1,108 @@
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, QFile, QSaveFile, QIODevice
+
+SAVE_DELAY_MS = 500
+
+class SettingsStore(QObject):
+    # schema maps each key to (default, normalize). The type of the default decides
+    # how the value is parsed, normalize(value) returns the value that is stored.
+    # Keys are read in one pass in any order, unknown keys are kept as they are.
+
+    def __init__(self, path, schema, autoSave=True, parent=None):
+        super().__init__(parent)
+        self._path = path
+        self._schema = schema
+        self._autoSave = autoSave
+        self._values = {}
+        self._unknown = {}
+        self._isDirty = False
+
+        self._saveTimer = QTimer(self)
+        self._saveTimer.setSingleShot(True)
+        self._saveTimer.setInterval(SAVE_DELAY_MS)
+        self._saveTimer.timeout.connect(self.flush)
+        if QCoreApplication.instance():
+            QCoreApplication.instance().aboutToQuit.connect(self.flush)
+
+    def load(self):
+        lines = {}
+        config = QFile(self._path)
+        if config.exists():
+            if config.open(QIODevice.ReadOnly | QIODevice.Text):
+                for line in bytes(config.readAll()).decode("utf-8", "replace").splitlines():
+                    key, separator, value = line.partition("=")
+                    if separator and key.strip():
+                        lines[key.strip()] = value
+                config.close()
+            else:
+                print(f"Error opening config file for reading: {config.errorString()}")
+
+        # Missing keys are written once so the file lists every setting
+        isMissing = any(key not in lines for key in self._schema)
+        self._values = {key: self._parse(key, lines.pop(key)) if key in lines else self._normalize(key, default)
+                        for key, (default, normalize) in self._schema.items()}
+        self._unknown = lines
+        if isMissing:
+            self._scheduleSave()
+
+    def value(self, key):
+        return self._values[key]
+
+    def values(self):
+        return dict(self._values)
+
+    def setValue(self, key, value):
+        # Returns True if the stored value changed
+        value = self._normalize(key, value)
+        if self._values.get(key) == value:
+            return False
+        self._values[key] = value
+        self._scheduleSave()
+        return True
+
+    def flush(self):
+        self._saveTimer.stop()
+        if not self._isDirty or not self._autoSave:
+            return
+        config = QSaveFile(self._path)
+        if not config.open(QIODevice.WriteOnly | QIODevice.Text):
+            print(f"Error opening config file for writing: {config.errorString()}")
+            return
+        lines = [f"{key}={self._format(value)}\n" for key, value in self._values.items()]
+        lines += [f"{key}={value}\n" for key, value in self._unknown.items()]
+        config.write("".join(lines).encode("utf-8"))
+        if not config.commit():
+            print(f"Error writing config file: {config.errorString()}")
+            return
+        self._isDirty = False
+
+    def _parse(self, key, text):
+        default = self._schema[key][0]
+        if isinstance(default, bool):
+            value = {"true": True, "false": False}.get(text.strip().lower(), default)
+        elif isinstance(default, int):
+            try:
+                value = int(text.strip())
+            except ValueError:
+                value = default
+        else:
+            value = text
+        return self._normalize(key, value)
+
+    def _normalize(self, key, value):
+        default, normalize = self._schema[key]
+        if type(value) is not type(default):
+            try:
+                value = type(default)(value)
+            except (TypeError, ValueError):
+                value = default
+        return normalize(value) if normalize else value
+
+    def _format(self, value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        return str(value)
+
+    def _scheduleSave(self):
+        self._isDirty = True
+        if self._autoSave and not self._saveTimer.isActive():
+            self._saveTimer.start()
@@ -0,0 +1,17 @@
+from PySide6.QtCore import QElapsedTimer
+
+class StartupTimer:
+    def __init__(self):
+        self._timer = QElapsedTimer()
+        self._timer.start()
+        self._marks = []
+        self._lastElapsed = 0
+
+    def mark(self, phase):
+        elapsed = self._timer.elapsed()
+        self._marks.append((phase, elapsed - self._lastElapsed))
+        self._lastElapsed = elapsed
+
+    def report(self):
+        phases = ", ".join(f"{phase} {ms} ms" for phase, ms in self._marks)
+        print(f"Startup: {self._lastElapsed} ms ({phases})")
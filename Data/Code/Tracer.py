@@ -0,0 +1,228 @@
+import json
+import threading
+import time
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, QElapsedTimer, Qt
+from PySide6.QtNetwork import QNetworkRequest, QTcpServer, QHostAddress
+
+FLUSH_INTERVAL_MS = 1000
+LOOP_PROBE_INTERVAL_MS = 100
+# Chunk sizes are counted in power of two buckets, the last one takes everything larger
+CHUNK_BUCKETS = tuple(1 << shift for shift in range(10, 25))
+
+class Tracer(QObject):
+    # Callers check tracer.enabled before calling into it on hot paths, so a
+    # disabled tracer costs one attribute lookup per chunk and nothing else.
+    # Only addWrite is called from the writer thread.
+
+    def __init__(self, statsSource=None, parent=None):
+        super().__init__(parent)
+        self.enabled = False
+        self._statsSource = statsSource
+        self._path = ""
+        self._file = None
+        self._lines = []
+        self._jobs = {}
+        self._writes = {}
+        self._writeLock = threading.Lock()
+        self._loop = {"samples": 0, "totalLagMs": 0, "maxLagMs": 0}
+
+        self._flushTimer = QTimer(self)
+        self._flushTimer.setInterval(FLUSH_INTERVAL_MS)
+        self._flushTimer.timeout.connect(self._flush)
+        # A timer that fires late shows how long the event loop was busy elsewhere
+        self._loopTimer = QTimer(self)
+        self._loopTimer.setTimerType(Qt.PreciseTimer)
+        self._loopTimer.setInterval(LOOP_PROBE_INTERVAL_MS)
+        self._loopTimer.timeout.connect(self._probeLoop)
+        self._loopClock = QElapsedTimer()
+
+        self._server = QTcpServer(self)
+        self._server.newConnection.connect(self._onStatsConnection)
+        if QCoreApplication.instance():
+            QCoreApplication.instance().aboutToQuit.connect(self._flush)
+
+    def setEnabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        if enabled:
+            self.enabled = True
+            self._loopClock.start()
+            self._loopTimer.start()
+            self._flushTimer.start()
+            self.record("traceStarted")
+        else:
+            self.record("traceStopped")
+            self._flush()
+            self.enabled = False
+            self._loopTimer.stop()
+            self._flushTimer.stop()
+            self._closeFile()
+            self._jobs.clear()
+            with self._writeLock:
+                self._writes.clear()
+
+    def setPath(self, path):
+        if path == self._path:
+            return
+        self._flush()
+        self._closeFile()
+        self._path = path
+
+    def setStatsPort(self, port):
+        # 0 turns the endpoint off, it only ever listens on localhost
+        if self._server.isListening():
+            if self._server.serverPort() == port:
+                return
+            self._server.close()
+        if port > 0 and not self._server.listen(QHostAddress.LocalHost, port):
+            print(f"Error starting stats endpoint: {self._server.errorString()}")
+
+    def record(self, name, key="", **values):
+        if not self.enabled:
+            return
+        line = {"ts": round(time.time(), 6), "event": name}
+        if key:
+            line["job"] = key
+        line.update(values)
+        self._lines.append(line)
+
+    def begin(self, key, span):
+        self._job(key)["spans"][span] = time.perf_counter_ns()
+
+    def end(self, key, span, **values):
+        job = self._jobs.get(key)
+        started = job["spans"].pop(span, None) if job else None
+        if started is not None:
+            self.record("span", key, span=span, ms=self._ms(time.perf_counter_ns() - started), **values)
+
+    def addChunk(self, key, size):
+        job = self._job(key)
+        job["bytes"] += size
+        job["chunks"] += 1
+        for bucket in CHUNK_BUCKETS:
+            if size <= bucket:
+                break
+        job["chunkSizes"][bucket] = job["chunkSizes"].get(bucket, 0) + 1
+
+    def addWrite(self, key, size, nanoseconds):
+        with self._writeLock:
+            total = self._writes.get(key)
+            if total is None:
+                total = self._writes[key] = {"count": 0, "bytes": 0, "ns": 0}
+            total["count"] += 1
+            total["bytes"] += size
+            total["ns"] += nanoseconds
+
+    def traceReply(self, key, reply, kind):
+        # connect: queueing, DNS, TCP and TLS up to the request being sent, Qt does
+        # not report the lookup separately. ttfb: request sent to response headers.
+        # transfer: response headers to the end of the body.
+        started = time.perf_counter_ns()
+        marks = {}
+        reply.requestSent.connect(lambda: marks.setdefault("sent", time.perf_counter_ns()))
+        reply.metaDataChanged.connect(lambda: marks.setdefault("headers", time.perf_counter_ns()))
+        reply.finished.connect(lambda: self._onReplyFinished(key, kind, reply, started, marks))
+
+    def finishJob(self, key, outcome):
+        # One summary line per job run, written when it completes, fails, pauses or is cancelled
+        job = self._jobs.pop(key, None)
+        with self._writeLock:
+            writes = self._writes.pop(key, None)
+        if not self.enabled or (job is None and writes is None):
+            return
+        job = job or {"bytes": 0, "chunks": 0, "chunkSizes": {}}
+        writes = writes or {"count": 0, "bytes": 0, "ns": 0}
+        self.record(
+            "job", key, outcome=outcome,
+            bytes=job["bytes"], chunks=job["chunks"],
+            chunkSizes={str(bucket): count for bucket, count in sorted(job["chunkSizes"].items())},
+            writes=writes["count"], writeBytes=writes["bytes"], writeMs=self._ms(writes["ns"])
+        )
+
+    def stats(self):
+        stats = {
+            "enabled": self.enabled,
+            "eventLoop": self._loopStats(),
+            "jobs": {key: {"bytes": job["bytes"], "chunks": job["chunks"]} for key, job in self._jobs.items()},
+        }
+        if self._statsSource:
+            stats["engine"] = self._statsSource()
+        return stats
+
+    def _job(self, key):
+        job = self._jobs.get(key)
+        if job is None:
+            job = self._jobs[key] = {"spans": {}, "bytes": 0, "chunks": 0, "chunkSizes": {}}
+        return job
+
+    def _onReplyFinished(self, key, kind, reply, started, marks):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        sent = marks.get("sent", started)
+        headers = marks.get("headers", now)
+        self.record(
+            "request", key, kind=kind,
+            status=reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) or 0,
+            error=reply.error().name,
+            connectMs=self._ms(sent - started),
+            ttfbMs=self._ms(headers - sent),
+            transferMs=self._ms(now - headers)
+        )
+
+    def _loopStats(self):
+        # Covers the time since the last flush
+        samples = self._loop["samples"]
+        return {
+            "samples": samples,
+            "meanLagMs": round(self._loop["totalLagMs"] / samples, 1) if samples else 0,
+            "maxLagMs": self._loop["maxLagMs"],
+        }
+
+    def _probeLoop(self):
+        lag = max(0, self._loopClock.restart() - LOOP_PROBE_INTERVAL_MS)
+        self._loop["samples"] += 1
+        self._loop["totalLagMs"] += lag
+        self._loop["maxLagMs"] = max(self._loop["maxLagMs"], lag)
+
+    def _flush(self):
+        if self._loop["samples"]:
+            self.record("eventLoop", **self._loopStats())
+            self._loop = {"samples": 0, "totalLagMs": 0, "maxLagMs": 0}
+        if not self._lines or not self._path:
+            self._lines.clear()
+            return
+        lines, self._lines = self._lines, []
+        try:
+            if self._file is None:
+                self._file = open(self._path, 'a', encoding='utf-8')
+            self._file.write("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines))
+            self._file.flush()
+        except OSError as e:
+            print(f"Error writing trace: {e.strerror or str(e)}")
+            self._closeFile()
+
+    def _closeFile(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _onStatsConnection(self):
+        while self._server.hasPendingConnections():
+            socket = self._server.nextPendingConnection()
+            socket.readyRead.connect(lambda socket=socket: self._answerStats(socket))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def _answerStats(self, socket):
+        # Any request gets the current snapshot, the connection is closed after it
+        socket.readAll()
+        body = json.dumps(self.stats(), ensure_ascii=False).encode("utf-8")
+        socket.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii")
+            + body
+        )
+        socket.disconnectFromHost()
+
+    def _ms(self, nanoseconds):
+        return round(nanoseconds / 1e6, 3)
@@ -5,12 +5,71 @@ import QtQuick.Layouts
 import QtQuick.Window
 
 ColumnLayout {
+    // Folder changes are watched, edits to files inside them are picked up here
+    onVisibleChanged: if (visible) downloadedPageBackend.refreshFiles()
+
+    function applyFilter() {
+        downloadedPageBackend.setFilter(searchInput.text, sortInput.currentValue, sortOrderInput.checked, false)
+    }
+
+    RowLayout {
+        Layout.fillWidth: true
+
+        TextField {
+            id: searchInput
+            placeholderText: qsTr("Search file names and URLs")
+            Layout.fillWidth: true
+            onTextChanged: searchTimer.restart()
+        }
+
+        // Searching waits for a pause in typing
+        Timer {
+            id: searchTimer
+            interval: 200
+            onTriggered: applyFilter()
+        }
+
+        ComboBox {
+            id: sortInput
+            model: [
+                { value: "date", text: qsTr("Date") },
+                { value: "name", text: qsTr("Name") },
+                { value: "size", text: qsTr("Size") },
+                { value: "host", text: qsTr("Host") }
+            ]
+            textRole: "text"
+            valueRole: "value"
+            onActivated: applyFilter()
+        }
+
+        Switch {
+            id: sortOrderInput
+            text: qsTr("Descending")
+            onToggled: applyFilter()
+        }
+
+        Label {
+            text: qsTr("%1 downloads").arg(downloadedPageBackend.model.matchCount)
+        }
+
+        Button {
+            text: qsTr("Remove All")
+            enabled: downloadedPageBackend.model.matchCount > 0
+            onClicked: {
+                deleteDialog.url = ""
+                deleteDialog.filename = qsTr("%1 downloads").arg(downloadedPageBackend.model.matchCount)
+                deleteDialog.isBulk = true
+                deleteDialog.open()
+            }
+        }
+    }
+
     ListView {
         id: historyList
         Layout.fillWidth: true
         Layout.fillHeight: true
         spacing: 5
-        model: downloadedPageBackend.downloads
+        model: downloadedPageBackend.model
 
         delegate: Frame {
             width: historyList.width
@@ -20,16 +79,23 @@ ColumnLayout {
                 width: parent.width
 
                 Label {
-                    text: modelData.filename
+                    text: model.filename
                     elide: Text.ElideMiddle
                     Layout.fillWidth: true
                 }
 
+                Label {
+                    text: !model.fileExists ? qsTr("File missing") : qsTr("File changed since download")
+                    color: "red"
+                    visible: !model.fileExists || model.isModified
+                }
+
                 RowLayout {
                     Button {
                         text: qsTr("Open File")
+                        enabled: model.fileExists
                         onClicked: {
-                            var fileUrl = downloadedPageBackend.getFileUrl(modelData.filename, modelData.folder)
+                            var fileUrl = downloadedPageBackend.getFileUrl(model.filename, model.folder)
                             if (fileUrl.toString() !== "") {
                                 Qt.openUrlExternally(fileUrl)
                             } else {
@@ -41,7 +107,7 @@ ColumnLayout {
                     Button {
                         text: qsTr("Open Folder")
                         onClicked: {
-                            var folderUrl = downloadedPageBackend.getFolderUrl(modelData.filename, modelData.folder)
+                            var folderUrl = downloadedPageBackend.getFolderUrl(model.filename, model.folder)
                             if (folderUrl.toString() !== "") {
                                 Qt.openUrlExternally(folderUrl)
                             } else {
@@ -53,8 +119,9 @@ ColumnLayout {
                     Button {
                         text: qsTr("Open Folder")
                         onClicked: {
-                            deleteDialog.url = modelData.url
-                            deleteDialog.filename = modelData.filename
+                            deleteDialog.url = model.url
+                            deleteDialog.filename = model.filename
+                            deleteDialog.isBulk = false
                             deleteDialog.open()
                         }
                     }
@@ -66,11 +133,4 @@ ColumnLayout {
     DownloadedPageDeleteDialog {
         id: deleteDialog
     }
-
-    Connections {
-        target: downloadedPageBackend
-        function onDownloadsChanged() {
-            historyList.model = downloadedPageBackend.downloads
-        }
-    }
 }
\ No newline at end of file
@@ -13,6 +13,8 @@ Dialog {
     
     property string url
     property string filename
+    // Removes every download matching the page's filter instead of url
+    property bool isBulk: false
     
     // Add property for the checkbox state
     property bool deleteFile: false
@@ -53,7 +55,9 @@ Dialog {
     }
 
     onAccepted: {
-        if (url) {
+        if (isBulk) {
+            downloadedPageBackend.removeFiltered(deleteFile)
+        } else if (url) {
             downloadedPageBackend.removeDownload(url, deleteFile)
         } else {
             console.error("Invalid URL specified for deletion")
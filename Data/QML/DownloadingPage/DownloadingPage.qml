@@ -24,15 +24,17 @@ ColumnLayout {
             downloadingPageBackend.startDownload(url)
             downloadControls.clearUrl()
         }
+
+        onImportRequested: importDialog.open()
+    }
+
+    DownloadingPageImportDialog {
+        id: importDialog
+        onShowError: function(message) { root.showError(message) }
     }
 
     function isDuplicateUrl(url) {
-        for (let i = 0; i < downloadModel.count; i++) {
-            if (downloadModel.get(i).url === url) {
-                return true
-            }
-        }
-        return false
+        return downloadingPageBackend.downloadModel.contains(url)
     }
 
     ListView {
@@ -40,17 +42,20 @@ ColumnLayout {
         Layout.fillWidth: true
         Layout.fillHeight: true
         spacing: 5
-        model: ListModel { id: downloadModel }
+        model: downloadingPageBackend.downloadModel
 
         delegate: DownloadingPageItemDelegate {
             filename: model.filename
             progress: model.progress / 100
             speed: root.formatSpeed(model.speed)
-            progressText: qsTr("Progress: %1%").arg(model.progress.toFixed(1))
+            progressText: root.formatProgress(model.progress, model.eta, model.retries, model.mirror)
             isError: model.isError
             isCompleted: model.isCompleted
             isPaused: model.isPaused
+            isQueued: model.isQueued
             errorMessage: model.errorMessage
+            postStage: model.postStage
+            postProgress: model.postProgress
             
             onCancelRequested: downloadingPageBackend.cancelDownload(model.url)
             onPauseRequested: downloadingPageBackend.pauseDownload(model.url)
@@ -65,131 +70,45 @@ ColumnLayout {
         return `${(speed / (1024 * 1024)).toFixed(1)} MB/s`
     }
 
-    function initializeDownloads() {
-        downloadModel.clear()
-        const downloads = downloadingPageBackend.getActiveDownloads()
-        downloads.forEach(url => {
-            downloadModel.append({
-                url: url,
-                filename: downloadingPageBackend.getDownloadFilename(url) || "Unknown",
-                savePath: downloadingPageBackend.getDownloadSavePath(url) || "",
-                progress: downloadingPageBackend.getDownloadProgress(url) || 0,
-                speed: downloadingPageBackend.getDownloadSpeed(url) || 0,
-                isError: false,
-                isCompleted: false,
-                isPaused: downloadingPageBackend.isDownloadPaused(url) || false, // 确保有默认值
-                errorMessage: ""
-            })
-        })
+    function formatProgress(progress, eta, retries, mirror) {
+        let text = qsTr("Progress: %1%").arg(progress.toFixed(1))
+        if (eta >= 0) text += " · " + qsTr("%1 left").arg(formatEta(eta))
+        if (retries > 0) text += " · " + qsTr("Retries: %1").arg(retries)
+        if (mirror) text += " · " + qsTr("Mirror: %1").arg(mirror.replace(/^[a-z]+:\/\/([^\/]+).*$/i, "$1"))
+        return text
+    }
+
+    function formatEta(seconds) {
+        if (seconds < 60) return `${seconds}s`
+        if (seconds < 3600) return `${Math.floor(seconds / 60)}m ${seconds % 60}s`
+        return `${Math.floor(seconds / 3600)}h ${Math.floor(seconds % 3600 / 60)}m`
     }
 
-    Component.onCompleted: initializeDownloads()
+    Label {
+        id: statsLabel
+        Layout.fillWidth: true
+        property var stats: downloadingPageBackend.stats
+        visible: stats.active > 0 || stats.queued > 0
+        text: qsTr("%1 active, %2 queued, %3 paused · %4 · %5 MB buffered")
+            .arg(stats.active).arg(stats.queued).arg(stats.paused)
+            .arg(stats.bytesPerSecond > 0 ? root.formatSpeed(stats.bytesPerSecond) : "0 B/s")
+            .arg((stats.bufferedBytes / (1024 * 1024)).toFixed(1))
+    }
 
     Timer {
         interval: 5000
         repeat: true
         running: true
-        onTriggered: {
-            for (let i = downloadModel.count - 1; i >= 0; i--) {
-                const item = downloadModel.get(i)
-                if (item.isError || item.isCompleted) {
-                    downloadModel.remove(i)
-                }
-            }
-        }
+        onTriggered: downloadingPageBackend.downloadModel.removeFinished()
     }
 
     Connections {
         target: downloadingPageBackend
 
-        function onDownloadStarted(url, filename, savePath) {
-            downloadModel.append({
-                url: url,
-                filename: filename,
-                savePath: savePath,
-                progress: 0.1,
-                speed: 0,
-                isError: false,
-                isCompleted: false,
-                isPaused: false,
-                errorMessage: ""
-            })
-        }
-
-        function onDownloadProgress(url, progress, speed) {
-            for (let i = 0; i < downloadModel.count; i++) {
-                if (downloadModel.get(i).url === url) {
-                    downloadModel.setProperty(i, "progress", progress)
-                    downloadModel.setProperty(i, "speed", speed)
-                    break
-                }
-            }
-        }
-
-        function onDownloadCompleted(url, savePath) {
-            for (let i = 0; i < downloadModel.count; i++) {
-                if (downloadModel.get(i).url === url) {
-                    downloadModel.setProperty(i, "isCompleted", true)
-                    downloadModel.setProperty(i, "progress", 100)
-                    break
-                }
-            }
-            if (typeof downloadedPageBackend !== "undefined") {
-                const filename = savePath.split("/").pop()
-                const folder = savePath.substring(0, savePath.lastIndexOf("/"))
-                const file = Qt.resolvedUrl(savePath)
-                if (file.toString().length > 0) {
-                    downloadedPageBackend.addDownload(url, filename, folder)
-                }
-            }
-        }
-
         function onDownloadError(url, errorMessage) {
-            for (let i = 0; i < downloadModel.count; i++) {
-                if (downloadModel.get(i).url === url) {
-                    break
-                }
-            }
-            
             Qt.callLater(() => {
                 showError(errorMessage)
             })
         }
-
-        function onDownloadCancelled(url) {
-            for (let i = 0; i < downloadModel.count; i++) {
-                if (downloadModel.get(i).url === url) {
-                    downloadModel.remove(i)
-                    break
-                }
-            }
-        }
-
-        function onDownloadPaused(url) {
-            for (let i = 0; i < downloadModel.count; i++) {
-                if (downloadModel.get(i).url === url) {
-                    downloadModel.setProperty(i, "isPaused", true)
-                    break
-                }
-            }
-        }
-        
-        function onDownloadResumed(url) {
-            for (let i = 0; i < downloadModel.count; i++) {
-                if (downloadModel.get(i).url === url) {
-                    downloadModel.setProperty(i, "isPaused", false)
-                    break
-                }
-            }
-        }
-    }
-
-    Connections {
-        target: downloadingLoader
-        function onVisibleChanged() {
-            if (downloadingLoader.visible) {
-                initializeDownloads()
-            }
-        }
     }
 }
\ No newline at end of file
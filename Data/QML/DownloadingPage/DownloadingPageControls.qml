@@ -8,6 +8,7 @@ RowLayout {
     property alias urlText: urlInput.text
     
     signal downloadRequested(string url)
+    signal importRequested()
     signal showError(string message)
     
     function clearUrl() {
@@ -30,4 +31,9 @@ RowLayout {
             }
         }
     }
+
+    Button {
+        text: qsTr("Import...")
+        onClicked: importRequested()
+    }
 }
\ No newline at end of file
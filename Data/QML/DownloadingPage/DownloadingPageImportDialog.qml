@@ -0,0 +1,150 @@
+import QtQuick
+import QtQuick.Controls
+import QtQuick.Controls.FluentWinUI3
+import QtQuick.Dialogs
+import QtQuick.Layouts
+import QtQuick.Window
+
+Dialog {
+    id: importDialog
+    title: qsTr("Import URLs")
+    modal: true
+    width: Math.min(700, parent.width * 0.9)
+    height: Math.min(520, parent.height * 0.9)
+    x: (parent.width - width) / 2
+    y: (parent.height - height) / 2
+
+    property var importer: downloadingPageBackend.bulkImporter
+
+    signal showError(string message)
+
+    function importText(text) {
+        const error = importer.importText(text)
+        if (error) {
+            showError(error)
+        } else {
+            urlsInput.clear()
+        }
+    }
+
+    function formatSize(size) {
+        if (size <= 0) return qsTr("Unknown size")
+        if (size < 1024 * 1024) return `${(size / 1024).toFixed(1)} KB`
+        if (size < 1024 * 1024 * 1024) return `${(size / (1024 * 1024)).toFixed(1)} MB`
+        return `${(size / (1024 * 1024 * 1024)).toFixed(2)} GB`
+    }
+
+    function formatState(state, isResumable, errorMessage) {
+        if (state === "probing") return qsTr("Checking...")
+        if (state === "failed" || state === "invalid") return errorMessage
+        if (state === "downloaded") return qsTr("Already downloaded")
+        if (state === "active") return qsTr("Already in the list")
+        return isResumable ? qsTr("Resumable") : qsTr("Not resumable")
+    }
+
+    ColumnLayout {
+        anchors.fill: parent
+        spacing: 10
+
+        ScrollView {
+            Layout.fillWidth: true
+            Layout.preferredHeight: 100
+
+            TextArea {
+                id: urlsInput
+                placeholderText: qsTr("One URL per line, optionally followed by mirror URLs and a checksum such as sha256:...")
+                selectByMouse: true
+                wrapMode: TextEdit.NoWrap
+            }
+        }
+
+        RowLayout {
+            Layout.fillWidth: true
+
+            Button {
+                text: qsTr("Add")
+                enabled: urlsInput.text.trim() !== ""
+                onClicked: importDialog.importText(urlsInput.text)
+            }
+
+            Button {
+                text: qsTr("Open File...")
+                onClicked: importFileDialog.open()
+            }
+
+            Item { Layout.fillWidth: true }
+
+            Label {
+                text: importer.pendingCount > 0 ? qsTr("Checking %1 URLs...").arg(importer.pendingCount) : ""
+            }
+        }
+
+        ListView {
+            id: importList
+            Layout.fillWidth: true
+            Layout.fillHeight: true
+            clip: true
+            spacing: 5
+            model: importer.model
+
+            delegate: RowLayout {
+                width: importList.width
+                spacing: 10
+
+                Label {
+                    text: model.filename
+                    elide: Text.ElideMiddle
+                    Layout.fillWidth: true
+                }
+
+                Label {
+                    text: importDialog.formatSize(model.size)
+                }
+
+                Label {
+                    text: importDialog.formatState(model.state, model.isResumable, model.errorMessage)
+                    color: model.state === "failed" || model.state === "invalid" ? "red" : palette.text
+                    elide: Text.ElideRight
+                    Layout.preferredWidth: 160
+                }
+
+                Button {
+                    text: qsTr("Remove")
+                    flat: true
+                    onClicked: importer.removeItem(model.url)
+                }
+            }
+        }
+    }
+
+    footer: DialogButtonBox {
+        Button {
+            text: qsTr("Queue All")
+            enabled: importList.count > 0
+            DialogButtonBox.buttonRole: DialogButtonBox.AcceptRole
+        }
+
+        Button {
+            text: qsTr("Clear")
+            enabled: importList.count > 0
+            onClicked: importer.clear()
+        }
+
+        Button {
+            text: qsTr("Close")
+            DialogButtonBox.buttonRole: DialogButtonBox.RejectRole
+        }
+    }
+
+    onAccepted: downloadingPageBackend.queueImported()
+
+    FileDialog {
+        id: importFileDialog
+        title: qsTr("Select URL List")
+        nameFilters: [qsTr("URL lists (*.txt *.meta4 *.metalink)"), qsTr("All files (*)")]
+        onAccepted: {
+            const error = importDialog.importer.importFile(selectedFile)
+            if (error) importDialog.showError(error)
+        }
+    }
+}
@@ -12,9 +12,12 @@ Frame {
     property bool isError: false
     property bool isCompleted: false
     property bool isPaused: false
+    property bool isQueued: false
     property alias errorMessage: errorLabel.text
+    property string postStage: ""
+    property real postProgress: 0
     property bool canCancel: !isError && !isCompleted
-    property bool canPause: canCancel && !isPaused
+    property bool canPause: canCancel && !isPaused && !isQueued
     property bool canResume: canCancel && isPaused
     
     signal cancelRequested()
@@ -59,11 +62,11 @@ Frame {
         ProgressBar {
             id: progressBar
             Layout.fillWidth: true
-            visible: canCancel
+            visible: canCancel && !isQueued
         }
 
         RowLayout {
-            visible: canCancel
+            visible: canCancel && !isQueued
             Label { id: speedLabel }
         
             Label {
@@ -75,18 +78,34 @@ Frame {
 
         Label {
             id: errorLabel
-            visible: isError
+            visible: isError || (isCompleted && text !== "")
             color: "red"
             Layout.fillWidth: true
         }
 
         Label {
-            visible: isCompleted
+            visible: isCompleted && postStage === ""
             text: qsTr("Download completed")
             color: "green"
             Layout.fillWidth: true
         }
 
+        Label {
+            visible: isCompleted && postStage !== ""
+            text: postStage === "extract" ? qsTr("Extracting %1%").arg(Math.round(postProgress * 100))
+                : postStage === "move" ? qsTr("Moving...")
+                : qsTr("Running command...")
+            color: palette.placeholderText
+            Layout.fillWidth: true
+        }
+
+        Label {
+            visible: isQueued
+            text: qsTr("Waiting in queue")
+            color: palette.placeholderText
+            Layout.fillWidth: true
+        }
+
         Label {
             visible: isPaused
             text: qsTr("Download paused")
@@ -114,6 +114,288 @@ GroupBox {
             }
         }
 
+        GridLayout {
+            columns: 2
+            columnSpacing: 10
+            rowSpacing: 10
+            Layout.fillWidth: true
+
+            Label {
+                text: "Global Speed Limit (KB/s):"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            RowLayout {
+                SpinBox {
+                    id: globalSpeedLimitInput
+                    from: 0
+                    to: 1000000
+                    editable: true
+                    value: backendAvailable ? Math.round(settingsBackend.globalSpeedLimit / 1024) : 0
+                    onValueModified: if (backendAvailable) settingsBackend.globalSpeedLimit = value * 1024
+                    enabled: backendAvailable
+                }
+                Label {
+                    text: globalSpeedLimitInput.value === 0 ? "Unlimited" : ""
+                }
+            }
+
+            Label {
+                text: "Per-Download Speed Limit (KB/s):"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            RowLayout {
+                SpinBox {
+                    id: perDownloadSpeedLimitInput
+                    from: 0
+                    to: 1000000
+                    editable: true
+                    value: backendAvailable ? Math.round(settingsBackend.perDownloadSpeedLimit / 1024) : 0
+                    onValueModified: if (backendAvailable) settingsBackend.perDownloadSpeedLimit = value * 1024
+                    enabled: backendAvailable
+                }
+                Label {
+                    text: perDownloadSpeedLimitInput.value === 0 ? "Unlimited" : ""
+                }
+            }
+        }
+
+        GridLayout {
+            columns: 2
+            columnSpacing: 10
+            rowSpacing: 10
+            Layout.fillWidth: true
+
+            Label {
+                text: "Cache:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            ComboBox {
+                id: cacheModeInput
+                model: [
+                    { value: "off", text: "Off" },
+                    { value: "metadata", text: "File information only" },
+                    { value: "payload", text: "File information and small files" }
+                ]
+                textRole: "text"
+                valueRole: "value"
+                Layout.fillWidth: true
+                enabled: backendAvailable
+                Component.onCompleted: currentIndex = backendAvailable ? indexOfValue(settingsBackend.cacheMode) : 0
+                onActivated: if (backendAvailable) settingsBackend.cacheMode = currentValue
+            }
+
+            Label {
+                text: "Cache Size (MB):"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            SpinBox {
+                from: 0
+                to: 100000
+                editable: true
+                value: backendAvailable ? Math.round(settingsBackend.cacheSize / (1024 * 1024)) : 0
+                onValueModified: if (backendAvailable) settingsBackend.cacheSize = value * 1024 * 1024
+                enabled: backendAvailable && cacheModeInput.currentValue !== "off"
+            }
+
+            Label {
+                text: "Cache Folder:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            TextField {
+                Layout.fillWidth: true
+                text: backendAvailable ? settingsBackend.cacheFolder : ""
+                placeholderText: "Leave empty for the default location"
+                enabled: backendAvailable && cacheModeInput.currentValue !== "off"
+
+                onEditingFinished: {
+                    if (backendAvailable && (!text || settingsBackend.isValidPath(text))) {
+                        settingsBackend.cacheFolder = text
+                    }
+                    text = backendAvailable ? settingsBackend.cacheFolder : ""
+                }
+
+                Keys.onReturnPressed: focus = false
+                Keys.onEnterPressed: focus = false
+            }
+        }
+
+        GridLayout {
+            columns: 2
+            columnSpacing: 10
+            rowSpacing: 10
+            Layout.fillWidth: true
+
+            Label {
+                text: "Connections per Host:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            RowLayout {
+                Slider {
+                    id: connectionsPerHostInput
+                    from: 1
+                    to: 6
+                    value: backendAvailable ? settingsBackend.maxConnectionsPerHost : 6
+                    onMoved: if (backendAvailable) settingsBackend.maxConnectionsPerHost = value
+                    stepSize: 1
+                    snapMode: Slider.SnapAlways
+                    Layout.fillWidth: true
+                    enabled: backendAvailable
+                }
+                Label {
+                    text: connectionsPerHostInput.value.toFixed(0)
+                }
+            }
+
+            Label {
+                text: "HTTP/2:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            Switch {
+                text: "Share one connection per host when the server supports it"
+                checked: backendAvailable ? settingsBackend.http2Enabled : true
+                onToggled: if (backendAvailable) settingsBackend.http2Enabled = checked
+                enabled: backendAvailable
+            }
+
+            Label {
+                text: "Memory Budget (MB):"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            SpinBox {
+                from: 16
+                to: 2047
+                editable: true
+                value: backendAvailable ? Math.round(settingsBackend.memoryBudget / (1024 * 1024)) : 256
+                onValueModified: if (backendAvailable) settingsBackend.memoryBudget = value * 1024 * 1024
+                enabled: backendAvailable
+            }
+
+            Label {
+                text: "Disk Writes:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            ComboBox {
+                model: [
+                    { value: "throughput", text: "Fastest" },
+                    { value: "durability", text: "Safest (sync to disk)" }
+                ]
+                textRole: "text"
+                valueRole: "value"
+                Layout.fillWidth: true
+                enabled: backendAvailable
+                Component.onCompleted: currentIndex = backendAvailable ? indexOfValue(settingsBackend.syncMode) : 0
+                onActivated: if (backendAvailable) settingsBackend.syncMode = currentValue
+            }
+        }
+
+        GridLayout {
+            columns: 2
+            columnSpacing: 10
+            rowSpacing: 10
+            Layout.fillWidth: true
+
+            Label {
+                text: "Performance Trace:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            Switch {
+                id: tracingInput
+                text: "Record timings while downloading"
+                checked: backendAvailable ? settingsBackend.tracingEnabled : false
+                onToggled: if (backendAvailable) settingsBackend.tracingEnabled = checked
+                enabled: backendAvailable
+            }
+
+            Label {
+                text: "Trace File:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            TextField {
+                Layout.fillWidth: true
+                text: backendAvailable ? settingsBackend.traceFile : ""
+                placeholderText: "Leave empty for the default location"
+                enabled: backendAvailable && tracingInput.checked
+
+                onEditingFinished: {
+                    if (backendAvailable) settingsBackend.traceFile = text
+                    text = backendAvailable ? settingsBackend.traceFile : ""
+                }
+
+                Keys.onReturnPressed: focus = false
+                Keys.onEnterPressed: focus = false
+            }
+        }
+
+        GridLayout {
+            columns: 2
+            columnSpacing: 10
+            rowSpacing: 10
+            Layout.fillWidth: true
+
+            Label {
+                text: "Move Finished Files:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            TextField {
+                Layout.fillWidth: true
+                text: backendAvailable ? settingsBackend.postMoveRules : ""
+                placeholderText: "e.g. mp4,mkv=Videos; pdf=Documents"
+                enabled: backendAvailable
+
+                onEditingFinished: {
+                    if (backendAvailable) settingsBackend.postMoveRules = text
+                    text = backendAvailable ? settingsBackend.postMoveRules : ""
+                }
+
+                Keys.onReturnPressed: focus = false
+                Keys.onEnterPressed: focus = false
+            }
+
+            Label {
+                text: "Archives:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            Switch {
+                text: "Extract zip and tar files when they finish"
+                checked: backendAvailable ? settingsBackend.postExtract : false
+                onToggled: if (backendAvailable) settingsBackend.postExtract = checked
+                enabled: backendAvailable
+            }
+
+            Label {
+                text: "Run Command:"
+                Layout.alignment: Qt.AlignRight
+            }
+
+            TextField {
+                Layout.fillWidth: true
+                text: backendAvailable ? settingsBackend.postCommand : ""
+                placeholderText: "Use {path} and {url}, leave empty to run nothing"
+                enabled: backendAvailable
+
+                onEditingFinished: {
+                    if (backendAvailable) settingsBackend.postCommand = text
+                    text = backendAvailable ? settingsBackend.postCommand : ""
+                }
+
+                Keys.onReturnPressed: focus = false
+                Keys.onEnterPressed: focus = false
+            }
+        }
+
         Item { Layout.fillHeight: true }
     }
 
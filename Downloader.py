@@ -1,20 +1,28 @@
 import sys
 
-from PySide6.QtGui import QGuiApplication, QIcon
-from PySide6.QtQml import QQmlApplicationEngine
+from Data.Code.RefcountGuard import RefcountGuard
+from Data.Code.StartupTimer import StartupTimer
 
-from Data.Code.DownloadingPage import DownloadingPage
-from Data.Code.DownloadedPage import DownloadedPage
-from Data.Code.DownloadHistory import DownloadHistory
-from Data.Code.SettingPage import Settings
+def runGui():
+    # GUI modules are imported here so headless runs never load QtGui or QtQuick
+    from PySide6.QtGui import QGuiApplication, QIcon
+    from PySide6.QtQml import QQmlApplicationEngine
 
-if __name__ == "__main__":
+    from Data.Code.DownloadingPage import DownloadingPage
+    from Data.Code.DownloadedPage import DownloadedPage
+    from Data.Code.SettingPage import Settings
+
+    startupTimer = StartupTimer()
     app = QGuiApplication(sys.argv)
     app.setWindowIcon(QIcon("Data/Image/downloader.ico"))
+    startupTimer.mark("application")
     settings = Settings()
+    startupTimer.mark("settings")
+    downloadHistory = settings.downloadHistory
+    startupTimer.mark("history")
     downloadingPage = DownloadingPage(settings)
     downloadedPage = DownloadedPage(settings)
-    downloadHistory = DownloadHistory(settings)
+    startupTimer.mark("backends")
     
     engine = QQmlApplicationEngine()
     engine.rootContext().setContextProperty("settingsBackend", settings)
@@ -22,8 +30,27 @@ if __name__ == "__main__":
     engine.rootContext().setContextProperty("downloadedPageBackend", downloadedPage)
     engine.rootContext().setContextProperty("downloadHistoryBackend", downloadHistory)
     engine.load("Data/QML/Main.qml") 
+    startupTimer.mark("qml")
     
     if not engine.rootObjects():
-        sys.exit(-1)
+        return -1
+
+    startupTimer.report()
+    return app.exec()
 
-    sys.exit(app.exec())
\ No newline at end of file
+def runHeadless():
+    from Data.Code.HeadlessRunner import HeadlessRunner
+    return HeadlessRunner.main(sys.argv)
+
+def runBenchmark():
+    from Data.Code.BenchmarkRunner import BenchmarkRunner
+    return BenchmarkRunner.main(sys.argv)
+
+if __name__ == "__main__":
+    # Before any Qt object exists, the history and settings make thousands of calls too
+    RefcountGuard.install()
+    if "--headless" in sys.argv[1:]:
+        sys.exit(runHeadless())
+    if "--benchmark" in sys.argv[1:]:
+        sys.exit(runBenchmark())
+    sys.exit(runGui())
\ No newline at end of file
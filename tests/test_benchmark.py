@@ -0,0 +1,22 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_small_scenario_records_a_result(tmp_path):
+    output = tmp_path / "benchmark.json"
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "Downloader.py"), "--benchmark", "-s", "small", "-c", "5", "-t", "1", "--scale", "0.01", "-o", str(output)],
+        cwd=tmp_path, capture_output=True, text=True, timeout=600,
+    )
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
+    runs = json.loads(output.read_text())["runs"]
+    assert len(runs) == 1
+    run = runs[0]
+    assert run["completed"] == run["files"] == 300
+    assert run["wallSeconds"] > 0 and run["bytes"] > 0
+    assert run["settings"]["concurrentDownloads"] == 5
+    assert run["settings"]["maxThreadsPerDownload"] == 1
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Data.Code.BenchmarkServer import BenchmarkServer, BLOCK_SIZE
+
+MB = 1024 * 1024
+SMALL_FILES = 300
+
+
+@pytest.fixture
+def server():
+    # Supports Range requests and injected errors, like the servers segmented downloads target
+    httpd = BenchmarkServer(seed=7)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def fileUrl(server, name, size, errors=0):
+    return f"http://127.0.0.1:{server.server_address[1]}/{name}?size={size}&errors={errors}"
+
+
+def fileContent(server, size):
+    block = server.block[:BLOCK_SIZE]
+    return (block * (size // BLOCK_SIZE + 1))[:size]
+
+
+def rangedRequests(server, name):
+    # The server numbers every distinct request it sees, ranged ones carry their Range header
+    return [key for key in server._attempts if key.startswith(f"GET /{name}?") and key.split(" ", 2)[2]]
+
+
+def runHeadless(workDir, *arguments):
+    # The journal and history are created in the working directory
+    return subprocess.run(
+        [sys.executable, os.path.join(ROOT, "Downloader.py"), "--headless", "-o", str(workDir / "out"), "--cache", "off", *arguments],
+        cwd=workDir, capture_output=True, text=True, timeout=300,
+        env=dict(os.environ, QT_QPA_PLATFORM="offscreen"),
+    )
+
+
+def journaledJobs(workDir):
+    with sqlite3.connect(workDir / "Download_Jobs.db") as db:
+        return db.execute("SELECT url, state FROM jobs").fetchall()
+
+
+def summary(result):
+    line = json.loads(result.stdout.splitlines()[-1])
+    assert line["event"] == "summary"
+    return line
+
+
+def test_successful_run_leaves_empty_journal(server, tmp_path):
+    result = runHeadless(tmp_path, fileUrl(server, "file.bin", 3 * MB))
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert (tmp_path / "out" / "file.bin").read_bytes() == fileContent(server, 3 * MB)
+    assert journaledJobs(tmp_path) == []
+
+
+def test_checksum_mismatch_removes_partial_file(server, tmp_path):
+    urls = tmp_path / "urls.txt"
+    urls.write_text(f"{fileUrl(server, 'file.bin', 3 * MB)} md5:{hashlib.md5(b'other').hexdigest()}\n")
+    result = runHeadless(tmp_path, "-i", str(urls))
+    assert result.returncode == 1, result.stdout + result.stderr
+    assert os.listdir(tmp_path / "out") == []
+    assert journaledJobs(tmp_path) == []
+
+
+def test_many_urls_complete_with_summary(server, tmp_path):
+    # Hundreds of jobs make enough calls into Qt to expose reference counting bugs in the bindings
+    urls = tmp_path / "urls.txt"
+    urls.write_text("".join(f"{fileUrl(server, f'small-{index}.bin', 1024 + index)}\n" for index in range(SMALL_FILES)))
+    result = runHeadless(tmp_path, "-i", str(urls))
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
+    assert (summary(result)["completed"], summary(result)["failed"]) == (SMALL_FILES, 0)
+    for index in (0, SMALL_FILES - 1):
+        assert (tmp_path / "out" / f"small-{index}.bin").read_bytes() == fileContent(server, 1024 + index)
+    assert journaledJobs(tmp_path) == []
+
+
+@pytest.mark.parametrize("errors", [0, 0.3])
+def test_segmented_download_matches_checksum(server, tmp_path, errors):
+    # Injected errors refuse requests or cut transfers short, segments resume with Range
+    size = 20 * MB
+    content = fileContent(server, size)
+    urls = tmp_path / "urls.txt"
+    urls.write_text(f"{fileUrl(server, 'large.bin', size, errors)} sha256:{hashlib.sha256(content).hexdigest()}\n")
+    result = runHeadless(tmp_path, "-i", str(urls), "-t", "8", "--retries", "20")
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
+    assert summary(result)["completed"] == 1
+    assert (tmp_path / "out" / "large.bin").read_bytes() == content
+    assert len(rangedRequests(server, "large.bin")) >= 8
+    assert journaledJobs(tmp_path) == []